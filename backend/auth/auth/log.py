@@ -0,0 +1,38 @@
+# auth/log.py
+"""Logging helpers referenced from settings.LOGGING"""
+import json
+import logging
+import random
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Let through only ``rate`` of the records at or below ``max_level`` (DEBUG
+    by default), so per-request debug lines can stay enabled under load.
+    Records above ``max_level`` always pass.
+    """
+
+    def __init__(self, rate=1.0, max_level='DEBUG'):
+        super().__init__()
+        self.rate = float(rate)
+        self.max_level = logging.getLevelName(max_level) if isinstance(max_level, str) else max_level
+
+    def filter(self, record):
+        if record.levelno > self.max_level or self.rate >= 1.0:
+            return True
+        return random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, for log shippers"""
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
@@ -0,0 +1,82 @@
+# auth/pagination.py
+import base64
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(created_at, pk):
+    """Opaque cursor for the row at (created_at, pk)"""
+    raw = json.dumps([created_at.isoformat(), pk]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, pk = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        created_at = parse_datetime(created_at)
+    except (ValueError, TypeError, json.JSONDecodeError):
+        raise InvalidCursor('Invalid cursor')
+    if created_at is None or not isinstance(pk, int):
+        raise InvalidCursor('Invalid cursor')
+    return created_at, pk
+
+
+def encode_offset_cursor(offset):
+    """Opaque cursor for position ``offset`` of a ranked result list (where no keyset order exists)"""
+    raw = json.dumps({'offset': offset}).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_offset_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        offset = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))['offset']
+    except (ValueError, TypeError, KeyError, json.JSONDecodeError):
+        raise InvalidCursor('Invalid cursor')
+    if not isinstance(offset, int) or offset < 0:
+        raise InvalidCursor('Invalid cursor')
+    return offset
+
+
+def parse_limit(value, default=20, maximum=100):
+    try:
+        limit = int(value) if value not in (None, '') else default
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(limit, maximum))
+
+
+def keyset_page(queryset, cursor=None, limit=20, created_field='created_at', pk_field='id'):
+    """
+    Newest-first keyset pagination on (created_at, id).
+
+    Unlike OFFSET pagination, each page is an index range scan that starts
+    right after the previous page's last row, so deep pages cost the same as
+    the first one. Returns (rows, next_cursor); next_cursor is None on the
+    last page. ``queryset`` may be a values() queryset.
+    """
+    queryset = queryset.order_by(f'-{created_field}', f'-{pk_field}')
+    if cursor:
+        created_at, pk = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(**{f'{created_field}__lt': created_at}) |
+            Q(**{created_field: created_at, f'{pk_field}__lt': pk})
+        )
+
+    rows = list(queryset[:limit + 1])
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        if isinstance(last, dict):
+            next_cursor = encode_cursor(last[created_field], last[pk_field])
+        else:
+            next_cursor = encode_cursor(getattr(last, created_field), getattr(last, pk_field))
+    return rows, next_cursor
@@ -11,6 +11,21 @@ SECRET_KEY = 'django-insecure-4=821c8&pxnn(jbdxw%gat(6_$w*&$l3$tth(z$1^3ska@0s$x
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Content-addressed image storage (blobstore app), sharded by SHA-256. Kept
+# outside MEDIA_ROOT: blobs are only served through views that check access.
+BLOBSTORE_ROOT = os.path.join(BASE_DIR, 'blobs')
+# Downscaled copies of every product/detection image, generated after upload
+# by a background thread pool and requested with ?size=<edge> on list endpoints
+# and /api/media/ URLs. `manage.py build_renditions` backfills missing ones.
+BLOBSTORE_RENDITION_SIZES = (128, 256, 768)
+BLOBSTORE_RENDITION_FORMATS = ('webp', 'jpeg')
+BLOBSTORE_RENDITION_QUALITY = 80
+BLOBSTORE_RENDITIONS_ASYNC = True
+BLOBSTORE_RENDITION_WORKERS = 2
+
+# Keep uploads up to the 10MB detection limit in memory so they are decoded
+# straight from the request body instead of being spooled to a temp file
+FILE_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024
 
 
 DEBUG = True
@@ -26,6 +41,7 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'rest_framework',
     'corsheaders',
+    'blobstore',
     'plant_detection',
     'users',
     'farmers',
@@ -70,6 +86,12 @@ DATABASES = {
         'PASSWORD': 'Srav@7780',
         'HOST': 'localhost',
         'PORT': '3306',
+        # A file, not SQLite's shared-cache in-memory database: the concurrency
+        # tests write from several threads, which shared cache turns into
+        # immediate "database table is locked" errors instead of waiting
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
@@ -122,6 +144,173 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Verified JWT -> account cache in JWTAuthentication (users/auth_cache.py). Per
+# process; entries live AUTH_IDENTITY_CACHE_TTL seconds at most, so another
+# worker can serve a changed account's old identity for that long.
+AUTH_IDENTITY_CACHE = True
+AUTH_IDENTITY_CACHE_TTL = 60
+AUTH_IDENTITY_CACHE_SIZE = 10000
+
+# Access/refresh tokens (users/tokens.py). Access tokens are checked in memory
+# against a revocation list that each process reloads from the database every
+# TOKEN_REVOCATION_SYNC_INTERVAL seconds (incrementally; in full, dropping
+# expired entries, every TOKEN_REVOCATION_REBUILD_INTERVAL seconds), so a
+# logout takes effect everywhere within that interval.
+ACCESS_TOKEN_TTL = 300
+REFRESH_TOKEN_TTL = 14 * 24 * 3600
+TOKEN_REVOCATION_SYNC_INTERVAL = 5
+TOKEN_REVOCATION_REBUILD_INTERVAL = 300
+TOKEN_REVOCATION_CAPACITY = 100000
+
+# Password hashing (users/hashing.py): PBKDF2 runs on PASSWORD_HASH_WORKERS
+# threads with at most PASSWORD_HASH_MAX_PENDING hashes running or queued;
+# further logins get 503. AUTH_ASYNC_VIEWS serves login and registration
+# from async views (users/async_views.py); use it when running under ASGI.
+PASSWORD_HASH_WORKERS = os.cpu_count() or 1
+PASSWORD_HASH_MAX_PENDING = 64
+AUTH_ASYNC_VIEWS = os.environ.get('AUTH_ASYNC_VIEWS', '').lower() in ('1', 'true', 'yes')
+
+# Account id allocation (users/sequences.py). Values above 1 let each process
+# reserve that many F/C/M numbers per database round trip.
+ID_SEQUENCE_BLOCK_SIZE = 1
+
+# Marketplace listing (customers/views.py): products per keyset page, and how
+# long the per-filter total is served from the cache before being recounted.
+MARKETPLACE_PAGE_SIZE = 24
+MARKETPLACE_COUNT_CACHE_TTL = 60
+# Whole marketplace responses (customers/marketplace_cache.py), kept up to
+# MARKETPLACE_CACHE_TTL seconds. Product and stock changes retire the cached
+# pages of their district as soon as they commit. 'file' shares one cache
+# directory between the processes of a node, so invalidations reach all of
+# them; use it whenever more than one worker process serves requests.
+# 'locmem' caches per process: an invalidation only reaches the worker that
+# made the change, and the others serve the old stock until the entry
+# expires, so the TTL is kept short there (and `check --deploy` warns).
+MARKETPLACE_CACHE_BACKEND = os.environ.get('MARKETPLACE_CACHE_BACKEND', 'locmem').strip().lower()
+MARKETPLACE_CACHE_DIR = os.environ.get('MARKETPLACE_CACHE_DIR', os.path.join(BASE_DIR, 'cache', 'marketplace'))
+MARKETPLACE_CACHE_TTL = 300 if MARKETPLACE_CACHE_BACKEND == 'file' else 10
+MARKETPLACE_CACHE_MAX_ENTRIES = 5000
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'marketplace': {
+        'BACKEND': (
+            'django.core.cache.backends.filebased.FileBasedCache' if MARKETPLACE_CACHE_BACKEND == 'file'
+            else 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': MARKETPLACE_CACHE_DIR if MARKETPLACE_CACHE_BACKEND == 'file' else 'marketplace',
+        'TIMEOUT': MARKETPLACE_CACHE_TTL,
+        'OPTIONS': {'MAX_ENTRIES': MARKETPLACE_CACHE_MAX_ENTRIES},
+    },
+}
+# Seconds between full rebuilds of each process's type-ahead index
+# (farmers/suggest.py); changes made in the same process apply at once.
+SUGGEST_INDEX_REFRESH = 300
+
+# Deployment profile, from the APP_PROFILE environment variable:
+#   'full' - serves every endpoint; TensorFlow is imported on first detection
+#   'web'  - marketplace/auth/order workers that never load the inference stack;
+#            synchronous detection returns 503, /api/plant/jobs/ still queues work
+# `python manage.py profile_startup` reports startup time and RSS per profile.
+APP_PROFILE = os.environ.get('APP_PROFILE', 'full').strip().lower()
+PLANT_DETECTION_INFERENCE_ENABLED = APP_PROFILE != 'web'
+
+# Load the model and run dummy batches through it at startup (AppConfig.ready)
+# instead of inside the first detection request. Enable for server processes only.
+PLANT_DETECTION_WARMUP = os.environ.get('PLANT_DETECTION_WARMUP', '') == '1'
+# Load the model in the gunicorn master (`gunicorn --preload auth.wsgi`) so forked
+# workers share its read-only pages. Requires PLANT_DETECTION_BACKEND = 'tflite'.
+PLANT_DETECTION_PRELOAD = os.environ.get('PLANT_DETECTION_PRELOAD', '') == '1'
+
+# Plant detection inference batching
+# Concurrent detection requests are grouped into one model call of up to
+# PLANT_DETECTION_MAX_BATCH_SIZE images, waiting at most
+# PLANT_DETECTION_MAX_BATCH_WAIT_MS for the batch to fill.
+PLANT_DETECTION_BATCHING = True
+PLANT_DETECTION_MAX_BATCH_SIZE = 32
+PLANT_DETECTION_MAX_BATCH_WAIT_MS = 10
+
+# Maximum number of images accepted by /api/plant/detect/batch/
+PLANT_DETECTION_MAX_BATCH_IMAGES = 50
+
+# Asynchronous detection jobs (POST /api/plant/jobs/), executed by
+# `python manage.py run_detection_workers`. A running job whose worker has not
+# reported for PLANT_DETECTION_JOB_TIMEOUT seconds is requeued, up to
+# PLANT_DETECTION_JOB_MAX_ATTEMPTS times.
+PLANT_DETECTION_JOB_MAX_ATTEMPTS = 3
+PLANT_DETECTION_JOB_TIMEOUT = 120
+PLANT_DETECTION_JOB_POLL_INTERVAL = 0.5
+PLANT_DETECTION_JOB_CLAIM_BATCH = 8
+
+# Inference backend: 'keras' (full TensorFlow, float32) or 'tflite' (the model
+# exported with `manage.py export_tflite`, optionally float16/int8 quantized).
+# Run `manage.py check_backend_parity <samples>` before switching.
+PLANT_DETECTION_BACKEND = 'keras'
+PLANT_DETECTION_TFLITE_MODEL = os.path.join(BASE_DIR, 'plant_detection', 'models', 'trained_plant_disease_model.tflite')
+PLANT_DETECTION_TFLITE_THREADS = None
+# Keras backend: call the model through a traced tf.function with a fixed
+# [None, 128, 128, 3] float32 signature instead of model.predict, optionally
+# XLA-compiled. Compare with `manage.py benchmark_inference`.
+PLANT_DETECTION_COMPILED_INFERENCE = True
+PLANT_DETECTION_XLA = False
+
+# Prediction cache keyed by a hash of the resized model input and the model
+# file version: an in-process LRU of PLANT_DETECTION_CACHE_SIZE entries in
+# front of the PredictionCacheEntry table
+PLANT_DETECTION_CACHE = True
+PLANT_DETECTION_CACHE_SIZE = 1024
+PLANT_DETECTION_CACHE_PERSISTENT = True
+
+# Storage policy for detection photos: the model only needs 128x128 and the UI
+# shows card-size previews, so uploads are downscaled to
+# PLANT_DETECTION_IMAGE_MAX_EDGE, re-encoded as JPEG at
+# PLANT_DETECTION_IMAGE_QUALITY and stripped of EXIF. The untouched upload is
+# kept only for requests sending keep_original=true (or for every upload with
+# PLANT_DETECTION_KEEP_ORIGINALS). Older images can be compacted with
+# `manage.py compact_detection_images --older-than-days N [--purge]`.
+PLANT_DETECTION_IMAGE_MAX_EDGE = 1024
+PLANT_DETECTION_IMAGE_QUALITY = 80
+PLANT_DETECTION_KEEP_ORIGINALS = False
+
+# Logging. LOG_LEVEL=DEBUG enables per-request diagnostics (including tensor
+# statistics in plant detection); LOG_DEBUG_SAMPLE_RATE keeps only that
+# fraction of DEBUG lines. LOG_FORMAT=json writes one JSON object per line.
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_DEBUG_SAMPLE_RATE = float(os.environ.get('LOG_DEBUG_SAMPLE_RATE', '1.0'))
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text').lower()
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'sample_debug': {
+            '()': 'auth.log.SamplingFilter',
+            'rate': LOG_DEBUG_SAMPLE_RATE,
+        },
+    },
+    'formatters': {
+        'text': {
+            'format': '%(asctime)s %(levelname)s %(name)s: %(message)s',
+        },
+        'json': {
+            '()': 'auth.log.JsonFormatter',
+        },
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'json' if LOG_FORMAT == 'json' else 'text',
+            'filters': ['sample_debug'],
+        },
+    },
+    'loggers': {
+        app: {'handlers': ['console'], 'level': LOG_LEVEL, 'propagate': False}
+        for app in ('auth', 'users', 'farmers', 'customers', 'plant_detection', 'blobstore')
+    },
+}
+
 # Session settings
 SESSION_COOKIE_SAMESITE = 'Lax'
 SESSION_COOKIE_SECURE = False
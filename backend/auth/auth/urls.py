@@ -20,6 +20,8 @@ from django.http import HttpResponse
 from django.conf import settings
 from django.conf.urls.static import static
 
+from .metrics import metrics_view
+
 
 def home_view(request):
     return HttpResponse("Welcome to the Auth API")
@@ -30,6 +32,8 @@ urlpatterns = [
     path('api/plant/', include('plant_detection.urls')),
     path('api/farmer/', include('farmers.urls')),
     path('api/customer/', include('customers.urls')),
+    path('api/media/', include('blobstore.urls')),
+    path('metrics', metrics_view, name='metrics'),
 ]
 
 if settings.DEBUG:
@@ -0,0 +1,23 @@
+# blobstore/management/commands/build_renditions.py
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from blobstore.models import Blob
+from blobstore.renditions import generate_renditions
+
+
+class Command(BaseCommand):
+    help = "Generate missing thumbnails/renditions for product and detection images"
+
+    def handle(self, *args, **options):
+        sources = Blob.objects.filter(
+            Q(products__isnull=False) | Q(detection_results__isnull=False)
+        ).distinct().values_list('sha256', flat=True)
+
+        processed = 0
+        created = 0
+        for sha256 in sources.iterator(chunk_size=200):
+            created += generate_renditions(sha256)
+            processed += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Checked {processed} images, created {created} renditions"))
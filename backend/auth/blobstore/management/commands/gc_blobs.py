@@ -0,0 +1,64 @@
+# blobstore/management/commands/gc_blobs.py
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import CASCADE, ProtectedError
+from django.utils import timezone
+
+from blobstore.models import Blob
+from blobstore.storage import delete_blob_file
+
+
+def unreferenced_blobs(older_than):
+    """Blobs that no model points at any more (deleted detections, products, finished jobs)"""
+    blobs = Blob.objects.filter(created_at__lt=older_than)
+    for relation in Blob._meta.related_objects:
+        if relation.on_delete is CASCADE:
+            # Derived data such as Rendition.source does not keep its blob alive
+            continue
+        referenced = relation.related_model._base_manager.filter(
+            **{f'{relation.field.name}__isnull': False}
+        ).values(relation.field.attname)
+        blobs = blobs.exclude(sha256__in=referenced)
+    return blobs
+
+
+class Command(BaseCommand):
+    help = "Delete stored image blobs that are no longer referenced"
+
+    def add_arguments(self, parser):
+        # A blob stored by an upload that is still being saved has no reference yet
+        parser.add_argument('--min-age-hours', type=float, default=1.0,
+                            help='Only delete blobs created at least this long ago')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['min_age_hours'])
+
+        if options['dry_run']:
+            blobs = list(unreferenced_blobs(cutoff).values_list('sha256', 'size'))
+            freed = sum(size for _, size in blobs)
+            self.stdout.write(f"Would delete {len(blobs)} unreferenced blobs ({freed} bytes)")
+            return
+
+        deleted = 0
+        freed = 0
+        # Deleting a source blob deletes its renditions, whose blobs are
+        # only unreferenced from then on; repeat until a pass finds nothing
+        while True:
+            blobs = list(unreferenced_blobs(cutoff).values_list('sha256', 'size'))
+            removed = 0
+            for sha256, size in blobs:
+                try:
+                    Blob.objects.filter(sha256=sha256).delete()
+                except ProtectedError:
+                    # Re-uploaded and referenced again since the scan
+                    continue
+                delete_blob_file(sha256)
+                removed += 1
+                freed += size
+            deleted += removed
+            if not removed:
+                break
+
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} unreferenced blobs ({freed} bytes)"))
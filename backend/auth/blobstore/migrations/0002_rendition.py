@@ -0,0 +1,30 @@
+# Generated by Django 5.1.2 on 2026-10-17 18:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blobstore', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Rendition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('size', models.IntegerField()),
+                ('format', models.CharField(max_length=10)),
+                ('width', models.IntegerField()),
+                ('height', models.IntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('blob', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='rendition_uses', to='blobstore.blob')),
+                ('source', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='renditions', to='blobstore.blob')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('source', 'size', 'format'), name='unique_rendition')],
+            },
+        ),
+    ]
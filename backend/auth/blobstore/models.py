@@ -0,0 +1,37 @@
+# blobstore/models.py
+from django.db import models
+
+
+class Blob(models.Model):
+    """
+    An image stored on disk under its SHA-256 (see blobstore.storage).
+
+    Identical uploads share one row and one file; models reference a blob
+    with a ForeignKey instead of holding the bytes in a BinaryField.
+    """
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    size = models.BigIntegerField()
+    content_type = models.CharField(max_length=100, default='application/octet-stream')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Blob {self.sha256[:12]} ({self.size} bytes)"
+
+
+class Rendition(models.Model):
+    """A downscaled copy of a source image blob, itself stored as a blob"""
+    source = models.ForeignKey(Blob, on_delete=models.CASCADE, related_name='renditions')
+    blob = models.ForeignKey(Blob, on_delete=models.PROTECT, related_name='rendition_uses')
+    size = models.IntegerField()  # Requested max edge in pixels
+    format = models.CharField(max_length=10)  # 'webp' or 'jpeg'
+    width = models.IntegerField()
+    height = models.IntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['source', 'size', 'format'], name='unique_rendition'),
+        ]
+
+    def __str__(self):
+        return f"Rendition {self.size}px {self.format} of {self.source_id[:12]}"
@@ -0,0 +1,194 @@
+# blobstore/renditions.py
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .models import Blob, Rendition
+from .storage import put_blob, open_blob, read_blob, blob_url
+
+logger = logging.getLogger(__name__)
+
+FORMAT_CONTENT_TYPES = {
+    'webp': 'image/webp',
+    'jpeg': 'image/jpeg',
+}
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def rendition_settings():
+    return {
+        'sizes': tuple(sorted(getattr(settings, 'BLOBSTORE_RENDITION_SIZES', (128, 256, 768)))),
+        'formats': tuple(getattr(settings, 'BLOBSTORE_RENDITION_FORMATS', ('webp', 'jpeg'))),
+        'quality': getattr(settings, 'BLOBSTORE_RENDITION_QUALITY', 80),
+        'async': getattr(settings, 'BLOBSTORE_RENDITIONS_ASYNC', True),
+        'workers': getattr(settings, 'BLOBSTORE_RENDITION_WORKERS', 2),
+    }
+
+
+def requested_size(value):
+    """A ?size= value as one of BLOBSTORE_RENDITION_SIZES, or None for the original"""
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return None
+    return size if size in rendition_settings()['sizes'] else None
+
+
+def _encode(image, fmt, quality):
+    if fmt == 'jpeg' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    elif fmt == 'webp' and image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+
+    output = BytesIO()
+    if fmt == 'jpeg':
+        image.save(output, format='JPEG', quality=quality, optimize=True, progressive=True)
+    else:
+        image.save(output, format='WEBP', quality=quality, method=4)
+    return output.getvalue()
+
+
+def render_sizes(data, sizes):
+    """
+    Yield (size, PIL image) for every size smaller than the source, largest first.
+
+    For JPEG sources, draft() makes libjpeg decode at 1/2, 1/4 or 1/8 scale
+    in the DCT domain, so a 12 MP phone photo is never fully decoded just to
+    produce a 768px copy. Each smaller size is then scaled from the previous one.
+    """
+    image = Image.open(BytesIO(data))
+    source_edge = max(image.size)
+    wanted = [size for size in sorted(sizes, reverse=True) if size < source_edge]
+    if not wanted:
+        return
+
+    if image.format == 'JPEG':
+        image.draft('RGB', (wanted[0], wanted[0]))
+    image = ImageOps.exif_transpose(image)
+
+    for size in wanted:
+        image = image.copy()
+        image.thumbnail((size, size), Image.LANCZOS)
+        yield size, image
+
+
+def generate_renditions(source_sha256):
+    """Create the missing renditions of a blob; returns how many were created"""
+    config = rendition_settings()
+    existing = set(Rendition.objects.filter(source_id=source_sha256).values_list('size', 'format'))
+    missing = [
+        (size, fmt) for size in config['sizes'] for fmt in config['formats'] if (size, fmt) not in existing
+    ]
+    if not missing:
+        return 0
+
+    created = 0
+    try:
+        for size, image in render_sizes(read_blob(source_sha256), {size for size, _ in missing}):
+            for fmt in config['formats']:
+                if (size, fmt) in existing:
+                    continue
+                data = _encode(image, fmt, config['quality'])
+                blob = put_blob(data, FORMAT_CONTENT_TYPES[fmt])
+                _, was_created = Rendition.objects.get_or_create(
+                    source_id=source_sha256,
+                    size=size,
+                    format=fmt,
+                    defaults={'blob': blob, 'width': image.width, 'height': image.height}
+                )
+                created += was_created
+    except (UnidentifiedImageError, OSError, SyntaxError, ValueError) as e:
+        logger.warning("Could not render %s: %s", source_sha256[:12], e)
+    return created
+
+
+def _get_executor():
+    global _executor, _executor_pid
+    with _executor_lock:
+        # A forked worker inherits the executor object but not its threads
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(
+                max_workers=rendition_settings()['workers'], thread_name_prefix='renditions'
+            )
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def _generate(source_sha256):
+    try:
+        created = generate_renditions(source_sha256)
+        if created:
+            logger.debug("Generated %s renditions for %s", created, source_sha256[:12])
+    except Exception:
+        # `manage.py build_renditions` fills in whatever was missed here
+        logger.exception("Rendition generation failed for %s", source_sha256[:12])
+
+
+def _generate_in_background(source_sha256):
+    try:
+        _generate(source_sha256)
+    finally:
+        # Only on the executor's own threads: on the caller's thread this would
+        # close its connection, and with it any transaction it has open
+        close_old_connections()
+
+
+def schedule_renditions(blob):
+    """Generate renditions off the request thread, once the upload is committed"""
+    if not rendition_settings()['async']:
+        _generate(blob.sha256)
+        return
+    transaction.on_commit(lambda: _get_executor().submit(_generate_in_background, blob.sha256))
+
+
+def ingest_image(data, content_type=None):
+    """Store an uploaded image and queue its renditions; returns the Blob"""
+    blob = put_blob(data, content_type)
+    schedule_renditions(blob)
+    return blob
+
+
+def select_rendition(source_sha256, size, accept=''):
+    """(blob, content_type) of the best rendition for the Accept header, or None if not built yet"""
+    renditions = {
+        rendition.format: rendition
+        for rendition in Rendition.objects.filter(source_id=source_sha256, size=size).select_related('blob')
+    }
+    preferred = ['webp', 'jpeg'] if 'image/webp' in (accept or '') else ['jpeg']
+    for fmt in preferred:
+        if fmt in renditions:
+            return renditions[fmt].blob, FORMAT_CONTENT_TYPES[fmt]
+    return None
+
+
+def original_fits(source_sha256, size):
+    """
+    Whether the original is already no larger than ``size`` (or not an image
+    Pillow can read), in which case render_sizes never makes that rendition
+    and the original is the final answer. Only the header is read.
+    """
+    try:
+        with open_blob(source_sha256) as f, Image.open(f) as image:
+            return max(image.size) <= size
+    except FileNotFoundError:
+        return False
+    except (UnidentifiedImageError, OSError, SyntaxError, ValueError):
+        return True
+
+
+def media_url(url_name, object_id, sha256, request=None):
+    """
+    blob_url for an image field, carrying the list request's ?size= through
+    so the browser fetches the matching rendition instead of the original.
+    """
+    size = requested_size(request.GET.get('size')) if request else None
+    return blob_url(url_name, object_id, sha256, request, size=size)
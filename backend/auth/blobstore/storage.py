@@ -0,0 +1,98 @@
+# blobstore/storage.py
+import hashlib
+import os
+import tempfile
+
+from django.conf import settings
+from django.http import FileResponse
+from django.urls import reverse
+
+from .models import Blob
+
+
+def blob_root():
+    return getattr(settings, 'BLOBSTORE_ROOT', os.path.join(settings.BASE_DIR, 'blobs'))
+
+
+def blob_path(sha256):
+    """Sharded location of a blob: <root>/ab/cd/abcd..."""
+    return os.path.join(blob_root(), sha256[:2], sha256[2:4], sha256)
+
+
+def _write_file(sha256, data):
+    path = blob_path(sha256)
+    if os.path.exists(path):
+        return path
+
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    # Write to a temp file in the same directory and rename it into place, so
+    # a concurrent reader never sees a partially written blob
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return path
+
+
+def put_blob(data, content_type=None):
+    """
+    Store ``data`` and return its Blob row; storing the same bytes again only
+    returns the existing row.
+    """
+    data = bytes(data)
+    sha256 = hashlib.sha256(data).hexdigest()
+    _write_file(sha256, data)
+    blob, created = Blob.objects.get_or_create(
+        sha256=sha256,
+        defaults={'size': len(data), 'content_type': content_type or 'application/octet-stream'}
+    )
+    if not created:
+        # gc_blobs may have removed the file of an old unreferenced blob meanwhile
+        _write_file(sha256, data)
+    return blob
+
+
+def open_blob(sha256):
+    return open(blob_path(sha256), 'rb')
+
+
+def read_blob(sha256):
+    """Whole blob as bytes; prefer open_blob/blob_response for serving"""
+    with open_blob(sha256) as f:
+        return f.read()
+
+
+def blob_exists(sha256):
+    return os.path.exists(blob_path(sha256))
+
+
+def delete_blob_file(sha256):
+    path = blob_path(sha256)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def blob_response(blob, content_type=None, filename=None):
+    """
+    Stream a blob from disk. FileResponse reads it in chunks (or hands the
+    file to the server's wsgi.file_wrapper/sendfile), never the whole blob at once.
+    """
+    return FileResponse(
+        open_blob(blob.sha256),
+        content_type=content_type or blob.content_type,
+        filename=filename or '',
+    )
+
+
+def blob_url(url_name, object_id, sha256, request=None, size=None):
+    """URL of an image endpoint in blobstore.urls; absolute when a request is available"""
+    url = reverse(url_name, kwargs={'object_id': object_id, 'sha256': sha256})
+    if size:
+        url = f'{url}?size={size}'
+    return request.build_absolute_uri(url) if request else url
@@ -0,0 +1,212 @@
+import datetime
+import os
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from PIL import Image
+
+from farmers.models import Product
+from users.models import Farmer
+from .models import Rendition
+from .renditions import generate_renditions, original_fits, select_rendition
+from .storage import blob_path, put_blob, read_blob
+from .views import _etag_matches, _parse_range
+
+DATA = bytes(range(256)) * 4
+
+
+class RangeParsingTests(SimpleTestCase):
+
+    def test_single_ranges(self):
+        self.assertEqual(_parse_range('bytes=0-9', 100), (0, 9))
+        self.assertEqual(_parse_range('bytes=90-', 100), (90, 99))
+        self.assertEqual(_parse_range('bytes=-10', 100), (90, 99))
+        # Clamped to the end of the content
+        self.assertEqual(_parse_range('bytes=50-500', 100), (50, 99))
+        self.assertEqual(_parse_range('bytes=-500', 100), (0, 99))
+
+    def test_unsatisfiable_ranges(self):
+        self.assertIs(_parse_range('bytes=100-', 100), False)
+        self.assertIs(_parse_range('bytes=20-10', 100), False)
+        self.assertIs(_parse_range('bytes=-0', 100), False)
+
+    def test_ignored_ranges(self):
+        for header in ('bytes=-', 'bytes=0-1,5-6', 'items=0-9', 'bytes=a-b', ''):
+            with self.subTest(header=header):
+                self.assertIsNone(_parse_range(header, 100))
+
+    def test_etag_matching(self):
+        etag = '"abc"'
+        self.assertTrue(_etag_matches('"abc"', etag))
+        self.assertTrue(_etag_matches('W/"abc"', etag))
+        self.assertTrue(_etag_matches('"x", "abc"', etag))
+        self.assertTrue(_etag_matches('*', etag))
+        self.assertFalse(_etag_matches('"abcd"', etag))
+        self.assertFalse(_etag_matches(None, etag))
+
+
+def product_with_image(blob, content_type='image/jpeg'):
+    farmer = Farmer.objects.filter(email='grower@example.com').first()
+    if farmer is None:
+        farmer = Farmer(email='grower@example.com', name='Grower', district='D', state='S')
+        farmer.set_password('secret123')
+        farmer.save()
+    return Product.objects.create(
+        farmer=farmer, name='Tomato', price='10.00', unit='kg', description='', category='Vegetables',
+        stock=5, harvest_date=datetime.date(2026, 1, 1), image_blob=blob, image_content_type=content_type,
+    )
+
+
+def jpeg(width, height):
+    output = BytesIO()
+    Image.new('RGB', (width, height), (120, 160, 60)).save(output, format='JPEG')
+    return output.getvalue()
+
+
+class BlobRootMixin:
+    """Blobs go to a temporary BLOBSTORE_ROOT"""
+
+    def setUp(self):
+        super().setUp()
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        storage = override_settings(BLOBSTORE_ROOT=root)
+        storage.enable()
+        self.addCleanup(storage.disable)
+
+
+class BlobMediaViewTests(BlobRootMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.blob = put_blob(DATA, 'image/jpeg')
+        self.product = product_with_image(self.blob)
+        self.url = f'/api/media/products/{self.product.id}/{self.blob.sha256}'
+        self.etag = f'"{self.blob.sha256}"'
+
+    def body(self, response):
+        return b''.join(response.streaming_content) if response.streaming else response.content
+
+    def test_full_response(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response), DATA)
+        self.assertEqual(response['ETag'], self.etag)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('immutable', response['Cache-Control'])
+
+    def test_if_none_match_is_304(self):
+        for header in (self.etag, f'W/{self.etag}', f'"other", {self.etag}', '*'):
+            with self.subTest(header=header):
+                response = self.client.get(self.url, HTTP_IF_NONE_MATCH=header)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b'')
+                self.assertEqual(response['ETag'], self.etag)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH='"other"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response), DATA)
+
+    def test_single_range_is_206(self):
+        for header, start, end in (('bytes=0-9', 0, 9), ('bytes=1000-', 1000, 1023), ('bytes=-24', 1000, 1023)):
+            with self.subTest(header=header):
+                response = self.client.get(self.url, HTTP_RANGE=header)
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(self.body(response), DATA[start:end + 1])
+                self.assertEqual(response['Content-Range'], f'bytes {start}-{end}/{len(DATA)}')
+                self.assertEqual(int(response['Content-Length']), end - start + 1)
+
+    def test_unsatisfiable_range_is_416(self):
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={len(DATA)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(DATA)}')
+
+    def test_ignored_ranges_get_the_whole_blob(self):
+        # Multiple ranges are not supported, and If-Range with another ETag means the copy is stale
+        for headers in ({'HTTP_RANGE': 'bytes=0-1,5-6'}, {'HTTP_RANGE': 'bytes=0-9', 'HTTP_IF_RANGE': '"stale"'}):
+            with self.subTest(headers=headers):
+                response = self.client.get(self.url, **headers)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(self.body(response), DATA)
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=self.etag)
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(self.body(response), DATA[:10])
+
+    def test_mismatched_id_or_hash_is_404(self):
+        other = put_blob(b'another image', 'image/jpeg')
+        for url in (
+            f'/api/media/products/{self.product.id}/{other.sha256}',
+            f'/api/media/products/{self.product.id + 1}/{self.blob.sha256}',
+            f'/api/media/detections/{self.product.id}/{self.blob.sha256}',
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_missing_file_is_404(self):
+        Product.objects.filter(pk=self.product.pk).update(image_blob=put_blob(b'gone', 'image/jpeg'))
+        sha256 = Product.objects.get(pk=self.product.pk).image_blob_id
+        os.remove(blob_path(sha256))
+        self.assertEqual(self.client.get(f'/api/media/products/{self.product.id}/{sha256}').status_code, 404)
+
+    def test_range_on_missing_file_is_404(self):
+        os.remove(blob_path(self.blob.sha256))
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9')
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(BLOBSTORE_RENDITION_SIZES=(128, 256, 768), BLOBSTORE_RENDITION_FORMATS=('webp', 'jpeg'))
+class RenditionTests(BlobRootMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.large = put_blob(jpeg(1000, 500), 'image/jpeg')
+        self.small = put_blob(jpeg(200, 100), 'image/jpeg')
+
+    def url(self, blob, size):
+        return f'/api/media/products/{product_with_image(blob).id}/{blob.sha256}?size={size}'
+
+    def test_every_smaller_size_and_format_is_generated_once(self):
+        self.assertEqual(generate_renditions(self.large.sha256), 6)
+        self.assertEqual(generate_renditions(self.large.sha256), 0)
+        rendition = Rendition.objects.get(source=self.large, size=768, format='webp')
+        self.assertEqual((rendition.width, rendition.height), (768, 384))
+        with Image.open(BytesIO(read_blob(rendition.blob_id))) as image:
+            self.assertEqual((image.format, image.size), ('WEBP', (768, 384)))
+
+    def test_no_rendition_at_or_above_the_original_size(self):
+        self.assertEqual(generate_renditions(self.small.sha256), 2)
+        self.assertEqual(set(Rendition.objects.filter(source=self.small).values_list('size', flat=True)), {128})
+        self.assertTrue(original_fits(self.small.sha256, 256))
+        self.assertFalse(original_fits(self.small.sha256, 128))
+        self.assertFalse(original_fits(self.large.sha256, 768))
+
+    def test_selection_follows_accept(self):
+        generate_renditions(self.large.sha256)
+        blob, content_type = select_rendition(self.large.sha256, 256, 'image/avif,image/webp,*/*')
+        self.assertEqual(content_type, 'image/webp')
+        self.assertEqual(blob.content_type, 'image/webp')
+        blob, content_type = select_rendition(self.large.sha256, 256, 'image/*')
+        self.assertEqual(content_type, 'image/jpeg')
+        self.assertIsNone(select_rendition(self.small.sha256, 256, 'image/webp'))
+
+    def test_view_serves_the_rendition(self):
+        generate_renditions(self.large.sha256)
+        response = self.client.get(self.url(self.large, 256), HTTP_ACCEPT='image/webp,*/*')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertIn('Accept', response['Vary'])
+        self.assertIn('immutable', response['Cache-Control'])
+        rendition = Rendition.objects.get(source=self.large, size=256, format='webp')
+        self.assertEqual(b''.join(response.streaming_content), read_blob(rendition.blob_id))
+
+    def test_pending_rendition_is_briefly_cached(self):
+        response = self.client.get(self.url(self.large, 256))
+        self.assertEqual(response['Cache-Control'], 'public, max-age=60')
+        self.assertEqual(b''.join(response.streaming_content), read_blob(self.large.sha256))
+
+    def test_small_original_is_final(self):
+        generate_renditions(self.small.sha256)
+        response = self.client.get(self.url(self.small, 256))
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(b''.join(response.streaming_content), read_blob(self.small.sha256))
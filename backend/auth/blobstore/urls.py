@@ -0,0 +1,8 @@
+# blobstore/urls.py
+from django.urls import path
+from .views import ProductImageView, DetectionImageView
+
+urlpatterns = [
+    path('products/<int:object_id>/<str:sha256>', ProductImageView.as_view(), name='product-image'),
+    path('detections/<int:object_id>/<str:sha256>', DetectionImageView.as_view(), name='detection-image'),
+]
@@ -0,0 +1,191 @@
+# blobstore/views.py
+import logging
+import re
+
+from rest_framework.views import APIView
+from rest_framework.permissions import AllowAny
+from rest_framework.negotiation import BaseContentNegotiation
+from django.views.decorators.csrf import csrf_exempt
+from django.utils.decorators import method_decorator
+from django.http import Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+
+from farmers.models import Product
+from plant_detection.models import PlantDetectionResult
+from .renditions import original_fits, requested_size, select_rendition
+from .storage import blob_response, open_blob
+
+logger = logging.getLogger(__name__)
+
+# The URL names the exact content, so a response can be cached forever
+IMMUTABLE_MAX_AGE = 31536000
+# ...except for a ?size= request answered with the original while the
+# rendition is still being generated
+PENDING_RENDITION_MAX_AGE = 60
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+
+
+def _etag_matches(header, etag):
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    # Weak comparison, as RFC 9110 requires for If-None-Match
+    candidates = [tag.strip() for tag in header.split(',')]
+    return any(tag.removeprefix('W/') == etag for tag in candidates)
+
+
+def _parse_range(header, size):
+    """
+    (start, end) inclusive for a single "bytes=" range, None to ignore the
+    header (malformed or multiple ranges), or False when it is unsatisfiable.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match or match.group(1) == match.group(2) == '':
+        return None
+
+    first, last = match.groups()
+    if first == '':
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+class _RangeReader:
+    """
+    Bytes start..end (inclusive) of an already opened blob file, in chunks.
+    The file is opened before the response is built, so a missing blob is a
+    404 rather than a 206 that breaks off; StreamingHttpResponse calls close().
+    """
+
+    def __init__(self, f, start, end):
+        self.file = f
+        self.start = start
+        self.end = end
+
+    def __iter__(self):
+        self.file.seek(self.start)
+        remaining = self.end - self.start + 1
+        while remaining > 0:
+            chunk = self.file.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+    def close(self):
+        self.file.close()
+
+
+def serve_blob(request, blob, content_type=None, cache_control=None):
+    """
+    Stream a blob with a strong ETag (its SHA-256), answering If-None-Match
+    with 304 and a single-range Range request with 206.
+    """
+    etag = f'"{blob.sha256}"'
+    content_type = content_type or blob.content_type
+
+    if _etag_matches(request.headers.get('If-None-Match'), etag):
+        response = HttpResponseNotModified()
+    else:
+        byte_range = None
+        range_header = request.headers.get('Range')
+        if_range = request.headers.get('If-Range')
+        if range_header and (not if_range or if_range.strip() == etag):
+            byte_range = _parse_range(range_header, blob.size)
+
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{blob.size}'
+        elif byte_range:
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                _RangeReader(open_blob(blob.sha256), start, end), status=206, content_type=content_type
+            )
+            response['Content-Range'] = f'bytes {start}-{end}/{blob.size}'
+            response['Content-Length'] = end - start + 1
+        else:
+            response = blob_response(blob, content_type=content_type)
+
+    response['ETag'] = etag
+    response['Cache-Control'] = cache_control or f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+class IgnoreClientContentNegotiation(BaseContentNegotiation):
+    """Image responses are built by hand; an Accept of image/* must not turn into a 406"""
+
+    def select_parser(self, request, parsers):
+        return parsers[0]
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class BlobMediaView(APIView):
+    """
+    Base for image endpoints of the form <kind>/<object id>/<sha256>.
+
+    Loaded by <img src>, which cannot send the JWT: the id and the content
+    hash must match, so a URL only works if it was handed out by the API.
+    Subclasses set ``model``, a model with image_blob and
+    image_content_type fields.
+    """
+    authentication_classes = []
+    permission_classes = [AllowAny]
+    content_negotiation_class = IgnoreClientContentNegotiation
+    cache_scope = 'public'
+    model = None
+
+    def get_image(self, object_id, sha256):
+        """Return (blob, content_type) or raise Http404"""
+        row = self.model.objects.filter(id=object_id, image_blob_id=sha256).select_related('image_blob').only(
+            'image_blob', 'image_content_type'
+        ).first()
+        if not row:
+            raise Http404('Image not found')
+        return row.image_blob, row.image_content_type
+
+    def get(self, request, object_id, sha256):
+        blob, content_type = self.get_image(object_id, sha256)
+        cache_control = f'{self.cache_scope}, max-age={IMMUTABLE_MAX_AGE}, immutable'
+
+        size = requested_size(request.GET.get('size'))
+        if size:
+            rendition = select_rendition(blob.sha256, size, request.headers.get('Accept'))
+            if rendition:
+                blob, content_type = rendition
+            elif not original_fits(blob.sha256, size):
+                # Renditions are still being generated: serve the original,
+                # but only briefly cached. An original that is already this
+                # small never gets a rendition and is cached like one.
+                cache_control = f'{self.cache_scope}, max-age={PENDING_RENDITION_MAX_AGE}'
+
+        try:
+            response = serve_blob(request, blob, content_type, cache_control)
+        except FileNotFoundError:
+            logger.error("Blob file missing on disk: %s", blob.sha256)
+            raise Http404('Image not found')
+        if size:
+            response['Vary'] = 'Accept'
+        return response
+
+
+class ProductImageView(BlobMediaView):
+    model = Product
+
+
+class DetectionImageView(BlobMediaView):
+    model = PlantDetectionResult
+    cache_scope = 'private'
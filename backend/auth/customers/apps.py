@@ -4,3 +4,18 @@ from django.apps import AppConfig
 class CustomersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'customers'
+
+    def ready(self):
+        from django.core import checks
+        from django.db.models.signals import post_delete, post_save
+        from farmers.models import Product
+        from users.models import Farmer
+        from . import marketplace_cache
+
+        # Retire cached marketplace pages once a product, its stock or its farmer changes
+        post_save.connect(marketplace_cache.product_changed, sender=Product, dispatch_uid='marketplace_cache_product_save')
+        post_delete.connect(marketplace_cache.product_changed, sender=Product,
+                            dispatch_uid='marketplace_cache_product_delete')
+        post_save.connect(marketplace_cache.farmer_changed, sender=Farmer, dispatch_uid='marketplace_cache_farmer_save')
+        # With a per-process cache the other workers serve stale stock until their entries expire
+        checks.register(marketplace_cache.check_shared_cache, checks.Tags.caches, deploy=True)
@@ -0,0 +1,150 @@
+# customers/marketplace_cache.py
+"""
+Versioned cache of MarketplaceView responses.
+
+Every listing is stored under a key built from the version tokens of
+its scope plus the request's parameters. The scope is the customer's
+(state, district), or "all" when the customer's address is incomplete.
+A product change replaces the version token of its farmer's district
+and of "all". The old entries are never read again and age out after
+MARKETPLACE_CACHE_TTL seconds. A farmer change (a new name, or a move
+to another district) replaces the epoch token, which is part of every
+key.
+
+The entries and the tokens live in the 'marketplace' cache (CACHES in
+settings). The file backend (MARKETPLACE_CACHE_BACKEND=file) is shared by
+every process on the node, so one process's invalidation reaches the
+others too. locmem is per process: the other workers keep serving their
+entries until they expire, which is why settings keeps the TTL short for
+it and check_shared_cache() warns about it in `check --deploy`.
+"""
+import hashlib
+import json
+import threading
+import uuid
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.db import transaction
+
+from auth.metrics import counter, gauge
+
+CACHE_ALIAS = 'marketplace'
+
+LOOKUPS = counter(
+    'marketplace_cache_lookups_total',
+    'Marketplace response cache lookups by result',
+    ['result'],
+)
+HIT_RATIO = gauge(
+    'marketplace_cache_hit_ratio',
+    'Share of marketplace response cache lookups answered from the cache (this process)',
+)
+INVALIDATIONS = counter(
+    'marketplace_cache_invalidations_total',
+    'Marketplace cache version bumps by scope',
+    ['scope'],
+)
+
+_stats = {'hits': 0, 'lookups': 0}
+_stats_lock = threading.Lock()
+
+EPOCH = 'epoch'
+ALL = 'all'
+
+
+def marketplace_cache():
+    return caches[CACHE_ALIAS]
+
+
+def _digest(value):
+    return hashlib.sha256(json.dumps(value, default=str).encode('utf-8')).hexdigest()
+
+
+def scope(state=None, district=None):
+    """Invalidation scope of a listing filtered to (state, district), or of the unfiltered listing"""
+    return f'district:{_digest([state, district])[:32]}' if state and district else ALL
+
+
+def _version_key(name):
+    return f'marketplace:version:{name}'
+
+
+def current_version(listing_scope):
+    """Version tag for keys in ``listing_scope``; a missing token (never set, or evicted) is created"""
+    cache = marketplace_cache()
+    names = (EPOCH, listing_scope)
+    tokens = cache.get_many([_version_key(name) for name in names])
+    version = []
+    for name in names:
+        key = _version_key(name)
+        token = tokens.get(key)
+        if token is None:
+            # add() so that concurrent first requests agree on one token
+            cache.add(key, uuid.uuid4().hex, None)
+            token = cache.get(key)
+        version.append(token)
+    return ':'.join(version)
+
+
+def bump(*scopes):
+    """Retire the version tokens of ``scopes``: their cached listings are never served again"""
+    marketplace_cache().set_many({_version_key(name): uuid.uuid4().hex for name in scopes}, None)
+    for name in scopes:
+        INVALIDATIONS.inc(name.split(':', 1)[0])
+
+
+def entry_key(version, parts):
+    return f'marketplace:page:{_digest([version, parts])}'
+
+
+def get(key):
+    value = marketplace_cache().get(key)
+    hit = value is not None
+    LOOKUPS.inc('hit' if hit else 'miss')
+    with _stats_lock:
+        _stats['lookups'] += 1
+        _stats['hits'] += hit
+        HIT_RATIO.set(_stats['hits'] / _stats['lookups'])
+    return value
+
+
+def store(key, value):
+    marketplace_cache().set(key, value, getattr(settings, 'MARKETPLACE_CACHE_TTL', 300))
+
+
+def product_changed(sender, instance, **kwargs):
+    """post_save/post_delete receiver for Product (see CustomersConfig.ready); stock changes count too"""
+    from users.models import Farmer
+
+    try:
+        farmer = instance.farmer
+    except Farmer.DoesNotExist:
+        # Deleted together with its farmer: no district to narrow it down to
+        transaction.on_commit(lambda: bump(EPOCH))
+        return
+    scopes = (scope(farmer.state, farmer.district), ALL)
+    transaction.on_commit(lambda: bump(*scopes))
+
+
+def farmer_changed(sender, instance, created, **kwargs):
+    """post_save receiver for Farmer: its name and location appear in every listing of its products"""
+    if not created:
+        transaction.on_commit(lambda: bump(EPOCH))
+
+
+def check_shared_cache(app_configs, **kwargs):
+    """Deploy check (registered in CustomersConfig.ready): invalidations must reach every worker"""
+    backend = settings.CACHES.get(CACHE_ALIAS, {}).get('BACKEND', '')
+    if not backend.endswith('.LocMemCache'):
+        return []
+    return [checks.Warning(
+        'The marketplace response cache is per process (LocMemCache).',
+        hint=(
+            'Stock changes only invalidate the cache of the worker that made them; the other workers serve '
+            f"stale listings for up to MARKETPLACE_CACHE_TTL ({getattr(settings, 'MARKETPLACE_CACHE_TTL', 300)}s). "
+            'Set MARKETPLACE_CACHE_BACKEND=file when running more than one worker process.'
+        ),
+        id='customers.W001',
+    )]
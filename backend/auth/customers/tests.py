@@ -1,3 +1,159 @@
-from django.test import TestCase
+import base64
+import datetime
+import json
 
-# Create your tests here.
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from auth.pagination import (
+    InvalidCursor, decode_cursor, decode_offset_cursor, encode_cursor, encode_offset_cursor, keyset_page,
+)
+from farmers.models import Product
+from users.models import Customer, Farmer
+from users.tokens import issue_tokens
+from . import marketplace_cache
+
+
+def raw_cursor(value):
+    """A cursor built by hand, the way a client could tamper with one"""
+    return base64.urlsafe_b64encode(json.dumps(value).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+class CursorTests(SimpleTestCase):
+
+    def test_keyset_cursor_round_trip(self):
+        created_at = datetime.datetime(2026, 1, 2, 3, 4, 5, 678901, tzinfo=datetime.timezone.utc)
+        cursor = encode_cursor(created_at, 42)
+        self.assertNotIn('=', cursor)
+        self.assertEqual(decode_cursor(cursor), (created_at, 42))
+
+    def test_offset_cursor_round_trip(self):
+        self.assertEqual(decode_offset_cursor(encode_offset_cursor(0)), 0)
+        self.assertEqual(decode_offset_cursor(encode_offset_cursor(48)), 48)
+
+    def test_invalid_keyset_cursors(self):
+        for cursor in (
+            'not a cursor', '!!!', raw_cursor({'offset': 3}), raw_cursor(['yesterday', 1]),
+            raw_cursor(['2026-01-01T00:00:00+00:00', '7']), raw_cursor(['2026-01-01T00:00:00+00:00']),
+        ):
+            with self.subTest(cursor=cursor):
+                with self.assertRaises(InvalidCursor):
+                    decode_cursor(cursor)
+
+    def test_invalid_offset_cursors(self):
+        for cursor in ('not a cursor', raw_cursor({'offset': -1}), raw_cursor({'offset': '5'}), raw_cursor([5])):
+            with self.subTest(cursor=cursor):
+                with self.assertRaises(InvalidCursor):
+                    decode_offset_cursor(cursor)
+
+
+class SharedCacheCheckTests(SimpleTestCase):
+
+    def cache_settings(self, backend):
+        return override_settings(CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+            'marketplace': {'BACKEND': backend, 'LOCATION': '/tmp/marketplace-check'},
+        })
+
+    def test_locmem_is_flagged(self):
+        with self.cache_settings('django.core.cache.backends.locmem.LocMemCache'):
+            self.assertEqual([w.id for w in marketplace_cache.check_shared_cache(None)], ['customers.W001'])
+
+    def test_shared_backend_passes(self):
+        with self.cache_settings('django.core.cache.backends.filebased.FileBasedCache'):
+            self.assertEqual(marketplace_cache.check_shared_cache(None), [])
+
+
+class MarketplacePaginationTests(TestCase):
+
+    def setUp(self):
+        # Product changes invalidate the response cache on commit, which a TestCase never reaches
+        marketplace_cache.marketplace_cache().clear()
+        self.farmer = Farmer(email='grower@example.com', name='Grower', district='D', state='S')
+        self.farmer.set_password('secret123')
+        self.farmer.save()
+        customer = Customer(email='buyer@example.com', name='Buyer', district='D', state='S')
+        customer.set_password('secret123')
+        customer.save()
+        token = issue_tokens(customer.id, customer.email, 'customer', False, True)['token']
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {token}'}
+
+    def create_products(self, count, name='Tomato'):
+        return [
+            Product.objects.create(farmer=self.farmer, name=f'{name} {n}', price='10.00', unit='kg', description='',
+                                   category='Vegetables', stock=5, harvest_date=datetime.date(2026, 1, 1))
+            for n in range(count)
+        ]
+
+    def get_page(self, **params):
+        return self.client.get('/api/customer/marketplace/', params, **self.auth)
+
+    def walk(self, limit, **params):
+        """Every product id, page by page, and the number of pages"""
+        ids, pages, cursor = [], 0, None
+        while True:
+            response = self.get_page(limit=limit, **params, **({'cursor': cursor} if cursor else {}))
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            ids += [product['id'] for product in data['products']]
+            pages += 1
+            cursor = data['next_cursor']
+            if cursor is None:
+                return ids, pages
+
+    def test_pages_cover_every_product_once_newest_first(self):
+        products = self.create_products(7)
+        base = timezone.now()
+        for n, product in enumerate(products):
+            Product.objects.filter(pk=product.pk).update(created_at=base - datetime.timedelta(minutes=n))
+        ids, pages = self.walk(limit=3)
+        self.assertEqual(ids, [product.id for product in products])
+        self.assertEqual(pages, 3)
+
+    def test_equal_created_at_is_broken_by_id(self):
+        products = self.create_products(5)
+        Product.objects.update(created_at=timezone.now())
+        # Every page boundary falls inside the tie
+        ids, _ = self.walk(limit=2)
+        self.assertEqual(ids, sorted((product.id for product in products), reverse=True))
+
+    def test_page_boundary(self):
+        self.create_products(3)
+        data = self.get_page(limit=3).json()
+        # limit + 1 rows are fetched: exactly ``limit`` rows means there is no next page
+        self.assertEqual(len(data['products']), 3)
+        self.assertIsNone(data['next_cursor'])
+
+        # Run the on_commit invalidation of the cached first page, as a committed save would
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_products(1, name='Onion')
+        data = self.get_page(limit=3).json()
+        self.assertEqual(len(data['products']), 3)
+        self.assertIsNotNone(data['next_cursor'])
+        last = self.get_page(limit=3, cursor=data['next_cursor']).json()
+        self.assertEqual(len(last['products']), 1)
+        self.assertIsNone(last['next_cursor'])
+        self.assertEqual(last['total_products'], 4)
+
+    def test_keyset_page_on_a_queryset(self):
+        products = self.create_products(4)
+        Product.objects.update(created_at=timezone.now())
+        rows, cursor = keyset_page(Product.objects.values('id', 'created_at'), limit=3)
+        self.assertEqual([row['id'] for row in rows], [product.id for product in reversed(products)][:3])
+        rows, cursor = keyset_page(Product.objects.values('id', 'created_at'), cursor=cursor, limit=3)
+        self.assertEqual([row['id'] for row in rows], [products[0].id])
+        self.assertIsNone(cursor)
+
+    def test_invalid_or_tampered_cursor_is_400(self):
+        self.create_products(3)
+        for cursor in ('garbage', raw_cursor(['2026-01-01T00:00:00+00:00', 'DROP']), raw_cursor({'offset': 1})):
+            with self.subTest(cursor=cursor):
+                response = self.get_page(limit=2, cursor=cursor)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json()['detail'], 'Invalid cursor')
+
+    def test_invalid_cursor_on_search_is_400(self):
+        self.create_products(3)
+        # Rejected by the offset decoder (full-text path) and the keyset decoder (icontains fallback) alike
+        response = self.get_page(search='tomato', limit=2, cursor=raw_cursor({'offset': -3}))
+        self.assertEqual(response.status_code, 400)
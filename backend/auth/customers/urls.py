@@ -1,9 +1,10 @@
 # customers/urls.py
 from django.urls import path
-from .views import MarketplaceView, CreateOrderView, CustomerOrdersView
+from .views import MarketplaceView, MarketplaceSuggestView, CreateOrderView, CustomerOrdersView
 
 urlpatterns = [
     path('marketplace/', MarketplaceView.as_view(), name='customer-marketplace'),
+    path('marketplace/suggest/', MarketplaceSuggestView.as_view(), name='customer-marketplace-suggest'),
     path('orders/', CreateOrderView.as_view(), name='create-order'),
     path('orders/history/', CustomerOrdersView.as_view(), name='customer-orders'),
 ]
\ No newline at end of file
@@ -5,15 +5,41 @@ from django.utils.decorators import method_decorator
 from django.shortcuts import get_object_or_404
 from django.core.mail import send_mail
 from django.conf import settings
+from django.db.models import Q
+from blobstore.renditions import requested_size
+from auth.pagination import keyset_page, parse_limit, decode_offset_cursor, encode_offset_cursor, InvalidCursor
 from farmers.models import Product, Order, OrderItem
 from users.models import Customer, Farmer
 from users.permissions import IsAuthenticatedWithJWT
-from farmers.serializers import ProductSerializer, OrderSerializer
+from farmers.search import count_products, search_backend, search_products, search_words
+from farmers.suggest import suggest_index
+from farmers.serializers import MARKETPLACE_VALUES, OrderSerializer, marketplace_products_data
+from . import marketplace_cache
+import hashlib
 import json
+import logging
 from datetime import datetime, timedelta
 import random
 import string
 
+logger = logging.getLogger(__name__)
+
+
+def get_customer_instance(user):
+    """The authenticated Customer; JWTAuthentication already loaded it, so no query is needed"""
+    return user if isinstance(user, Customer) else None
+
+
+def marketplace_count(version, filters, count):
+    """count() for one combination of listing filters, cached for MARKETPLACE_COUNT_CACHE_TTL seconds"""
+    key = 'marketplace_count:' + hashlib.sha256(json.dumps([version, filters]).encode('utf-8')).hexdigest()
+    counts = marketplace_cache.marketplace_cache()
+    total = counts.get(key)
+    if total is None:
+        total = count()
+        counts.set(key, total, getattr(settings, 'MARKETPLACE_COUNT_CACHE_TTL', 60))
+    return total
+
 
 @method_decorator(csrf_exempt, name='dispatch')
 class MarketplaceView(APIView):
@@ -22,17 +48,17 @@ class MarketplaceView(APIView):
     def get(self, request):
         try:
             # Get customer's district and state for location-based filtering
-            customer = Customer.objects.filter(id=request.user.id).first()
+            customer = get_customer_instance(request.user)
             if not customer:
                 return Response({'detail': 'Customer profile not found'}, status=404)
 
             customer_district = customer.district
             customer_state = customer.state
             
-            print(f"🔍 Customer location - District: {customer_district}, State: {customer_state}")
+            logger.debug("Customer location - District: %s, State: %s", customer_district, customer_state)
             
-            # Get all active products
-            products = Product.objects.filter(is_active=True).select_related('farmer')
+            # Active products, newest first, with only the columns the listing shows
+            products = Product.objects.filter(is_active=True)
             
             # If customer has district and state, filter by farmers in the same district AND state
             if customer_district and customer_state:
@@ -40,53 +66,102 @@ class MarketplaceView(APIView):
                     farmer__district=customer_district,
                     farmer__state=customer_state
                 )
-                print(f"✅ Filtered products by district: {customer_district} and state: {customer_state}")
+                logger.debug("Filtered products by district: %s and state: %s", customer_district, customer_state)
             else:
-                print("⚠️ Customer address incomplete - showing all products")
+                logger.warning("Customer address incomplete - showing all products")
             
             # Apply additional filters from query parameters
             category = request.GET.get('category')
-            search = request.GET.get('search')
-            
-            if category and category != 'All':
-                products = products.filter(category=category)
-                print(f"✅ Filtered by category: {category}")
-            
-            if search:
-                products = products.filter(name__icontains=search) | products.filter(farmer__name__icontains=search)
-                print(f"✅ Filtered by search: {search}")
+            search = ' '.join(request.GET.get('search', '').split()) or None
+            if category == 'All':
+                category = None
+            limit = parse_limit(request.GET.get('limit'), default=getattr(settings, 'MARKETPLACE_PAGE_SIZE', 24))
+            words = search_words(search)
+            use_index = bool(words) and search_backend() is not None
+            # The index only sees the words; icontains sees the whole (whitespace-normalized) text
+            filters = [customer_district, customer_state, category, words if use_index else search]
+
+            # Same filters and page for the same district: answer from the response cache
+            version = marketplace_cache.current_version(marketplace_cache.scope(customer_state, customer_district))
+            cache_key = marketplace_cache.entry_key(version, [
+                filters, request.GET.get('cursor'), limit,
+                # Image URLs are absolute and carry the ?size= rendition
+                request.build_absolute_uri('/'), requested_size(request.GET.get('size')),
+            ])
+            cached = marketplace_cache.get(cache_key)
+            if cached is not None:
+                return Response(cached)
             
-            # Enhance product data with farmer info
-            enhanced_products = []
-            for product in products:
-                product_data = ProductSerializer(product).data
-                product_data['farmer_name'] = product.farmer.name
-                product_data['farmer_district'] = product.farmer.district or 'Unknown District'
-                product_data['farmer_city'] = product.farmer.city or 'Unknown City'
-                product_data['farmer_state'] = product.farmer.state or 'Unknown State'
-                product_data['farmer_phone'] = product.farmer.phone
-                enhanced_products.append(product_data)
+            if use_index:
+                # Full-text index: ranked matches, paged by position in the ranking
+                location = (customer_district, customer_state) if customer_district and customer_state else (None, None)
+                try:
+                    offset = decode_offset_cursor(request.GET['cursor']) if request.GET.get('cursor') else 0
+                except InvalidCursor:
+                    return Response({'detail': 'Invalid cursor'}, status=400)
+                ids = search_products(words, *location, category=category, offset=offset, limit=limit + 1)
+                next_cursor = encode_offset_cursor(offset + limit) if len(ids) > limit else None
+                ids = ids[:limit]
+                found = {row['id']: row for row in products.filter(id__in=ids).values(*MARKETPLACE_VALUES)}
+                rows = [found[product_id] for product_id in ids if product_id in found]
+                total = marketplace_count(version, filters, lambda: count_products(words, *location, category=category))
+                logger.debug("Full-text search: %s matches", total)
+            else:
+                if category:
+                    products = products.filter(category=category)
+                    logger.debug("Filtered by category: %s", category)
+                
+                if search:
+                    products = products.filter(Q(name__icontains=search) | Q(farmer__name__icontains=search))
+                    logger.debug("Filtered by search: %s", search)
+                
+                try:
+                    rows, next_cursor = keyset_page(
+                        products.values(*MARKETPLACE_VALUES),
+                        cursor=request.GET.get('cursor'),
+                        limit=limit
+                    )
+                except InvalidCursor:
+                    return Response({'detail': 'Invalid cursor'}, status=400)
+                total = marketplace_count(version, filters, products.count)
             
-            return Response({
-                'products': enhanced_products,
+            data = {
+                'products': marketplace_products_data(rows, request),
+                'next_cursor': next_cursor,
                 'customer_district': customer_district,
                 'customer_state': customer_state,
-                'total_products': products.count(),
+                'total_products': total,
                 'filter_applied': bool(customer_district and customer_state)
-            })
+            }
+            marketplace_cache.store(cache_key, data)
+            return Response(data)
             
         except Exception as e:
-            print(f"❌ Error in marketplace: {str(e)}")
+            logger.exception("Error in marketplace")
             return Response({'detail': f'Failed to fetch marketplace: {str(e)}'}, status=400)
 
 
+@method_decorator(csrf_exempt, name='dispatch')
+class MarketplaceSuggestView(APIView):
+    """Type-ahead for the marketplace search box, from the in-memory index (no database query)"""
+    permission_classes = [IsAuthenticatedWithJWT]
+
+    def get(self, request):
+        customer = get_customer_instance(request.user)
+        if not customer:
+            return Response({'detail': 'Customer profile not found'}, status=404)
+        limit = parse_limit(request.GET.get('limit'), default=8, maximum=20)
+        suggestions = suggest_index().suggest(request.GET.get('q', ''), state=customer.state, limit=limit)
+        return Response({'suggestions': suggestions})
+
+
 @method_decorator(csrf_exempt, name='dispatch')
 class CreateOrderView(APIView):
     permission_classes = [IsAuthenticatedWithJWT]
 
     def post(self, request):
         try:
-            customer = Customer.objects.filter(id=request.user.id).first()
+            customer = get_customer_instance(request.user)
             if not customer:
                 return Response({'detail': 'Customer profile not found'}, status=404)
 
@@ -94,7 +169,7 @@ class CreateOrderView(APIView):
             if not cart_items:
                 return Response({'detail': 'Cart is empty'}, status=400)
 
-            print(f"🛒 Creating order with {len(cart_items)} items for customer: {customer.email}")
+            logger.debug("Creating order with %s items for customer %s", len(cart_items), customer.id)
 
             total_amount = 0
             order_items = []
@@ -183,14 +258,14 @@ class CreateOrderView(APIView):
                 
                 # Update product stock
                 item['product'].stock -= item['quantity']
-                item['product'].save()
+                item['product'].save(update_fields=['stock', 'updated_at'])
 
             # Send notification to farmer
             self.send_farmer_notification(order)
 
             serializer = OrderSerializer(order)
             
-            print(f"✅ Order created successfully: {order_id}")
+            logger.debug("Order created successfully: %s", order_id)
             
             return Response({
                 'message': 'Order placed successfully!',
@@ -200,7 +275,7 @@ class CreateOrderView(APIView):
             })
             
         except Exception as e:
-            print(f"❌ Error creating order: {str(e)}")
+            logger.exception("Error creating order")
             return Response({'detail': f'Failed to create order: {str(e)}'}, status=400)
 
     def send_farmer_notification(self, order):
@@ -229,9 +304,9 @@ class CreateOrderView(APIView):
                 [order.farmer.email],
                 fail_silently=True,
             )
-            print(f"📧 Notification sent to farmer: {order.farmer.email}")
-        except Exception as e:
-            print(f"❌ Failed to send farmer notification: {str(e)}")
+            logger.debug("Notification sent to farmer %s", order.farmer.id)
+        except Exception:
+            logger.exception("Failed to send farmer notification")
 
 
 @method_decorator(csrf_exempt, name='dispatch')
@@ -240,7 +315,7 @@ class CustomerOrdersView(APIView):
 
     def get(self, request):
         try:
-            customer = Customer.objects.filter(id=request.user.id).first()
+            customer = get_customer_instance(request.user)
             if not customer:
                 return Response({'detail': 'Customer profile not found'}, status=404)
 
@@ -248,12 +323,12 @@ class CustomerOrdersView(APIView):
             orders = Order.objects.filter(customer_email=customer.email).order_by('-created_at')
             serializer = OrderSerializer(orders, many=True)
             
-            print(f"✅ Fetched {orders.count()} orders for customer: {customer.email}")
+            logger.debug("Fetched %s orders for customer %s", len(serializer.data), customer.id)
             
             return Response(serializer.data)
             
         except Exception as e:
-            print(f"❌ Error fetching customer orders: {str(e)}")
+            logger.exception("Error fetching customer orders")
             return Response({'detail': f'Failed to fetch orders: {str(e)}'}, status=400)
 
 
@@ -4,3 +4,18 @@ from django.apps import AppConfig
 class FarmersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'farmers'
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_save
+        from users.models import Farmer
+        from .models import Product
+        from . import search, suggest
+
+        # Keep the full-text search index in step with products and their farmers
+        post_save.connect(search.product_saved, sender=Product, dispatch_uid='product_search_save')
+        post_delete.connect(search.product_deleted, sender=Product, dispatch_uid='product_search_delete')
+        post_save.connect(search.farmer_saved, sender=Farmer, dispatch_uid='product_search_farmer_save')
+        # ...and this process's type-ahead index, once the change has committed
+        post_save.connect(suggest.product_saved, sender=Product, dispatch_uid='product_suggest_save')
+        post_delete.connect(suggest.product_deleted, sender=Product, dispatch_uid='product_suggest_delete')
+        post_save.connect(suggest.farmer_saved, sender=Farmer, dispatch_uid='product_suggest_farmer_save')
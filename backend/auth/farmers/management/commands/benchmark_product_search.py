@@ -0,0 +1,119 @@
+# farmers/management/commands/benchmark_product_search.py
+import datetime
+import random
+import statistics
+import time
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_delete
+
+from farmers import search
+from farmers.models import Product
+from users.models import Farmer
+
+PRODUCE = ['tomato', 'onion', 'potato', 'mango', 'banana', 'spinach', 'carrot', 'brinjal', 'okra', 'chilli',
+           'coriander', 'mint', 'cabbage', 'cauliflower', 'guava', 'papaya', 'beetroot', 'radish', 'garlic', 'ginger']
+ADJECTIVES = ['fresh', 'organic', 'country', 'hybrid', 'red', 'green', 'baby', 'ripe', 'desi', 'premium']
+CATEGORIES = ['Vegetables', 'Fruits', 'Leafy Greens', 'Root Vegetables', 'Herbs']
+WORDS = ['harvested', 'this', 'week', 'from', 'our', 'farm', 'grown', 'without', 'pesticides', 'sweet', 'crisp',
+         'juicy', 'village', 'naturally', 'sun', 'dried', 'handpicked', 'local', 'seasonal', 'quality']
+QUERIES = ['tomato', 'tom', 'organic mango', 'fresh green chilli', 'pesticides', 'gin', 'papaya juicy']
+
+
+class Command(BaseCommand):
+    help = (
+        "Load synthetic products and compare marketplace search through the full-text index "
+        "with the icontains filter it replaces"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100000)
+        parser.add_argument('--farmers', type=int, default=200)
+        parser.add_argument('--repeat', type=int, default=5, help='Runs of each query')
+        parser.add_argument('--keep', action='store_true', help='Keep the synthetic rows instead of deleting them')
+
+    def handle(self, *args, **options):
+        if search.search_backend() is None:
+            raise CommandError("No full-text search index on this database (see farmers/search.py)")
+        run = uuid.uuid4().hex[:8]
+        rng = random.Random(run)
+
+        started = time.perf_counter()
+        farmers = []
+        for n in range(options['farmers']):
+            # Unusable password: hashing is not what is measured
+            farmer = Farmer(email=f'search-{run}-{n}@example.invalid', name=f'Farmer {run} {n}', password='!',
+                            district=f'District {n % 10}', state='Telangana')
+            farmer.save()
+            farmers.append(farmer)
+        products = [
+            Product(
+                farmer=rng.choice(farmers),
+                name=f'{rng.choice(ADJECTIVES)} {rng.choice(PRODUCE)}'.title(),
+                description=' '.join(rng.choices(WORDS + PRODUCE, k=12)),
+                category=rng.choice(CATEGORIES),
+                price='20.00', unit='kg', stock=10, harvest_date=datetime.date.today(),
+            )
+            for _ in range(options['products'])
+        ]
+        Product.objects.bulk_create(products, batch_size=2000)
+        loaded = time.perf_counter()
+        ids = list(Product.objects.filter(farmer__in=farmers).values_list('id', flat=True))
+        # bulk_create sends no signals; index the new rows in batches
+        with transaction.atomic():
+            indexed = search.index_products(Product.objects.filter(farmer__in=farmers))
+        self.stdout.write(
+            f"{options['products']} products loaded in {loaded - started:.1f}s, "
+            f"{indexed} indexed in {time.perf_counter() - loaded:.1f}s ({search.search_backend().vendor})"
+        )
+
+        try:
+            location = ('District 3', 'Telangana')
+            self.stdout.write(f"{'query':<22}{'matches':>9}{'icontains ms':>14}{'index ms':>10}{'speedup':>9}")
+            for query in QUERIES:
+                words = search.search_words(query)
+                like_ms, like_total = self._time(options['repeat'], lambda: self._icontains(query, location))
+                index_ms, index_total = self._time(options['repeat'], lambda: self._index(words, location))
+                self.stdout.write(
+                    f"{query:<22}{index_total:>9}{like_ms:>14.1f}{index_ms:>10.1f}"
+                    f"{like_ms / index_ms if index_ms else 0.0:>8.1f}x"
+                )
+                if query.count(' ') == 0 and like_total != index_total:
+                    # Single words: the old filter is a substring match, the index a word-prefix match
+                    self.stdout.write(f"  icontains found {like_total} (substring matches)")
+        finally:
+            if not options['keep']:
+                self._cleanup(ids, farmers)
+
+    def _time(self, repeat, func):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = func()
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings), result
+
+    def _icontains(self, query, location):
+        """First page and total, the way MarketplaceView searched before the index"""
+        products = Product.objects.filter(is_active=True, farmer__district=location[0], farmer__state=location[1])
+        products = products.filter(Q(name__icontains=query) | Q(farmer__name__icontains=query))
+        list(products.order_by('-created_at', '-id').values('id')[:24])
+        return products.count()
+
+    def _index(self, words, location):
+        search.search_products(words, *location, limit=24)
+        return search.count_products(words, *location)
+
+    def _cleanup(self, ids, farmers):
+        # Drop the documents in bulk rather than one post_delete at a time
+        post_delete.disconnect(search.product_deleted, sender=Product, dispatch_uid='product_search_delete')
+        try:
+            for start in range(0, len(ids), 2000):
+                search.unindex_products(ids[start:start + 2000])
+                Product.objects.filter(id__in=ids[start:start + 2000]).delete()
+            Farmer.objects.filter(pk__in=[farmer.pk for farmer in farmers]).delete()
+        finally:
+            post_delete.connect(search.product_deleted, sender=Product, dispatch_uid='product_search_delete')
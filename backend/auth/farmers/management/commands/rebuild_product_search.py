@@ -0,0 +1,20 @@
+# farmers/management/commands/rebuild_product_search.py
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from farmers import search
+from farmers.models import Product
+
+
+class Command(BaseCommand):
+    help = "Reload the full-text product search index from the products table"
+
+    def handle(self, *args, **options):
+        if search.search_backend() is None and not search.create_index(connection):
+            raise CommandError("Full-text search is not available on this database (see farmers/search.py)")
+        started = time.perf_counter()
+        with transaction.atomic():
+            indexed = search.rebuild_index(Product)
+        self.stdout.write(f"Indexed {indexed} active products in {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,108 @@
+# farmers/migrations/0004_product_search.py
+#
+# The table layout and documents are copied from farmers/search.py as it was
+# when this migration was written, so later changes there do not change
+# what this migration does.
+import hashlib
+import logging
+
+from django.db import migrations
+
+logger = logging.getLogger(__name__)
+
+TABLE = 'farmers_product_search'
+
+CREATE_SQL = {
+    'sqlite': [
+        f'CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5('
+        'name, description, category, farmer_name, filters, '
+        "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    ],
+    'mysql': [
+        f'CREATE TABLE IF NOT EXISTS {TABLE} ('
+        'product_id BIGINT PRIMARY KEY, name VARCHAR(255) NOT NULL, description TEXT NOT NULL, '
+        'category VARCHAR(100) NOT NULL, farmer_name VARCHAR(255) NOT NULL, '
+        'district VARCHAR(100) NOT NULL, state VARCHAR(100) NOT NULL, '
+        'FULLTEXT KEY product_search_text (name, description, category, farmer_name)'
+        ') ENGINE=InnoDB',
+    ],
+    'postgresql': [
+        f'CREATE TABLE IF NOT EXISTS {TABLE} ('
+        'product_id BIGINT PRIMARY KEY, category VARCHAR(100) NOT NULL, '
+        'district VARCHAR(100) NOT NULL, state VARCHAR(100) NOT NULL, document TSVECTOR NOT NULL)',
+        f'CREATE INDEX IF NOT EXISTS product_search_document ON {TABLE} USING GIN (document)',
+    ],
+}
+
+INSERT_SQL = {
+    'sqlite': f'INSERT INTO {TABLE} (rowid, name, description, category, farmer_name, filters) '
+              'VALUES (%s, %s, %s, %s, %s, %s)',
+    'mysql': f'REPLACE INTO {TABLE} (product_id, name, description, category, farmer_name, district, state) '
+             'VALUES (%s, %s, %s, %s, %s, %s, %s)',
+    'postgresql': f'INSERT INTO {TABLE} (product_id, category, district, state, document) VALUES (%s, %s, %s, %s, '
+                  "setweight(to_tsvector('simple', %s), 'A') || setweight(to_tsvector('simple', %s), 'B') || "
+                  "setweight(to_tsvector('simple', %s), 'C') || setweight(to_tsvector('simple', %s), 'D')) "
+                  'ON CONFLICT (product_id) DO NOTHING',
+}
+
+
+def _token(kind, *values):
+    return kind + hashlib.blake2b('\x00'.join(values).encode('utf-8'), digest_size=8).hexdigest()
+
+
+def _row(vendor, pk, name, description, category, farmer_name, district, state):
+    if vendor == 'sqlite':
+        return (pk, name, description, category, farmer_name,
+                f"{_token('loc', district, state)} {_token('cat', category)}")
+    if vendor == 'mysql':
+        return (pk, name, description, category, farmer_name, district, state)
+    return (pk, category, district, state, name, farmer_name, category, description)
+
+
+def create_product_search(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor not in CREATE_SQL:
+        # Other backends search with icontains
+        return
+    try:
+        with connection.cursor() as cursor:
+            for statement in CREATE_SQL[connection.vendor]:
+                cursor.execute(statement)
+    except Exception:
+        # e.g. an SQLite build without FTS5
+        logger.warning("Product search index not created on %s; search falls back to icontains", connection.vendor,
+                       exc_info=True)
+        return
+
+    Product = apps.get_model('farmers', 'Product')
+    rows = Product.objects.filter(is_active=True).values_list(
+        'id', 'name', 'description', 'category', 'farmer__name', 'farmer__district', 'farmer__state'
+    )
+    batch = []
+    with connection.cursor() as cursor:
+        for row in rows.iterator(chunk_size=2000):
+            batch.append(_row(connection.vendor, row[0], *(value or '' for value in row[1:])))
+            if len(batch) >= 2000:
+                cursor.executemany(INSERT_SQL[connection.vendor], batch)
+                batch = []
+        if batch:
+            cursor.executemany(INSERT_SQL[connection.vendor], batch)
+
+
+def drop_product_search(apps, schema_editor):
+    if schema_editor.connection.vendor in CREATE_SQL:
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('farmers', '0003_product_active_recent_idx'),
+        # The documents read the farmer's district and state
+        ('users', '0002_rename_address_customer_street_address_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_product_search, drop_product_search),
+    ]
@@ -13,8 +13,10 @@ class Product(models.Model):
     category = models.CharField(max_length=100)
     stock = models.IntegerField(default=0)
     
-    # Store image as binary data
-    image = models.BinaryField(null=True, blank=True)
+    # Image bytes live in the blob store, the row only holds their SHA-256
+    image_blob = models.ForeignKey(
+        'blobstore.Blob', null=True, blank=True, on_delete=models.PROTECT, related_name='products'
+    )
     image_name = models.CharField(max_length=255, null=True, blank=True)
     image_content_type = models.CharField(max_length=100, null=True, blank=True)
     
@@ -24,6 +26,12 @@ class Product(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True)  # Changed to True by default
 
+    class Meta:
+        indexes = [
+            # Marketplace keyset pagination: active products, newest first
+            models.Index(fields=['is_active', '-created_at', '-id'], name='product_active_recent_idx'),
+        ]
+
     def __str__(self):
         return f"{self.name} - {self.farmer.name}"
 
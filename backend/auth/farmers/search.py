@@ -0,0 +1,330 @@
+# farmers/search.py
+"""
+Full-text index over active products for marketplace search.
+
+Each active product has one document in farmers_product_search: its
+name, description and category, and its farmer's name. The farmer's
+district and state are stored next to it, so the location filter runs
+inside the index query. How the document is stored depends on the
+database backend:
+
+  sqlite      FTS5 virtual table, ranked with bm25(); location and category
+              are hashed into tokens of a separate column, so a filtered
+              search intersects posting lists instead of ranking every
+              match in the country and discarding most of them
+  mysql       InnoDB table with a FULLTEXT index, searched with MATCH ...
+              AGAINST in boolean mode (words shorter than
+              innodb_ft_min_token_size, 3 by default, are not indexed)
+  postgresql  table with a weighted tsvector column and a GIN index,
+              ranked with ts_rank()
+
+Every search word is matched as a prefix ("tom" finds "tomatoes"), and
+all the words must match. On any other backend, or if the table is
+missing (e.g. SQLite built without FTS5), search_backend() returns None
+and the marketplace falls back to icontains.
+
+The post_save/post_delete receivers connected in FarmersConfig.ready keep
+the index in step with Product and Farmer rows. QuerySet.update() and
+bulk_create() bypass them; run `manage.py rebuild_product_search`
+afterwards.
+"""
+import abc
+import hashlib
+import logging
+import re
+
+from django.db import connection
+
+from auth.metrics import histogram
+
+logger = logging.getLogger(__name__)
+
+TABLE = 'farmers_product_search'
+
+# Product fields that appear in a search document; saves that touch none of them skip reindexing
+INDEXED_FIELDS = frozenset({'name', 'description', 'category', 'is_active', 'farmer', 'farmer_id'})
+
+DOCUMENT_VALUES = ('id', 'name', 'description', 'category', 'farmer__name', 'farmer__district', 'farmer__state')
+
+SEARCH_SECONDS = histogram(
+    'marketplace_search_seconds',
+    'Time spent in full-text product search queries',
+    ['backend'],
+)
+
+_WORD = re.compile(r'\w+', re.UNICODE)
+
+
+def search_words(text):
+    """Lower-cased words of a user query; everything else (operators, quotes) is dropped"""
+    return [word.lower() for word in _WORD.findall(text or '')][:16]
+
+
+def _documents(rows):
+    for row in rows:
+        yield (
+            row['id'], row['name'] or '', row['description'] or '', row['category'] or '',
+            row['farmer__name'] or '', row['farmer__district'] or '', row['farmer__state'] or '',
+        )
+
+
+class SearchBackend(abc.ABC):
+    vendor = None
+
+    @abc.abstractmethod
+    def create(self, cursor):
+        """Create the table and its index if they do not exist"""
+
+    def drop(self, cursor):
+        cursor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+    def delete(self, cursor, ids):
+        placeholders = ', '.join(['%s'] * len(ids))
+        cursor.execute(f'DELETE FROM {TABLE} WHERE {self.id_column} IN ({placeholders})', list(ids))
+
+    @abc.abstractmethod
+    def upsert(self, cursor, documents):
+        """Insert or replace the documents (tuples from _documents)"""
+
+    @abc.abstractmethod
+    def match(self, words, district, state, category):
+        """(WHERE clause, params, rank expression, rank params) for the search words and filters"""
+
+    def _filters(self, district, state, category):
+        sql, params = [], []
+        for column, value in (('district', district), ('state', state), ('category', category)):
+            if value:
+                sql.append(f' AND {column} = %s')
+                params.append(value)
+        return ''.join(sql), params
+
+    def search(self, cursor, words, district=None, state=None, category=None, offset=0, limit=20):
+        """Product ids of one page of matches, best first"""
+        where, params, rank, rank_params = self.match(words, district, state, category)
+        cursor.execute(
+            f'SELECT {self.id_column} FROM {TABLE} WHERE {where} '
+            f'ORDER BY {rank}, {self.id_column} DESC LIMIT %s OFFSET %s',
+            params + rank_params + [limit, offset],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+    def count(self, cursor, words, district=None, state=None, category=None):
+        where, params, _, _ = self.match(words, district, state, category)
+        cursor.execute(f'SELECT COUNT(*) FROM {TABLE} WHERE {where}', params)
+        return cursor.fetchone()[0]
+
+
+class SQLiteSearch(SearchBackend):
+    vendor = 'sqlite'
+    id_column = 'rowid'
+
+    def create(self, cursor):
+        # ``filters`` holds the location and category tokens; prefix='2 3' indexes short prefixes too
+        cursor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5('
+            'name, description, category, farmer_name, filters, '
+            "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+
+    @staticmethod
+    def _token(kind, *values):
+        # Exact-match filter value as one bareword token
+        return kind + hashlib.blake2b('\x00'.join(values).encode('utf-8'), digest_size=8).hexdigest()
+
+    def upsert(self, cursor, documents):
+        # FTS5 tables have no UPSERT
+        self.delete(cursor, [document[0] for document in documents])
+        cursor.executemany(
+            f'INSERT INTO {TABLE} (rowid, name, description, category, farmer_name, filters) '
+            'VALUES (%s, %s, %s, %s, %s, %s)',
+            [(pk, name, description, category, farmer_name,
+              f"{self._token('loc', district, state)} {self._token('cat', category)}")
+             for pk, name, description, category, farmer_name, district, state in documents],
+        )
+
+    def match(self, words, district, state, category):
+        query = '{name description category farmer_name} : (%s)' % ' '.join(f'"{word}"*' for word in words)
+        if district and state:
+            query += ' AND filters : ' + self._token('loc', district, state)
+        if category:
+            query += ' AND filters : ' + self._token('cat', category)
+        # Column weights for bm25: name, description, category, farmer name, filters (lower rank = better)
+        return f'{TABLE} MATCH %s', [query], f'bm25({TABLE}, 10.0, 1.0, 2.0, 5.0, 0.0)', []
+
+
+class MySQLSearch(SearchBackend):
+    vendor = 'mysql'
+    id_column = 'product_id'
+
+    def create(self, cursor):
+        cursor.execute(
+            f'CREATE TABLE IF NOT EXISTS {TABLE} ('
+            'product_id BIGINT PRIMARY KEY, name VARCHAR(255) NOT NULL, description TEXT NOT NULL, '
+            'category VARCHAR(100) NOT NULL, farmer_name VARCHAR(255) NOT NULL, '
+            'district VARCHAR(100) NOT NULL, state VARCHAR(100) NOT NULL, '
+            'FULLTEXT KEY product_search_text (name, description, category, farmer_name)'
+            ') ENGINE=InnoDB'
+        )
+
+    def upsert(self, cursor, documents):
+        cursor.executemany(
+            f'REPLACE INTO {TABLE} (product_id, name, description, category, farmer_name, district, state) '
+            'VALUES (%s, %s, %s, %s, %s, %s, %s)',
+            documents,
+        )
+
+    def match(self, words, district, state, category):
+        query = ' '.join(f'+{word}*' for word in words)
+        against = 'MATCH (name, description, category, farmer_name) AGAINST (%s IN BOOLEAN MODE)'
+        filters, filter_params = self._filters(district, state, category)
+        return against + filters, [query] + filter_params, f'{against} DESC', [query]
+
+
+class PostgreSQLSearch(SearchBackend):
+    vendor = 'postgresql'
+    id_column = 'product_id'
+
+    def create(self, cursor):
+        cursor.execute(
+            f'CREATE TABLE IF NOT EXISTS {TABLE} ('
+            'product_id BIGINT PRIMARY KEY, category VARCHAR(100) NOT NULL, '
+            'district VARCHAR(100) NOT NULL, state VARCHAR(100) NOT NULL, document TSVECTOR NOT NULL)'
+        )
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS product_search_document ON {TABLE} USING GIN (document)')
+
+    def upsert(self, cursor, documents):
+        cursor.executemany(
+            f'INSERT INTO {TABLE} (product_id, category, district, state, document) VALUES (%s, %s, %s, %s, '
+            "setweight(to_tsvector('simple', %s), 'A') || setweight(to_tsvector('simple', %s), 'B') || "
+            "setweight(to_tsvector('simple', %s), 'C') || setweight(to_tsvector('simple', %s), 'D')) "
+            'ON CONFLICT (product_id) DO UPDATE SET category = EXCLUDED.category, '
+            'district = EXCLUDED.district, state = EXCLUDED.state, document = EXCLUDED.document',
+            [(pk, category, district, state, name, farmer_name, category, description)
+             for pk, name, description, category, farmer_name, district, state in documents],
+        )
+
+    def match(self, words, district, state, category):
+        query = ' & '.join(f'{word}:*' for word in words)
+        filters, filter_params = self._filters(district, state, category)
+        return (
+            "document @@ to_tsquery('simple', %s)" + filters, [query] + filter_params,
+            "ts_rank(document, to_tsquery('simple', %s)) DESC", [query],
+        )
+
+
+BACKENDS = {backend.vendor: backend for backend in (SQLiteSearch, MySQLSearch, PostgreSQLSearch)}
+
+_available = {}
+
+
+def backend_for(conn):
+    backend = BACKENDS.get(conn.vendor)
+    return backend() if backend else None
+
+
+def search_backend():
+    """The backend for the default database, or None when full-text search is unavailable"""
+    key = (connection.vendor, connection.settings_dict.get('NAME'))
+    if key not in _available:
+        _available[key] = connection.vendor in BACKENDS and TABLE in connection.introspection.table_names()
+    return backend_for(connection) if _available[key] else None
+
+
+def create_index(conn):
+    """Create the search table on ``conn`` if this backend supports it; returns whether it exists"""
+    backend = backend_for(conn)
+    if backend is None:
+        return False
+    try:
+        with conn.cursor() as cursor:
+            backend.create(cursor)
+    except Exception:
+        # e.g. an SQLite build without FTS5
+        logger.warning("Product search index not created on %s; search falls back to icontains", conn.vendor,
+                       exc_info=True)
+        return False
+    _available.clear()
+    return True
+
+
+def index_products(queryset, batch_size=2000):
+    """
+    (Re)index the products of ``queryset``: active ones are written, the
+    others removed. Returns the number of documents written.
+    """
+    backend = search_backend()
+    if backend is None:
+        return 0
+    written = 0
+    batch = []
+    stale = []
+
+    def flush():
+        with connection.cursor() as cursor:
+            if stale:
+                backend.delete(cursor, stale)
+            if batch:
+                backend.upsert(cursor, batch)
+
+    for row in queryset.values(*DOCUMENT_VALUES, 'is_active').iterator(chunk_size=batch_size):
+        if row['is_active']:
+            batch.extend(_documents([row]))
+        else:
+            stale.append(row['id'])
+        if len(batch) + len(stale) >= batch_size:
+            flush()
+            written += len(batch)
+            batch, stale = [], []
+    flush()
+    return written + len(batch)
+
+
+def unindex_products(ids):
+    backend = search_backend()
+    if backend is not None and ids:
+        with connection.cursor() as cursor:
+            backend.delete(cursor, list(ids))
+
+
+def rebuild_index(product_model):
+    """Empty the index and load every active product"""
+    backend = search_backend()
+    if backend is None:
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE}')
+    return index_products(product_model.objects.filter(is_active=True))
+
+
+def search_products(words, district=None, state=None, category=None, offset=0, limit=20):
+    """Ids of one page of active products matching every word, best match first"""
+    backend = search_backend()
+    with SEARCH_SECONDS.time(backend.vendor), connection.cursor() as cursor:
+        return backend.search(cursor, words, district, state, category, offset, limit)
+
+
+def count_products(words, district=None, state=None, category=None):
+    backend = search_backend()
+    with connection.cursor() as cursor:
+        return backend.count(cursor, words, district, state, category)
+
+
+def product_saved(sender, instance, update_fields=None, **kwargs):
+    """post_save receiver for Product (see FarmersConfig.ready)"""
+    if update_fields is not None and not INDEXED_FIELDS.intersection(update_fields):
+        return
+    index_products(sender.objects.filter(pk=instance.pk))
+
+
+def product_deleted(sender, instance, **kwargs):
+    unindex_products([instance.pk])
+
+
+def farmer_saved(sender, instance, created, update_fields=None, **kwargs):
+    """post_save receiver for Farmer: its name, district and state are part of its products' documents"""
+    if created:
+        return
+    if update_fields is not None and not {'name', 'district', 'state'}.intersection(update_fields):
+        return
+    from .models import Product
+    index_products(Product.objects.filter(farmer_id=instance.pk, is_active=True))
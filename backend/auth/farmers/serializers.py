@@ -1,7 +1,11 @@
 # farmers/serializers.py
+import logging
+
 from rest_framework import serializers
 from .models import Product, Order, OrderItem, FarmerStats
-import base64
+from blobstore.renditions import ingest_image, media_url
+
+logger = logging.getLogger(__name__)
 
 
 # farmers/serializers.py - Update the create method
@@ -18,40 +22,34 @@ class ProductSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at', 'updated_at', 'image_url']
 
     def get_image_url(self, obj):
-        """Generate base64 data URL for the image"""
-        if obj.image:
-            try:
-                encoded_image = base64.b64encode(obj.image).decode('utf-8')
-                content_type = obj.image_content_type or 'image/jpeg'
-                return f"data:{content_type};base64,{encoded_image}"
-            except Exception as e:
-                print(f"Error encoding image for product {obj.id}: {e}")
-                return None
+        """Cacheable /api/media/products/<id>/<sha256> URL for the image"""
+        if obj.image_blob_id:
+            return media_url('product-image', obj.id, obj.image_blob_id, self.context.get('request'))
         return None
 
     def create(self, validated_data):
-        print("🔍 Creating product with validated data")
+        logger.debug("Creating product with validated data")
         
         # Get the farmer instance from context
         farmer = self.context.get('farmer')
         if not farmer:
             raise serializers.ValidationError("Farmer instance is required")
         
-        print(f"🔍 Using farmer instance: {farmer.name} (ID: {farmer.id})")
+        logger.debug("Using farmer instance: %s (ID: %s)", farmer.name, farmer.id)
         
         # Handle image file from request
         request = self.context.get('request')
         if request and hasattr(request, 'FILES') and 'image' in request.FILES:
             image_file = request.FILES['image']
             
-            # Read image data and store as binary
-            validated_data['image'] = image_file.read()
+            # Store the image bytes in the blob store, keep only the reference
+            validated_data['image_blob'] = ingest_image(image_file.read(), image_file.content_type)
             validated_data['image_name'] = image_file.name
             validated_data['image_content_type'] = image_file.content_type
             
-            print(f"📷 Image uploaded: {image_file.name} ({image_file.content_type})")
+            logger.debug("Image uploaded: %s (%s)", image_file.name, image_file.content_type)
         else:
-            print("📷 No image uploaded")
+            logger.debug("No image uploaded")
         
         # Set is_active to True for new products
         validated_data['is_active'] = True
@@ -60,10 +58,53 @@ class ProductSerializer(serializers.ModelSerializer):
         validated_data['farmer'] = farmer
         product = Product.objects.create(**validated_data)
         
-        print(f"✅ Product created successfully - ID: {product.id}, is_active: {product.is_active}")
+        logger.debug("Product created successfully - ID: %s, is_active: %s", product.id, product.is_active)
         return product
 
 
+# Product and farmer columns the marketplace listing reads, for a values() query
+MARKETPLACE_VALUES = (
+    'id', 'name', 'price', 'unit', 'description', 'category', 'stock', 'image_blob_id',
+    'organic', 'harvest_date', 'created_at', 'is_active',
+    'farmer__name', 'farmer__district', 'farmer__city', 'farmer__state', 'farmer__phone',
+)
+
+_PRICE = serializers.DecimalField(max_digits=10, decimal_places=2)
+_HARVEST_DATE = serializers.DateField()
+_CREATED_AT = serializers.DateTimeField()
+
+
+def marketplace_products_data(rows, request=None):
+    """
+    Marketplace entries for MARKETPLACE_VALUES rows: ProductSerializer's
+    output plus the farmer fields, built straight from the row dicts instead
+    of constructing a serializer (and all its fields) per product.
+    """
+    data = []
+    for row in rows:
+        image_blob_id = row['image_blob_id']
+        data.append({
+            'id': row['id'],
+            'name': row['name'],
+            'price': _PRICE.to_representation(row['price']),
+            'unit': row['unit'],
+            'description': row['description'],
+            'category': row['category'],
+            'stock': row['stock'],
+            'image_url': media_url('product-image', row['id'], image_blob_id, request) if image_blob_id else None,
+            'organic': row['organic'],
+            'harvest_date': _HARVEST_DATE.to_representation(row['harvest_date']),
+            'created_at': _CREATED_AT.to_representation(row['created_at']),
+            'is_active': row['is_active'],
+            'farmer_name': row['farmer__name'],
+            'farmer_district': row['farmer__district'] or 'Unknown District',
+            'farmer_city': row['farmer__city'] or 'Unknown City',
+            'farmer_state': row['farmer__state'] or 'Unknown State',
+            'farmer_phone': row['farmer__phone'],
+        })
+    return data
+
+
 class OrderItemSerializer(serializers.ModelSerializer):
     product_name = serializers.CharField(source='product.name', read_only=True)
     
@@ -0,0 +1,247 @@
+# farmers/suggest.py
+"""
+In-memory prefix index behind /api/customer/marketplace/suggest/.
+
+For each state (and one bucket for all states) the index holds a sorted
+list of (key, kind, text) tuples over the names, categories and farmer
+districts of active products. Each multi-word text is also keyed by
+every word it contains, so "tom" finds "Cherry Tomatoes". A lookup
+bisects to the prefix and scans forward, with no database access, and
+ranks what it finds by how many active products carry the text.
+
+The index is per process. It is built on the first lookup. After that,
+the receivers connected in FarmersConfig.ready patch it once a product
+or farmer change has committed. Every SUGGEST_INDEX_REFRESH seconds it
+is rebuilt from the database, which also picks up changes made by other
+processes.
+"""
+import bisect
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+
+from auth.metrics import counter, histogram
+
+SUGGEST_SECONDS = histogram(
+    'marketplace_suggest_seconds',
+    'Time spent answering type-ahead suggestion lookups',
+)
+SUGGEST_REBUILDS = counter(
+    'marketplace_suggest_rebuilds_total',
+    'Full rebuilds of the in-memory suggestion index',
+)
+
+ALL_STATES = ''
+
+# Index entries examined per lookup before ranking; bounds the work for one-letter prefixes
+SCAN_LIMIT = 500
+
+# Product fields that feed the index; saves touching none of them leave it alone
+SUGGEST_FIELDS = frozenset({'name', 'category', 'is_active', 'farmer', 'farmer_id'})
+
+PRODUCT_VALUES = ('id', 'name', 'category', 'is_active', 'farmer__district', 'farmer__state')
+
+
+def normalize(text):
+    return ' '.join((text or '').casefold().split())
+
+
+def _keys(text):
+    words = normalize(text).split()
+    return {' '.join(words[i:]) for i in range(len(words))}
+
+
+def _entries(row):
+    """(state, [(kind, text), ...]) contributed by a PRODUCT_VALUES row, or None for an inactive product"""
+    if not row['is_active']:
+        return None
+    entries = [(kind, text.strip()) for kind, text in (
+        ('product', row['name']), ('category', row['category']), ('district', row['farmer__district']),
+    ) if text and text.strip()]
+    return (row['farmer__state'] or '').strip(), entries
+
+
+class _Bucket:
+    """Sorted keys plus a product count per (kind, text)"""
+    __slots__ = ('keys', 'counts')
+
+    def __init__(self):
+        self.keys = []
+        self.counts = {}
+
+    def add(self, kind, text):
+        count = self.counts.get((kind, text), 0)
+        self.counts[(kind, text)] = count + 1
+        if count == 0:
+            for key in _keys(text):
+                bisect.insort(self.keys, (key, kind, text))
+
+    def remove(self, kind, text):
+        count = self.counts.get((kind, text), 0)
+        if count > 1:
+            self.counts[(kind, text)] = count - 1
+            return
+        self.counts.pop((kind, text), None)
+        for key in _keys(text):
+            index = bisect.bisect_left(self.keys, (key, kind, text))
+            if index < len(self.keys) and self.keys[index] == (key, kind, text):
+                del self.keys[index]
+
+    def lookup(self, prefix, limit):
+        index = bisect.bisect_left(self.keys, (prefix,))
+        found = set()
+        end = min(len(self.keys), index + SCAN_LIMIT)
+        while index < end:
+            key, kind, text = self.keys[index]
+            if not key.startswith(prefix):
+                break
+            found.add((kind, text))
+            index += 1
+        ranked = sorted(found, key=lambda entry: (-self.counts[entry], entry[1]))
+        return [{'text': text, 'type': kind, 'count': self.counts[(kind, text)]} for kind, text in ranked[:limit]]
+
+
+class SuggestIndex:
+
+    def __init__(self, refresh=300):
+        self.refresh = float(refresh)
+        self._buckets = {}
+        self._products = {}
+        self._built_at = None
+        self._rebuilding = False
+        self._changed_while_rebuilding = {}
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+
+    @property
+    def built(self):
+        return self._built_at is not None
+
+    def _apply(self, buckets, products, product_id, entries):
+        previous = products.pop(product_id, None)
+        if previous is not None:
+            state, old_entries = previous
+            for bucket_state in {state, ALL_STATES}:
+                for kind, text in old_entries:
+                    buckets[bucket_state].remove(kind, text)
+        if entries is not None:
+            state, new_entries = entries
+            for bucket_state in {state, ALL_STATES}:
+                bucket = buckets.setdefault(bucket_state, _Bucket())
+                for kind, text in new_entries:
+                    bucket.add(kind, text)
+            products[product_id] = entries
+
+    def update(self, rows=(), removed_ids=()):
+        """Patch the index with fresh PRODUCT_VALUES rows and deleted product ids"""
+        changes = [(row['id'], _entries(row)) for row in rows] + [(pk, None) for pk in removed_ids]
+        with self._lock:
+            for product_id, entries in changes:
+                self._apply(self._buckets, self._products, product_id, entries)
+                if self._rebuilding:
+                    # The rebuild's query may predate this change; re-apply it after the swap
+                    self._changed_while_rebuilding[product_id] = entries
+
+    def rebuild(self):
+        from .models import Product
+
+        with self._lock:
+            self._rebuilding = True
+            self._changed_while_rebuilding = {}
+        try:
+            buckets = {ALL_STATES: _Bucket()}
+            products = {}
+            counts = {}
+            for row in Product.objects.filter(is_active=True).values(*PRODUCT_VALUES).iterator(chunk_size=5000):
+                state, entries = _entries(row)
+                products[row['id']] = (state, entries)
+                for bucket_state in {state, ALL_STATES}:
+                    bucket_counts = counts.setdefault(bucket_state, {})
+                    for entry in entries:
+                        bucket_counts[entry] = bucket_counts.get(entry, 0) + 1
+            # One sort per bucket instead of an insort per entry
+            for bucket_state, bucket_counts in counts.items():
+                bucket = buckets.setdefault(bucket_state, _Bucket())
+                bucket.counts = bucket_counts
+                bucket.keys = sorted((key, kind, text) for kind, text in bucket_counts for key in _keys(text))
+            with self._lock:
+                for product_id, entries in self._changed_while_rebuilding.items():
+                    self._apply(buckets, products, product_id, entries)
+                self._buckets, self._products = buckets, products
+                self._built_at = time.monotonic()
+        finally:
+            with self._lock:
+                self._rebuilding = False
+                self._changed_while_rebuilding = {}
+        SUGGEST_REBUILDS.inc()
+
+    def _maybe_rebuild(self):
+        if self._built_at is not None and time.monotonic() - self._built_at < self.refresh:
+            return
+        # The first build blocks; later refreshes run in one thread while the others read the old index
+        if not self._rebuild_lock.acquire(blocking=self._built_at is None):
+            return
+        try:
+            if self._built_at is None or time.monotonic() - self._built_at >= self.refresh:
+                self.rebuild()
+        finally:
+            self._rebuild_lock.release()
+
+    def suggest(self, prefix, state=None, limit=8):
+        """Up to ``limit`` {'text', 'type', 'count'} dicts for texts with a word starting with ``prefix``"""
+        self._maybe_rebuild()
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        with SUGGEST_SECONDS.time(), self._lock:
+            bucket = self._buckets.get(state if state else ALL_STATES)
+            return bucket.lookup(prefix, limit) if bucket is not None else []
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def suggest_index():
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = SuggestIndex(refresh=getattr(settings, 'SUGGEST_INDEX_REFRESH', 300))
+    return _index
+
+
+def refresh_products(**filters):
+    """Re-read the products matching ``filters`` into the index (after commit; no-op before the first build)"""
+    from .models import Product
+
+    index = suggest_index()
+    if index.built:
+        index.update(rows=list(Product.objects.filter(**filters).values(*PRODUCT_VALUES)))
+
+
+def product_saved(sender, instance, update_fields=None, **kwargs):
+    """post_save receiver for Product (see FarmersConfig.ready)"""
+    if update_fields is not None and not SUGGEST_FIELDS.intersection(update_fields):
+        return
+    if suggest_index().built:
+        product_id = instance.pk
+        transaction.on_commit(lambda: refresh_products(pk=product_id))
+
+
+def product_deleted(sender, instance, **kwargs):
+    if suggest_index().built:
+        product_id = instance.pk
+        transaction.on_commit(lambda: suggest_index().update(removed_ids=[product_id]))
+
+
+def farmer_saved(sender, instance, created, update_fields=None, **kwargs):
+    """post_save receiver for Farmer: its district and state are part of its products' entries"""
+    if created or not suggest_index().built:
+        return
+    if update_fields is not None and not {'district', 'state'}.intersection(update_fields):
+        return
+    farmer_id = instance.pk
+    transaction.on_commit(lambda: refresh_products(farmer_id=farmer_id))
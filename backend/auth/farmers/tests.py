@@ -1,3 +1,296 @@
-from django.test import TestCase
+import datetime
+import time
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+
+from customers import marketplace_cache
+from users.models import Customer, Farmer
+from users.tokens import issue_tokens
+from . import search, suggest
+from .models import Product
+
+
+def farmer(email, name='Grower', district='Ernakulam', state='Kerala'):
+    account = Farmer(email=email, name=name, district=district, state=state)
+    account.set_password('secret123')
+    account.save()
+    return account
+
+
+def product(owner, name, description='', category='Vegetables', **fields):
+    return Product.objects.create(
+        farmer=owner, name=name, price='10.00', unit='kg', description=description, category=category,
+        stock=5, harvest_date=datetime.date(2026, 1, 1), **fields
+    )
+
+
+class ProductSearchTests(TestCase):
+    """The SQLite FTS5 index (farmers/search.py) and the receivers that maintain it"""
+
+    def setUp(self):
+        self.assertIsInstance(search.search_backend(), search.SQLiteSearch)
+        self.grower = farmer('grower@example.com', name='Lakshmi Farms')
+        self.other = farmer('other@example.com', name='Ravi', district='Thrissur')
+        self.tomatoes = product(self.grower, 'Organic Tomatoes', 'Ripe and red')
+        self.mangoes = product(self.grower, 'Alphonso Mangoes', 'Sweet', category='Fruits')
+        self.far_tomatoes = product(self.other, 'Cherry Tomatoes')
+
+    def find(self, query, district=None, state=None, category=None):
+        return set(search.search_products(search.search_words(query), district, state, category))
+
+    def test_words_match_as_prefixes(self):
+        self.assertEqual(self.find('tom'), {self.tomatoes.id, self.far_tomatoes.id})
+        self.assertEqual(self.find('TOMATOES'), {self.tomatoes.id, self.far_tomatoes.id})
+        # Description and farmer name are searched too
+        self.assertEqual(self.find('swe'), {self.mangoes.id})
+        self.assertEqual(self.find('laksh'), {self.tomatoes.id, self.mangoes.id})
+        self.assertEqual(self.find('nothing'), set())
+
+    def test_every_word_must_match(self):
+        self.assertEqual(self.find('org tom'), {self.tomatoes.id})
+        self.assertEqual(self.find('cherry mango'), set())
+        # Query syntax is not passed through to FTS5
+        self.assertEqual(self.find('"tom" OR mango*'), set())
+        self.assertEqual(search.count_products(['tom']), 2)
+
+    def test_best_match_first(self):
+        product(self.grower, 'Onions', 'Goes well with tomatoes')
+        ids = search.search_products(['tomatoes'], 'Ernakulam', 'Kerala')
+        # A match in the name outranks one in the description
+        self.assertEqual(ids[0], self.tomatoes.id)
+        self.assertEqual(len(ids), 2)
+
+    def test_district_and_category_filters(self):
+        self.assertEqual(self.find('tom', 'Ernakulam', 'Kerala'), {self.tomatoes.id})
+        self.assertEqual(self.find('tom', 'Thrissur', 'Kerala'), {self.far_tomatoes.id})
+        self.assertEqual(self.find('tom', 'Ernakulam', 'Tamil Nadu'), set())
+        self.assertEqual(self.find('alph', category='Fruits'), {self.mangoes.id})
+        self.assertEqual(self.find('tom', 'Ernakulam', 'Kerala', category='Fruits'), set())
+        self.assertEqual(search.count_products(['tom'], 'Thrissur', 'Kerala', 'Vegetables'), 1)
+
+    def test_changed_product_is_reindexed(self):
+        self.tomatoes.name = 'Organic Potatoes'
+        self.tomatoes.category = 'Root Vegetables'
+        self.tomatoes.save()
+        self.assertEqual(self.find('tom'), {self.far_tomatoes.id})
+        self.assertEqual(self.find('pot', category='Root Vegetables'), {self.tomatoes.id})
+
+    def test_farmer_moving_district_reindexes_its_products(self):
+        self.grower.district = 'Thrissur'
+        self.grower.save(update_fields=['district'])
+        self.assertEqual(self.find('tom', 'Thrissur', 'Kerala'), {self.tomatoes.id, self.far_tomatoes.id})
+        self.assertEqual(self.find('tom', 'Ernakulam', 'Kerala'), set())
+
+    def test_farmer_rename_reindexes_its_products(self):
+        self.grower.name = 'Green Acres'
+        self.grower.save()
+        self.assertEqual(self.find('acres'), {self.tomatoes.id, self.mangoes.id})
+        self.assertEqual(self.find('laksh'), set())
+
+    def test_deactivated_product_is_dropped(self):
+        self.tomatoes.is_active = False
+        self.tomatoes.save(update_fields=['is_active'])
+        self.assertEqual(self.find('tom'), {self.far_tomatoes.id})
+        # Moving the farmer does not bring it back
+        self.grower.district = 'Thrissur'
+        self.grower.save()
+        self.assertEqual(self.find('tom'), {self.far_tomatoes.id})
+        self.tomatoes.is_active = True
+        self.tomatoes.save()
+        self.assertEqual(self.find('tom', 'Thrissur', 'Kerala'), {self.tomatoes.id, self.far_tomatoes.id})
+
+    def test_deleted_product_is_dropped(self):
+        self.far_tomatoes.delete()
+        self.assertEqual(self.find('tom'), {self.tomatoes.id})
+
+    def test_rebuild_picks_up_bulk_updates(self):
+        # QuerySet.update() bypasses the receivers
+        Product.objects.filter(pk=self.mangoes.pk).update(name='Banana')
+        self.assertEqual(self.find('banana'), set())
+        output = StringIO()
+        call_command('rebuild_product_search', stdout=output)
+        self.assertIn('Indexed 3 active products', output.getvalue())
+        self.assertEqual(self.find('banana'), {self.mangoes.id})
+        self.assertEqual(self.find('alphonso'), set())
+
+
+class MarketplaceSearchTests(TestCase):
+
+    def setUp(self):
+        marketplace_cache.marketplace_cache().clear()
+        grower = farmer('grower@example.com')
+        other = farmer('other@example.com', district='Thrissur')
+        self.tomatoes = product(grower, 'Organic Tomatoes')
+        product(grower, 'Tomato Seeds', category='Seeds')
+        product(other, 'Cherry Tomatoes')
+        customer = Customer(email='buyer@example.com', name='Buyer', district='Ernakulam', state='Kerala')
+        customer.set_password('secret123')
+        customer.save()
+        token = issue_tokens(customer.id, customer.email, 'customer', False, True)['token']
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {token}'}
+
+    def test_search_uses_the_customer_district_and_category(self):
+        response = self.client.get('/api/customer/marketplace/', {'search': 'tom', 'category': 'Vegetables'},
+                                   **self.auth)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([row['id'] for row in data['products']], [self.tomatoes.id])
+        self.assertEqual(data['total_products'], 1)
+
+
+def row(product_id, name, category='Vegetables', district='Ernakulam', state='Kerala', is_active=True):
+    """A suggest.PRODUCT_VALUES row"""
+    return {'id': product_id, 'name': name, 'category': category, 'is_active': is_active,
+            'farmer__district': district, 'farmer__state': state}
+
+
+def texts(suggestions):
+    return [(entry['type'], entry['text'], entry['count']) for entry in suggestions]
+
+
+class SuggestBucketTests(SimpleTestCase):
+
+    def test_every_word_is_a_key(self):
+        bucket = suggest._Bucket()
+        bucket.add('product', 'Cherry Tomatoes')
+        self.assertEqual(bucket.keys, [('cherry tomatoes', 'product', 'Cherry Tomatoes'),
+                                       ('tomatoes', 'product', 'Cherry Tomatoes')])
+        self.assertEqual(texts(bucket.lookup('tom', 8)), [('product', 'Cherry Tomatoes', 1)])
+        self.assertEqual(texts(bucket.lookup('cherry t', 8)), [('product', 'Cherry Tomatoes', 1)])
+        self.assertEqual(bucket.lookup('herry', 8), [])
+
+    def test_remove_keeps_keys_until_the_last_reference(self):
+        bucket = suggest._Bucket()
+        bucket.add('product', 'Cherry Tomatoes')
+        bucket.add('product', 'Cherry Tomatoes')
+        self.assertEqual(len(bucket.keys), 2)
+        self.assertEqual(bucket.counts, {('product', 'Cherry Tomatoes'): 2})
+        bucket.remove('product', 'Cherry Tomatoes')
+        self.assertEqual(len(bucket.keys), 2)
+        self.assertEqual(bucket.counts, {('product', 'Cherry Tomatoes'): 1})
+        bucket.remove('product', 'Cherry Tomatoes')
+        self.assertEqual((bucket.keys, bucket.counts), ([], {}))
+        # Removing what is not there is a no-op
+        bucket.remove('product', 'Cherry Tomatoes')
+        self.assertEqual((bucket.keys, bucket.counts), ([], {}))
+
+    def test_same_text_of_another_kind_is_kept(self):
+        bucket = suggest._Bucket()
+        bucket.add('product', 'Mango')
+        bucket.add('category', 'Mango')
+        bucket.remove('product', 'Mango')
+        self.assertEqual(texts(bucket.lookup('man', 8)), [('category', 'Mango', 1)])
+
+    def test_lookup_ranks_by_product_count(self):
+        bucket = suggest._Bucket()
+        for kind, text in (('product', 'Tomato'), ('category', 'Tomatoes'), ('category', 'Tomatoes'),
+                           ('product', 'Toor Dal'), ('product', 'Onion')):
+            bucket.add(kind, text)
+        self.assertEqual(texts(bucket.lookup('to', 8)),
+                         [('category', 'Tomatoes', 2), ('product', 'Tomato', 1), ('product', 'Toor Dal', 1)])
+        self.assertEqual(texts(bucket.lookup('to', 1)), [('category', 'Tomatoes', 2)])
+
+
+class SuggestIndexTests(SimpleTestCase):
+    """SuggestIndex.update() on an index that never touches the database"""
+
+    def setUp(self):
+        self.index = suggest.SuggestIndex(refresh=3600)
+        # Built as far as suggest() is concerned, so it never rebuilds from the database
+        self.index._built_at = time.monotonic()
+
+    def test_update_adds_products_to_their_state_and_all_states(self):
+        self.index.update(rows=[row(1, 'Tomatoes'), row(2, 'Tomatoes', district='Madurai', state='Tamil Nadu')])
+        self.assertEqual(texts(self.index.suggest('tom')), [('product', 'Tomatoes', 2)])
+        self.assertEqual(texts(self.index.suggest('tom', state='Kerala')), [('product', 'Tomatoes', 1)])
+        self.assertEqual(texts(self.index.suggest('mad', state='Tamil Nadu')), [('district', 'Madurai', 1)])
+        self.assertEqual(self.index.suggest('mad', state='Kerala'), [])
+        self.assertEqual(self.index.suggest('tom', state='Goa'), [])
+
+    def test_changed_product_replaces_its_entries(self):
+        self.index.update(rows=[row(1, 'Tomatoes'), row(2, 'Tomatoes')])
+        self.index.update(rows=[row(1, 'Onions', category='Bulbs')])
+        self.assertEqual(texts(self.index.suggest('tom')), [('product', 'Tomatoes', 1)])
+        self.assertEqual(texts(self.index.suggest('bul')), [('category', 'Bulbs', 1)])
+        self.assertEqual(texts(self.index.suggest('veg')), [('category', 'Vegetables', 1)])
+
+    def test_product_moving_state_changes_bucket(self):
+        self.index.update(rows=[row(1, 'Tomatoes')])
+        self.index.update(rows=[row(1, 'Tomatoes', district='Madurai', state='Tamil Nadu')])
+        self.assertEqual(self.index.suggest('tom', state='Kerala'), [])
+        self.assertEqual(texts(self.index.suggest('tom', state='Tamil Nadu')), [('product', 'Tomatoes', 1)])
+        self.assertEqual(texts(self.index.suggest('tom')), [('product', 'Tomatoes', 1)])
+        self.assertEqual(self.index.suggest('ern'), [])
+
+    def test_inactive_and_removed_products_are_dropped(self):
+        self.index.update(rows=[row(1, 'Tomatoes'), row(2, 'Mangoes', category='Fruits')])
+        self.index.update(rows=[row(1, 'Tomatoes', is_active=False)], removed_ids=[2, 99])
+        for prefix in ('tom', 'man', 'veg', 'fru', 'ern'):
+            with self.subTest(prefix=prefix):
+                self.assertEqual(self.index.suggest(prefix), [])
+        self.assertEqual(self.index._products, {})
+
+    def test_prefix_is_normalized(self):
+        self.index.update(rows=[row(1, 'Cherry  Tomatoes')])
+        self.assertEqual(texts(self.index.suggest('  CHERRY   tom')), [('product', 'Cherry  Tomatoes', 1)])
+        self.assertEqual(self.index.suggest('   '), [])
+
+
+class SuggestRebuildTests(TestCase):
+
+    def setUp(self):
+        grower = farmer('grower@example.com')
+        self.tomatoes = product(grower, 'Tomatoes')
+        self.mangoes = product(grower, 'Mangoes', category='Fruits')
+        self.index = suggest.SuggestIndex(refresh=3600)
+
+    def test_rebuild_loads_active_products(self):
+        product(self.tomatoes.farmer, 'Okra', is_active=False)
+        self.index.rebuild()
+        self.assertEqual(texts(self.index.suggest('tom')), [('product', 'Tomatoes', 1)])
+        self.assertEqual(texts(self.index.suggest('ern', state='Kerala')), [('district', 'Ernakulam', 2)])
+        self.assertEqual(self.index.suggest('okr'), [])
+
+    def test_changes_during_a_rebuild_are_replayed(self):
+        self.index.rebuild()
+        entries = suggest._entries
+        seen_during_rebuild = []
+
+        def commit_elsewhere(values):
+            # Another process commits while the rebuild is still reading the old rows
+            if not seen_during_rebuild:
+                seen_during_rebuild.append(True)
+                self.index.update(rows=[row(self.tomatoes.id, 'Onions')], removed_ids=[self.mangoes.id])
+                # Readers of the old index see the change at once
+                seen_during_rebuild.append(texts(self.index.suggest('oni')))
+            return entries(values)
+
+        with mock.patch.object(suggest, '_entries', side_effect=commit_elsewhere):
+            self.index.rebuild()
+        self.assertEqual(seen_during_rebuild[1], [('product', 'Onions', 1)])
+        # The rebuild read the rows as they were; the replay brings the changes back
+        self.assertEqual(texts(self.index.suggest('oni')), [('product', 'Onions', 1)])
+        self.assertEqual(self.index.suggest('tom'), [])
+        self.assertEqual(self.index.suggest('man'), [])
+        self.assertEqual(self.index._changed_while_rebuilding, {})
+        self.assertFalse(self.index._rebuilding)
+
+    def test_receivers_patch_the_index_after_commit(self):
+        index = suggest.SuggestIndex(refresh=3600)
+        with mock.patch.object(suggest, '_index', index):
+            index.rebuild()
+            with self.captureOnCommitCallbacks(execute=True):
+                self.mangoes.name = 'Alphonso Mangoes'
+                self.mangoes.save()
+            self.assertEqual(texts(index.suggest('alph')), [('product', 'Alphonso Mangoes', 1)])
+            with self.captureOnCommitCallbacks(execute=True):
+                self.tomatoes.farmer.state = 'Tamil Nadu'
+                self.tomatoes.farmer.save()
+            self.assertEqual(index.suggest('tom', state='Kerala'), [])
+            self.assertEqual(texts(index.suggest('tom', state='Tamil Nadu')), [('product', 'Tomatoes', 1)])
+            with self.captureOnCommitCallbacks(execute=True):
+                self.tomatoes.delete()
+            self.assertEqual(index.suggest('tom'), [])
@@ -46,7 +46,7 @@ class FarmerDashboardView(APIView):
             if not farmer_instance:
                 return Response({'detail': 'Farmer profile not found'}, status=404)
 
-            print(f"📊 Fetching dashboard for farmer: {farmer_instance.name} (ID: {farmer_instance.id})")
+            logger.debug("Fetching dashboard for farmer: %s (ID: %s)", farmer_instance.name, farmer_instance.id)
             
             # Get or create farmer stats
             stats, created = FarmerStats.objects.get_or_create(farmer_id=farmer_instance.id)
@@ -83,7 +83,7 @@ class FarmerDashboardView(APIView):
             
             serializer = FarmerStatsSerializer(stats)
             orders_serializer = OrderSerializer(recent_orders, many=True)
-            products_serializer = ProductSerializer(low_stock_products, many=True)
+            products_serializer = ProductSerializer(low_stock_products, many=True, context={'request': request})
             
             response_data = {
                 'stats': serializer.data,
@@ -105,11 +105,11 @@ class FarmerDashboardView(APIView):
                 }
             }
             
-            print(f"✅ Dashboard data fetched successfully for farmer {farmer_instance.id}")
+            logger.debug("Dashboard data fetched successfully for farmer %s", farmer_instance.id)
             return Response(response_data)
             
         except Exception as e:
-            print(f"❌ Error fetching dashboard data: {str(e)}")
+            logger.exception("Error fetching dashboard data")
             return Response({'detail': f'Failed to fetch dashboard data: {str(e)}'}, status=400)
 
 
@@ -125,16 +125,16 @@ class ProductListView(APIView):
             if not farmer_instance:
                 return Response({'detail': 'Farmer profile not found'}, status=404)
             
-            print(f"🔍 Fetching products for farmer: {farmer_instance.name} (ID: {farmer_instance.id})")
+            logger.debug("Fetching products for farmer: %s (ID: %s)", farmer_instance.name, farmer_instance.id)
             
             products = Product.objects.filter(farmer=farmer_instance, is_active=True).order_by('-created_at')
-            serializer = ProductSerializer(products, many=True)
+            serializer = ProductSerializer(products, many=True, context={'request': request})
             
-            print(f"✅ Found {len(products)} products for farmer {farmer_instance.id}")
+            logger.debug("Found %s products for farmer %s", len(products), farmer_instance.id)
             return Response(serializer.data)
             
         except Exception as e:
-            print(f"❌ Error fetching products: {str(e)}")
+            logger.exception("Error fetching products")
             return Response({'detail': f'Failed to fetch products: {str(e)}'}, status=400)
 
     def post(self, request):
@@ -158,9 +158,8 @@ class ProductListView(APIView):
                     'detail': 'Please complete your farm address before adding products. You can update it in your profile.'
                 }, status=400)
             
-            print(f"🔍 Creating product for farmer: {farmer_instance.name} (ID: {farmer_instance.id})")
-            print(f"🔍 Request data: {request.data}")
-            print(f"🔍 Request files: {request.FILES}")
+            logger.debug("Creating product for farmer: %s (ID: %s)", farmer_instance.name, farmer_instance.id)
+            logger.debug("Product fields: %s, files: %s", sorted(request.data.keys()), sorted(request.FILES.keys()))
             
             # Prepare data for serializer
             data = request.data.copy()
@@ -179,24 +178,22 @@ class ProductListView(APIView):
             )
             
             if serializer.is_valid():
-                print("✅ Serializer is valid, creating product...")
+                logger.debug("Serializer is valid, creating product...")
                 product = serializer.save()
-                print(f"✅ Product created successfully - ID: {product.id}, Name: {product.name}")
+                logger.debug("Product created successfully - ID: %s, Name: %s", product.id, product.name)
                 
                 # Return the created product with image URL
-                response_data = ProductSerializer(product).data
+                response_data = ProductSerializer(product, context={'request': request}).data
                 return Response(response_data, status=201)
             else:
-                print("❌ Serializer errors:", serializer.errors)
+                logger.warning("Invalid product data: %s", serializer.errors)
                 return Response({
                     'detail': 'Invalid product data',
                     'errors': serializer.errors
                 }, status=400)
                 
         except Exception as e:
-            print(f"❌ Exception in product creation: {str(e)}")
-            import traceback
-            print(f"❌ Traceback: {traceback.format_exc()}")
+            logger.exception("Exception in product creation")
             return Response({'detail': f'Failed to create product: {str(e)}'}, status=400)
 
 
@@ -208,7 +205,7 @@ class ProductDetailView(APIView):
         try:
             farmer_instance = get_farmer_instance(request.user)
             product = get_object_or_404(Product, id=product_id, farmer=farmer_instance)
-            serializer = ProductSerializer(product)
+            serializer = ProductSerializer(product, context={'request': request})
             return Response(serializer.data)
         except Exception as e:
             return Response({'detail': f'Failed to fetch product: {str(e)}'}, status=400)
@@ -218,7 +215,7 @@ class ProductDetailView(APIView):
             farmer_instance = get_farmer_instance(request.user)
             product = get_object_or_404(Product, id=product_id, farmer=farmer_instance)
             
-            serializer = ProductSerializer(product, data=request.data, partial=True)
+            serializer = ProductSerializer(product, data=request.data, partial=True, context={'request': request})
             if serializer.is_valid():
                 serializer.save()
                 return Response(serializer.data)
@@ -238,10 +235,10 @@ class ProductDetailView(APIView):
             product.is_active = False
             product.save()
             
-            print(f"✅ Product deleted (soft): {product.name} (ID: {product.id})")
+            logger.debug("Product deleted (soft): %s (ID: %s)", product.name, product.id)
             return Response({'detail': 'Product deleted successfully'})
         except Exception as e:
-            print(f"❌ Error deleting product: {str(e)}")
+            logger.exception("Error deleting product")
             return Response({'detail': f'Failed to delete product: {str(e)}'}, status=400)
 
 
@@ -259,10 +256,10 @@ class OrderListView(APIView):
             orders = Order.objects.filter(farmer_id=farmer_instance.id).order_by('-created_at')
             serializer = OrderSerializer(orders, many=True)
             
-            print(f"✅ Fetched {orders.count()} orders for farmer {farmer_instance.id}")
+            logger.debug("Fetched %s orders for farmer %s", len(serializer.data), farmer_instance.id)
             return Response(serializer.data)
         except Exception as e:
-            print(f"❌ Error fetching orders: {str(e)}")
+            logger.exception("Error fetching orders")
             return Response({'detail': f'Failed to fetch orders: {str(e)}'}, status=400)
 
 
@@ -297,11 +294,11 @@ class OrderDetailView(APIView):
             
             serializer = OrderSerializer(order)
             
-            print(f"✅ Order {order_id} status updated to: {new_status}")
+            logger.debug("Order %s status updated to: %s", order_id, new_status)
             return Response({
                 'message': f'Order status updated to {new_status}',
                 'order': serializer.data
             })
         except Exception as e:
-            print(f"❌ Error updating order: {str(e)}")
+            logger.exception("Error updating order")
             return Response({'detail': f'Failed to update order: {str(e)}'}, status=400)
@@ -1,6 +1,21 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class PlantDetectionConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'plant_detection'
+
+    def ready(self):
+        # Both are opt-in: ready() also runs for migrate, shell and other commands
+        preload = getattr(settings, 'PLANT_DETECTION_PRELOAD', False)
+        warmup = getattr(settings, 'PLANT_DETECTION_WARMUP', False)
+        if not (preload or warmup) or not getattr(settings, 'PLANT_DETECTION_INFERENCE_ENABLED', True):
+            return
+
+        from .services import PlantDiseaseDetector
+
+        if preload:
+            PlantDiseaseDetector.preload()
+        if warmup:
+            PlantDiseaseDetector().warmup()
@@ -0,0 +1,206 @@
+# plant_detection/backends.py
+import importlib.util
+import os
+import threading
+
+import numpy as np
+
+from .imaging import decode_image, ImageDecodeError, MODEL_INPUT_SIZE
+
+QUANTIZATION_MODES = ('none', 'float16', 'int8')
+
+
+class KerasBackend:
+    """
+    Serves predictions from the full Keras model.
+
+    By default the model is called through a tf.function with a fixed
+    [None, 128, 128, 3] float32 signature, traced once, instead of
+    ``model.predict`` which builds a data adapter and callback loop on every
+    call. ``jit_compile`` additionally compiles that function with XLA.
+    """
+    name = 'keras'
+
+    @classmethod
+    def available(cls):
+        """Whether TensorFlow is installed (checked without importing it)"""
+        return importlib.util.find_spec('tensorflow') is not None
+
+    def __init__(self, model, compiled=True, jit_compile=False):
+        self.model = model
+        self.compiled = compiled
+        self.jit_compile = jit_compile
+        self._infer = self._build_inference_function() if compiled else None
+
+    def _build_inference_function(self):
+        import tensorflow as tf
+
+        model = self.model
+        signature = [tf.TensorSpec(shape=[None, *MODEL_INPUT_SIZE, 3], dtype=tf.float32)]
+
+        @tf.function(input_signature=signature, jit_compile=self.jit_compile)
+        def infer(input_batch):
+            return model(input_batch, training=False)
+
+        return infer
+
+    @property
+    def mode(self):
+        if not self.compiled:
+            return 'predict'
+        return 'xla' if self.jit_compile else 'tf.function'
+
+    def predict(self, input_batch):
+        if self._infer is None:
+            return self.model.predict(input_batch, verbose=0)
+        return self._infer(np.asarray(input_batch, dtype=np.float32)).numpy()
+
+
+class TFLiteBackend:
+    """Serves predictions from an exported (optionally quantized) .tflite model"""
+    name = 'tflite'
+
+    @classmethod
+    def available(cls):
+        """Whether an interpreter is installed: the standalone tflite_runtime, or TensorFlow's own"""
+        return any(importlib.util.find_spec(module) is not None for module in ('tflite_runtime', 'tensorflow'))
+
+    def __init__(self, model_path, num_threads=None):
+        self.model_path = model_path
+        self.num_threads = num_threads
+        # The flatbuffer is read once and kept: when loaded before fork, every
+        # worker builds its interpreter over the same shared read-only pages
+        with open(model_path, 'rb') as f:
+            self._model_content = f.read()
+        self._pid = None
+        self._create_interpreter()
+
+    def _create_interpreter(self):
+        try:
+            # Standalone interpreter package: no full TensorFlow runtime needed to serve
+            from tflite_runtime.interpreter import Interpreter as interpreter_class
+        except ImportError:
+            import tensorflow as tf
+            interpreter_class = tf.lite.Interpreter
+
+        self._interpreter = interpreter_class(model_content=self._model_content, num_threads=self.num_threads)
+        self._input = self._interpreter.get_input_details()[0]
+        self._output = self._interpreter.get_output_details()[0]
+        self._batch_size = None
+        # A TFLite interpreter is not thread-safe
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def _resize(self, batch_size):
+        if batch_size != self._batch_size:
+            shape = [batch_size] + list(self._input['shape'][1:])
+            self._interpreter.resize_tensor_input(self._input['index'], shape)
+            self._interpreter.allocate_tensors()
+            self._batch_size = batch_size
+
+    def _quantize_input(self, input_batch):
+        dtype = self._input['dtype']
+        if dtype == np.float32:
+            return input_batch.astype(np.float32, copy=False)
+        scale, zero_point = self._input['quantization']
+        info = np.iinfo(dtype)
+        return np.clip(np.round(input_batch / scale + zero_point), info.min, info.max).astype(dtype)
+
+    def _dequantize_output(self, output):
+        if output.dtype == np.float32:
+            return output
+        scale, zero_point = self._output['quantization']
+        return (output.astype(np.float32) - zero_point) * scale
+
+    def predict(self, input_batch):
+        if self._pid != os.getpid():
+            # Forked worker: the parent's interpreter threads do not exist here
+            self._create_interpreter()
+        with self._lock:
+            self._resize(len(input_batch))
+            self._interpreter.set_tensor(self._input['index'], self._quantize_input(input_batch))
+            self._interpreter.invoke()
+            output = self._interpreter.get_tensor(self._output['index'])
+        return self._dequantize_output(output)
+
+
+def load_sample_images(sample_dir, limit=None):
+    """Decode the images under ``sample_dir`` (recursively) into model input arrays"""
+    arrays = []
+    names = []
+    for root, _, files in sorted(os.walk(sample_dir)):
+        for filename in sorted(files):
+            path = os.path.join(root, filename)
+            try:
+                with open(path, 'rb') as f:
+                    arrays.append(decode_image(f.read(), name=filename).model_input)
+                names.append(os.path.relpath(path, sample_dir))
+            except (ImageDecodeError, OSError):
+                continue
+            if limit and len(arrays) >= limit:
+                return names, arrays
+    return names, arrays
+
+
+def export_tflite(keras_model, output_path, quantization='float16', representative_inputs=None):
+    """
+    Convert the Keras model to TFLite with post-training quantization.
+
+    ``int8`` needs ``representative_inputs`` (model input arrays) to calibrate
+    activation ranges; model inputs and outputs stay float32 so the backend
+    is a drop-in replacement.
+    """
+    import tensorflow as tf
+
+    if quantization not in QUANTIZATION_MODES:
+        raise ValueError(f"Unknown quantization '{quantization}'. Use one of: {', '.join(QUANTIZATION_MODES)}")
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(keras_model)
+    if quantization == 'float16':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantization == 'int8':
+        if not representative_inputs:
+            raise ValueError("int8 quantization needs representative sample images")
+
+        def representative_dataset():
+            for input_arr in representative_inputs:
+                yield [np.expand_dims(input_arr, 0).astype(np.float32)]
+
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+
+    tflite_model = converter.convert()
+    with open(output_path, 'wb') as f:
+        f.write(tflite_model)
+    return len(tflite_model)
+
+
+def compare_backends(reference, candidate, input_arrs, batch_size=32):
+    """Accuracy parity of ``candidate`` against ``reference`` over the same inputs"""
+    agree = 0
+    abs_diffs = []
+    confidence_diffs = []
+    for start in range(0, len(input_arrs), batch_size):
+        batch = np.stack(input_arrs[start:start + batch_size]).astype(np.float32)
+        expected = np.asarray(reference.predict(batch))
+        actual = np.asarray(candidate.predict(batch))
+
+        expected_top = expected.argmax(axis=1)
+        actual_top = actual.argmax(axis=1)
+        agree += int((expected_top == actual_top).sum())
+        abs_diffs.append(np.abs(expected - actual).max(axis=1))
+        rows = np.arange(len(batch))
+        confidence_diffs.append(np.abs(expected[rows, expected_top] - actual[rows, expected_top]))
+
+    total = len(input_arrs)
+    abs_diffs = np.concatenate(abs_diffs) if abs_diffs else np.zeros(0)
+    confidence_diffs = np.concatenate(confidence_diffs) if confidence_diffs else np.zeros(0)
+    return {
+        'samples': total,
+        'top1_agreement': (agree / total) if total else 0.0,
+        'max_abs_diff': float(abs_diffs.max()) if total else 0.0,
+        'mean_abs_diff': float(abs_diffs.mean()) if total else 0.0,
+        'max_confidence_diff': float(confidence_diffs.max()) if total else 0.0,
+    }
@@ -0,0 +1,155 @@
+# plant_detection/batching.py
+import os
+import queue
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class _PendingRequest:
+    __slots__ = ('input_arr', 'future', 'enqueued_at')
+
+    def __init__(self, input_arr):
+        self.input_arr = input_arr
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class InferenceBatcher:
+    """
+    Collects single-image inference requests from concurrent request threads
+    and runs them through the model as one batch.
+
+    A batch is dispatched as soon as it reaches ``max_batch_size`` images or
+    the oldest waiting image has been queued for ``max_wait_ms``.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=32, max_wait_ms=10, stats_window=1024):
+        self._predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._queue = queue.Queue()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats_window = stats_window
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self._batch_sizes = Counter()
+        self._wait_times = deque(maxlen=self._stats_window)
+        self._total_requests = 0
+        self._total_batches = 0
+        self._total_wait = 0.0
+        self._max_wait_seen = 0.0
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(
+                    target=self._run, name='plant-detection-batcher', daemon=True
+                )
+                self._worker.start()
+
+    def _after_fork(self):
+        # Threads do not survive fork(); the child starts its own worker lazily.
+        self._queue = queue.Queue()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._reset_stats()
+
+    def submit(self, input_arr, timeout=None):
+        """Queue one preprocessed image and block until its prediction row is ready"""
+        self._ensure_worker()
+        request = _PendingRequest(input_arr)
+        self._queue.put(request)
+        return request.future.result(timeout=timeout)
+
+    def _collect_batch(self):
+        first = self._queue.get()
+        batch = [first]
+        deadline = first.enqueued_at + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining <= 0:
+                    # Deadline passed: take whatever is already queued, without waiting
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            started_at = time.perf_counter()
+            self._record_batch(batch, started_at)
+
+            try:
+                predictions = self._predict_fn(np.stack([item.input_arr for item in batch]))
+            except Exception as e:
+                for item in batch:
+                    item.future.set_exception(e)
+                continue
+
+            for item, row in zip(batch, predictions):
+                item.future.set_result(row)
+
+    def _record_batch(self, batch, started_at):
+        with self._stats_lock:
+            self._batch_sizes[len(batch)] += 1
+            self._total_batches += 1
+            self._total_requests += len(batch)
+            for item in batch:
+                wait = started_at - item.enqueued_at
+                self._wait_times.append(wait)
+                self._total_wait += wait
+                if wait > self._max_wait_seen:
+                    self._max_wait_seen = wait
+
+    def stats(self):
+        """Queue depth, batch-size histogram and queue wait times (ms)"""
+        with self._stats_lock:
+            waits = sorted(self._wait_times)
+            batch_sizes = dict(sorted(self._batch_sizes.items()))
+            total_requests = self._total_requests
+            total_batches = self._total_batches
+            total_wait = self._total_wait
+            max_wait_seen = self._max_wait_seen
+
+        def percentile(p):
+            if not waits:
+                return 0.0
+            index = min(len(waits) - 1, int(round(p / 100.0 * (len(waits) - 1))))
+            return waits[index] * 1000.0
+
+        return {
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000.0,
+            'queue_depth': self._queue.qsize(),
+            'total_requests': total_requests,
+            'total_batches': total_batches,
+            'avg_batch_size': (total_requests / total_batches) if total_batches else 0.0,
+            'batch_size_histogram': batch_sizes,
+            'wait_ms': {
+                'avg': (total_wait / total_requests * 1000.0) if total_requests else 0.0,
+                'p50': percentile(50),
+                'p90': percentile(90),
+                'p99': percentile(99),
+                'max': max_wait_seen * 1000.0,
+                'window': len(waits),
+            },
+        }
+
+
+def register_fork_handler(batcher):
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=batcher._after_fork)
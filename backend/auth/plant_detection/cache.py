@@ -0,0 +1,181 @@
+# plant_detection/cache.py
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+from django.db import DatabaseError
+
+from .models import PredictionCacheEntry
+
+logger = logging.getLogger(__name__)
+
+
+def model_file_version(model_path):
+    """Fingerprint of the model file; changes whenever the file is replaced or rewritten"""
+    stat = os.stat(model_path)
+    fingerprint = f"{os.path.basename(model_path)}:{stat.st_size}:{stat.st_mtime_ns}"
+    return hashlib.sha256(fingerprint.encode('utf-8')).hexdigest()[:16]
+
+
+def make_cache_key(input_arr, model_version):
+    """Content hash of the resized model input plus the model version"""
+    digest = hashlib.sha256()
+    digest.update(model_version.encode('utf-8'))
+    digest.update(str(input_arr.shape).encode('utf-8'))
+    digest.update(str(input_arr.dtype).encode('utf-8'))
+    digest.update(input_arr.tobytes())
+    return digest.hexdigest()
+
+
+class PredictionCache:
+    """
+    Two-tier prediction cache: a bounded in-process LRU in front of the
+    PredictionCacheEntry table. Keys include the model version, so entries
+    from a previous model file never match and are purged on first use.
+    """
+
+    def __init__(self, max_entries=1024, persistent=True):
+        self.max_entries = max(1, int(max_entries))
+        self.persistent = persistent
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._purged_versions = set()
+        self.memory_hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+
+    def _remember(self, key, result):
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return result
+
+        if self.persistent:
+            try:
+                entry = PredictionCacheEntry.objects.filter(key=key).first()
+            except DatabaseError as e:
+                logger.warning("Prediction cache lookup failed: %s", e)
+                entry = None
+            if entry is not None:
+                result = entry.to_result()
+                self._remember(key, result)
+                self.persistent_hits += 1
+                return result
+
+        self.misses += 1
+        return None
+
+    def get_many(self, keys):
+        """Look up several keys with at most one database query; returns {key: result} for hits"""
+        found = {}
+        missing = []
+        with self._lock:
+            for key in keys:
+                result = self._entries.get(key)
+                if result is not None:
+                    self._entries.move_to_end(key)
+                    self.memory_hits += 1
+                    found[key] = result
+                else:
+                    missing.append(key)
+
+        if self.persistent and missing:
+            try:
+                entries = list(PredictionCacheEntry.objects.filter(key__in=set(missing)))
+            except DatabaseError as e:
+                logger.warning("Prediction cache lookup failed: %s", e)
+                entries = []
+            for entry in entries:
+                result = entry.to_result()
+                self._remember(entry.key, result)
+                found[entry.key] = result
+
+        for key in missing:
+            if key in found:
+                self.persistent_hits += 1
+            else:
+                self.misses += 1
+        return found
+
+    def set(self, key, model_version, result):
+        self._remember(key, result)
+        if not self.persistent:
+            return
+
+        try:
+            self._purge_stale(model_version)
+            PredictionCacheEntry.objects.update_or_create(
+                key=key,
+                defaults={
+                    'model_version': model_version,
+                    'prediction': result['prediction'],
+                    'confidence': result['confidence'],
+                    'class_index': result['class_index'],
+                    'top_predictions': [[cls, float(conf)] for cls, conf in result['top_predictions']],
+                }
+            )
+        except DatabaseError as e:
+            logger.warning("Prediction cache write failed: %s", e)
+
+    def set_many(self, items, model_version):
+        """Store several (key, result) pairs with one bulk insert"""
+        for key, result in items:
+            self._remember(key, result)
+        if not self.persistent or not items:
+            return
+
+        try:
+            self._purge_stale(model_version)
+            PredictionCacheEntry.objects.bulk_create(
+                [
+                    PredictionCacheEntry(
+                        key=key,
+                        model_version=model_version,
+                        prediction=result['prediction'],
+                        confidence=result['confidence'],
+                        class_index=result['class_index'],
+                        top_predictions=[[cls, float(conf)] for cls, conf in result['top_predictions']],
+                    )
+                    for key, result in items
+                ],
+                ignore_conflicts=True,
+            )
+        except DatabaseError as e:
+            logger.warning("Prediction cache write failed: %s", e)
+
+    def _purge_stale(self, model_version):
+        """Drop persisted entries produced by any other model file (once per version per process)"""
+        if model_version in self._purged_versions:
+            return
+        deleted, _ = PredictionCacheEntry.objects.exclude(model_version=model_version).delete()
+        self._purged_versions.add(model_version)
+        if deleted:
+            logger.info("Purged %s cached predictions from previous model versions", deleted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.memory_hits + self.persistent_hits + self.misses
+        return {
+            'enabled': True,
+            'persistent': self.persistent,
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'memory_hits': self.memory_hits,
+            'persistent_hits': self.persistent_hits,
+            'misses': self.misses,
+            'hit_ratio': ((self.memory_hits + self.persistent_hits) / lookups) if lookups else 0.0,
+        }
@@ -0,0 +1,129 @@
+# plant_detection/image_policy.py
+import logging
+
+from django.conf import settings
+from django.db.models import Count, Sum
+
+from blobstore.renditions import ingest_image
+from blobstore.storage import put_blob, read_blob
+from .imaging import encode_decoded_for_storage, encode_for_storage, ImageDecodeError
+from .models import PlantDetectionResult
+
+logger = logging.getLogger(__name__)
+
+
+def image_policy():
+    return {
+        'max_edge': getattr(settings, 'PLANT_DETECTION_IMAGE_MAX_EDGE', 1024),
+        'quality': getattr(settings, 'PLANT_DETECTION_IMAGE_QUALITY', 80),
+        'keep_originals': getattr(settings, 'PLANT_DETECTION_KEEP_ORIGINALS', False),
+    }
+
+
+def store_detection_image(image, keep_original=False):
+    """
+    Apply the storage policy to an uploaded detection photo (an
+    imaging.DecodedImage) and store it.
+
+    Returns the PlantDetectionResult field values for the stored image. The
+    re-encode starts from the image decode_image() already decoded, and the
+    model input was derived from that same decode, so re-encoding never
+    changes a prediction.
+    """
+    policy = image_policy()
+    data, content_type = image.data, image.content_type
+    try:
+        stored, stored_type = encode_decoded_for_storage(image, policy['max_edge'], policy['quality'])
+    except ImageDecodeError:
+        stored, stored_type = data, content_type
+
+    fields = {
+        'image_blob': ingest_image(stored, stored_type),
+        'image_content_type': stored_type,
+        'original_blob': None,
+        'original_bytes': len(data),
+        'stored_bytes': len(stored),
+    }
+    if (keep_original or policy['keep_originals']) and len(stored) != len(data):
+        fields['original_blob'] = put_blob(data, content_type)
+    return fields
+
+
+def storage_stats():
+    """Totals for uploads stored under the policy (rows from before it are not counted)"""
+    totals = PlantDetectionResult.objects.filter(original_bytes__isnull=False).aggregate(
+        images=Count('id'),
+        original_bytes=Sum('original_bytes'),
+        stored_bytes=Sum('stored_bytes'),
+        originals_kept=Count('original_blob'),
+    )
+    original = totals['original_bytes'] or 0
+    stored = totals['stored_bytes'] or 0
+    return {
+        'images': totals['images'],
+        'originals_kept': totals['originals_kept'],
+        'original_bytes': original,
+        'stored_bytes': stored,
+        'bytes_saved': original - stored,
+    }
+
+
+def compact_detection_images(older_than, purge=False, chunk_size=200, dry_run=False):
+    """
+    Re-encode (or with ``purge``, remove) the images of detections created
+    before ``older_than``. Rows are walked by primary key in chunks of
+    ``chunk_size``, so the table is never loaded into memory at once.
+
+    Re-encoding skips images already stored under the policy and keeps
+    originals the user asked for; purging removes both. Predictions are
+    kept either way. Freed blobs are deleted by ``manage.py gc_blobs``.
+    """
+    policy = image_policy()
+    queryset = PlantDetectionResult.objects.filter(created_at__lt=older_than).exclude(
+        image_blob__isnull=True, original_blob__isnull=True
+    )
+    if not purge:
+        queryset = queryset.filter(image_blob__isnull=False, original_bytes__isnull=True)
+
+    totals = {'images': 0, 'bytes_before': 0, 'bytes_after': 0, 'failed': 0}
+    last_id = 0
+    while True:
+        chunk = list(
+            queryset.filter(id__gt=last_id).order_by('id').values_list(
+                'id', 'image_blob_id', 'image_blob__size', 'original_blob__size', 'image_content_type'
+            )[:chunk_size]
+        )
+        if not chunk:
+            break
+        last_id = chunk[-1][0]
+
+        for detection_id, sha256, size, original_size, content_type in chunk:
+            before = (size or 0) + (original_size or 0)
+            if purge:
+                update = {'image_blob': None, 'original_blob': None, 'stored_bytes': 0}
+                after = 0
+            else:
+                try:
+                    data = read_blob(sha256)
+                    stored, stored_type = encode_for_storage(data, policy['max_edge'], policy['quality'])
+                except (ImageDecodeError, OSError) as e:
+                    logger.warning("Could not compact image of detection %s: %s", detection_id, e)
+                    totals['failed'] += 1
+                    continue
+                after = len(stored)
+                update = {
+                    'original_bytes': size,
+                    'stored_bytes': len(stored),
+                    'image_content_type': stored_type,
+                }
+                if not dry_run:
+                    update['image_blob'] = ingest_image(stored, stored_type)
+
+            totals['images'] += 1
+            totals['bytes_before'] += before
+            totals['bytes_after'] += after
+            if not dry_run:
+                PlantDetectionResult.objects.filter(id=detection_id).update(**update)
+
+    totals['bytes_saved'] = totals['bytes_before'] - totals['bytes_after']
+    return totals
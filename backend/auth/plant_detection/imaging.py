@@ -0,0 +1,123 @@
+# plant_detection/imaging.py
+from io import BytesIO
+
+import numpy as np
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+# Same input size and resampling as tf.keras.preprocessing.image.load_img
+# used by the training code (128x128, nearest neighbour, RGB)
+MODEL_INPUT_SIZE = (128, 128)
+
+
+class ImageDecodeError(ValueError):
+    pass
+
+
+class DecodedImage:
+    """An uploaded image decoded once; the raw bytes and the decoded PIL image are kept for storage"""
+
+    def __init__(self, data, name, content_type, width, height, format, model_input, image=None):
+        self.data = data
+        self.image = image
+        self.name = name
+        self.content_type = content_type
+        self.width = width
+        self.height = height
+        self.format = format
+        self.model_input = model_input
+
+
+def to_model_input(image):
+    """Convert a decoded PIL image to the (128, 128, 3) float32 array the model expects"""
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    if image.size != MODEL_INPUT_SIZE:
+        image = image.resize(MODEL_INPUT_SIZE, Image.NEAREST)
+    # NO NORMALIZATION - the model was trained on 0-255 pixel values
+    return np.asarray(image, dtype=np.float32)
+
+
+def decode_image(data, name='', content_type=''):
+    """
+    Decode image bytes exactly once and derive the model input from that decode.
+
+    Raises ImageDecodeError if the bytes are not a readable image.
+    """
+    try:
+        image = Image.open(BytesIO(data))
+        image.load()
+    except (UnidentifiedImageError, OSError, SyntaxError, ValueError) as e:
+        raise ImageDecodeError(f"Could not decode image: {e}")
+
+    return DecodedImage(
+        data=data,
+        name=name,
+        content_type=content_type or Image.MIME.get(image.format, 'application/octet-stream'),
+        width=image.width,
+        height=image.height,
+        format=image.format,
+        model_input=to_model_input(image),
+        image=image,
+    )
+
+
+def decode_upload(uploaded_file):
+    """Read an in-memory upload once and decode it"""
+    uploaded_file.seek(0)
+    data = uploaded_file.read()
+    return decode_image(data, name=uploaded_file.name, content_type=uploaded_file.content_type)
+
+
+def _encode(image, data, fits, max_edge, quality):
+    """
+    Downscale ``image`` to ``max_edge``, apply and then drop EXIF (orientation,
+    GPS, camera data) and save it as JPEG at ``quality``. ``data`` (the bytes
+    it came from) is returned instead if it is already small, EXIF-free and
+    would not shrink.
+    """
+    source_format = image.format
+    has_exif = bool(image.info.get('exif'))
+    # exif_transpose returns a copy, so a caller's decoded image is left as it was
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    output = BytesIO()
+    image.save(output, format='JPEG', quality=quality, optimize=True)
+    encoded = output.getvalue()
+
+    if fits and not has_exif and source_format in ('JPEG', 'PNG', 'WEBP') and len(encoded) >= len(data):
+        return bytes(data), Image.MIME[source_format]
+    return encoded, 'image/jpeg'
+
+
+def encode_decoded_for_storage(decoded, max_edge, quality):
+    """
+    Re-encode an upload for long-term storage from its decode_image() result,
+    without decoding the bytes again. Returns (data, content_type).
+
+    Raises ImageDecodeError if the image cannot be encoded.
+    """
+    try:
+        return _encode(decoded.image, decoded.data, max(decoded.image.size) <= max_edge, max_edge, quality)
+    except (OSError, SyntaxError, ValueError) as e:
+        raise ImageDecodeError(f"Could not encode image: {e}")
+
+
+def encode_for_storage(data, max_edge, quality):
+    """
+    Re-encode stored image bytes (see _encode); for images that were not
+    just decoded, e.g. by compact_detection_images. Returns (data, content_type).
+
+    Raises ImageDecodeError if the bytes are not a readable image.
+    """
+    try:
+        image = Image.open(BytesIO(data))
+        fits = max(image.size) <= max_edge
+        if image.format == 'JPEG' and not fits:
+            # Decode at a reduced DCT scale instead of full size
+            image.draft('RGB', (max_edge, max_edge))
+        return _encode(image, data, fits, max_edge, quality)
+    except (UnidentifiedImageError, OSError, SyntaxError, ValueError) as e:
+        raise ImageDecodeError(f"Could not decode image: {e}")
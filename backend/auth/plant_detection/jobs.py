@@ -0,0 +1,240 @@
+# plant_detection/jobs.py
+import logging
+import os
+import socket
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import OperationalError, close_old_connections, transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from blobstore.storage import put_blob, read_blob
+from .image_policy import store_detection_image
+from .imaging import decode_image, ImageDecodeError
+from .models import DetectionJob, PlantDetectionResult
+from .services import PlantDiseaseDetector
+
+logger = logging.getLogger(__name__)
+
+
+def job_settings():
+    return {
+        'max_attempts': getattr(settings, 'PLANT_DETECTION_JOB_MAX_ATTEMPTS', 3),
+        'timeout': getattr(settings, 'PLANT_DETECTION_JOB_TIMEOUT', 120),
+        'poll_interval': getattr(settings, 'PLANT_DETECTION_JOB_POLL_INTERVAL', 0.5),
+        'claim_batch': getattr(settings, 'PLANT_DETECTION_JOB_CLAIM_BATCH', 8),
+    }
+
+
+def enqueue_job(user, image, keep_original=False):
+    """
+    Queue a decoded upload (imaging.DecodedImage) for the worker pool. The
+    job holds the untouched upload until the worker has stored the detection.
+    """
+    return DetectionJob.objects.create(
+        user_id=user.id,
+        user_email=user.email,
+        user_type=getattr(user, 'role', 'unknown'),
+        image_blob=put_blob(image.data, image.content_type),
+        image_name=image.name,
+        image_content_type=image.content_type,
+        keep_original=keep_original,
+    )
+
+
+def job_counts():
+    """Number of jobs per status, e.g. {'queued': 3, 'running': 1, 'done': 40, 'failed': 0}"""
+    counts = {status: 0 for status, _ in DetectionJob.JOB_STATUS}
+    for row in DetectionJob.objects.values('status').annotate(total=Count('id')):
+        counts[row['status']] = row['total']
+    return counts
+
+
+def claim_jobs(worker_id, limit):
+    """
+    Atomically move up to ``limit`` queued jobs to running for this worker.
+
+    Each claim is a conditional UPDATE on status='queued', so two workers can
+    never run the same job even without row locks.
+    """
+    claimed_ids = []
+    candidates = DetectionJob.objects.filter(
+        status=DetectionJob.STATUS_QUEUED
+    ).order_by('created_at', 'id').values_list('id', flat=True)[:limit * 2]
+
+    for job_id in candidates:
+        now = timezone.now()
+        updated = DetectionJob.objects.filter(id=job_id, status=DetectionJob.STATUS_QUEUED).update(
+            status=DetectionJob.STATUS_RUNNING,
+            worker_id=worker_id,
+            attempts=F('attempts') + 1,
+            started_at=now,
+            heartbeat_at=now,
+        )
+        if updated:
+            claimed_ids.append(job_id)
+        if len(claimed_ids) >= limit:
+            break
+
+    return list(DetectionJob.objects.filter(id__in=claimed_ids).order_by('created_at', 'id'))
+
+
+def requeue_stale_jobs():
+    """
+    Recover jobs whose worker died: running jobs without a heartbeat for
+    PLANT_DETECTION_JOB_TIMEOUT seconds are queued again, or failed once
+    they have used up PLANT_DETECTION_JOB_MAX_ATTEMPTS.
+    """
+    config = job_settings()
+    cutoff = timezone.now() - timedelta(seconds=config['timeout'])
+    stale = DetectionJob.objects.filter(status=DetectionJob.STATUS_RUNNING, heartbeat_at__lt=cutoff)
+
+    failed = stale.filter(attempts__gte=config['max_attempts']).update(
+        status=DetectionJob.STATUS_FAILED,
+        error='Worker stopped responding while processing this job',
+        finished_at=timezone.now(),
+        image_blob=None,
+    )
+    requeued = stale.filter(attempts__lt=config['max_attempts']).update(
+        status=DetectionJob.STATUS_QUEUED,
+        worker_id=None,
+    )
+    if requeued or failed:
+        logger.info("Recovered stale detection jobs - requeued: %s, failed: %s", requeued, failed)
+    return requeued, failed
+
+
+def _owned(job):
+    return DetectionJob.objects.filter(id=job.id, worker_id=job.worker_id, status=DetectionJob.STATUS_RUNNING)
+
+
+def _heartbeat(jobs):
+    """Refresh heartbeat_at of the jobs this worker still owns, so requeue_stale_jobs() leaves them alone"""
+    if jobs:
+        DetectionJob.objects.filter(
+            id__in=[job.id for job in jobs], worker_id=jobs[0].worker_id, status=DetectionJob.STATUS_RUNNING
+        ).update(heartbeat_at=timezone.now())
+
+
+def _finish(job, **fields):
+    # Only the worker that currently owns the job may finish it. The upload is
+    # released: the detection stores its own copy, and gc_blobs frees the rest.
+    return _owned(job).update(finished_at=timezone.now(), image_blob=None, **fields)
+
+
+def _retry_or_fail(job, error):
+    """Give up on one job after an unexpected error: queue it again, or fail it once out of attempts"""
+    if job.attempts >= job_settings()['max_attempts']:
+        _finish(job, status=DetectionJob.STATUS_FAILED, error=error)
+    else:
+        _owned(job).update(status=DetectionJob.STATUS_QUEUED, worker_id=None, error=error)
+
+
+def _store_result(job, image, result):
+    """
+    Create the job's detection and mark it done, unless the job has been
+    requeued to another worker meanwhile. Returns whether it was stored.
+    """
+    with transaction.atomic():
+        # The conditional UPDATE checks ownership and locks the row (on SQLite,
+        # where select_for_update is a no-op, it takes the write lock) until
+        # the detection is in, so a requeue cannot slip in between
+        if not _owned(job).update(heartbeat_at=timezone.now()):
+            logger.warning("Detection job %s was taken over by another worker; dropping this result", job.id)
+            return False
+        detection = PlantDetectionResult.objects.create(
+            user_id=job.user_id,
+            user_email=job.user_email,
+            user_type=job.user_type,
+            image_name=image.name,
+            prediction=result['prediction'],
+            confidence=result['confidence'],
+            **store_detection_image(image, job.keep_original)
+        )
+        _finish(
+            job,
+            status=DetectionJob.STATUS_DONE,
+            detection=detection,
+            result={
+                'prediction': result['prediction'],
+                'confidence': result['confidence'],
+                'class_index': result.get('class_index', 0),
+                'top_predictions': [[cls, float(conf)] for cls, conf in result.get('top_predictions', [])[:3]],
+                'cache_hit': result.get('cache_hit', False),
+            },
+        )
+    return True
+
+
+def process_jobs(jobs, detector):
+    """Decode, predict (as one batch) and store the results of claimed jobs"""
+    decoded = []
+    for job in jobs:
+        try:
+            data = read_blob(job.image_blob_id) if job.image_blob_id else b''
+            decoded.append((job, decode_image(data, job.image_name, job.image_content_type)))
+        except (ImageDecodeError, OSError) as e:
+            _finish(job, status=DetectionJob.STATUS_FAILED, error=str(e))
+
+    if not decoded:
+        return
+
+    _heartbeat([job for job, _ in decoded])
+    try:
+        results = detector.predict_batch([image.model_input for _, image in decoded])
+    except Exception as e:
+        logger.exception("Batch prediction failed for %s detection jobs", len(decoded))
+        for job, _ in decoded:
+            _retry_or_fail(job, str(e))
+        return
+    _heartbeat([job for job, _ in decoded])
+
+    for (job, image), result in zip(decoded, results):
+        if 'error' in result:
+            # Model errors are not transient, so they are not retried
+            _finish(job, status=DetectionJob.STATUS_FAILED, error=result['error'])
+            continue
+        try:
+            _store_result(job, image, result)
+        except Exception as e:
+            # Only this job is affected; the rest of the batch is still stored
+            logger.exception("Could not store the result of detection job %s", job.id)
+            _retry_or_fail(job, str(e))
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def run_worker(worker_id=None, stop_after=None):
+    """Poll the job table and process jobs until interrupted (or ``stop_after`` idle polls)"""
+    config = job_settings()
+    worker_id = worker_id or default_worker_id()
+    detector = PlantDiseaseDetector()
+    logger.info("Detection worker %s started", worker_id)
+
+    idle_polls = 0
+    last_recovery = 0.0
+    while stop_after is None or idle_polls < stop_after:
+        try:
+            close_old_connections()
+            if time.monotonic() - last_recovery > config['timeout'] / 4:
+                requeue_stale_jobs()
+                last_recovery = time.monotonic()
+
+            jobs = claim_jobs(worker_id, config['claim_batch'])
+            if jobs:
+                idle_polls = 0
+                process_jobs(jobs, detector)
+                continue
+        except OperationalError as e:
+            # e.g. "database is locked" under concurrent SQLite writers; just poll again
+            logger.warning("Detection worker %s database error: %s", worker_id, e)
+        except Exception:
+            # Claimed jobs stay 'running' and are retried by requeue_stale_jobs()
+            logger.exception("Detection worker %s error", worker_id)
+
+        idle_polls += 1
+        time.sleep(config['poll_interval'])
@@ -0,0 +1,61 @@
+# plant_detection/management/commands/benchmark_inference.py
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from plant_detection.backends import KerasBackend
+from plant_detection.imaging import MODEL_INPUT_SIZE
+from plant_detection.services import PlantDiseaseDetector
+
+
+class Command(BaseCommand):
+    help = "Microbenchmark model.predict against the compiled tf.function (and XLA) inference paths"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 8, 32])
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--no-xla', action='store_true', help='Skip the XLA variant')
+
+    def handle(self, *args, **options):
+        model_path = PlantDiseaseDetector.keras_model_path()
+        if not model_path:
+            raise CommandError("Keras model not found in plant_detection/models/")
+
+        import tensorflow as tf
+        model = tf.keras.models.load_model(model_path, compile=False)
+
+        backends = [
+            ('model.predict', KerasBackend(model, compiled=False)),
+            ('tf.function', KerasBackend(model, compiled=True)),
+        ]
+        if not options['no_xla']:
+            backends.append(('tf.function+XLA', KerasBackend(model, compiled=True, jit_compile=True)))
+
+        rng = np.random.default_rng(0)
+        self.stdout.write(f"{'path':<18}{'batch':>6}{'p50 ms':>10}{'p99 ms':>10}{'images/s':>12}")
+        for batch_size in options['batch_sizes']:
+            batch = rng.uniform(0, 255, size=(batch_size, *MODEL_INPUT_SIZE, 3)).astype(np.float32)
+            reference = None
+            for label, backend in backends:
+                for _ in range(options['warmup']):
+                    output = backend.predict(batch)
+
+                timings = []
+                for _ in range(options['iterations']):
+                    started = time.perf_counter()
+                    output = backend.predict(batch)
+                    timings.append(time.perf_counter() - started)
+
+                if reference is None:
+                    reference = output
+                elif not np.allclose(reference, output, atol=1e-4):
+                    self.stderr.write(f"{label} output differs from model.predict at batch {batch_size}")
+
+                timings = np.array(timings) * 1000.0
+                throughput = batch_size / (timings.mean() / 1000.0)
+                self.stdout.write(
+                    f"{label:<18}{batch_size:>6}{np.percentile(timings, 50):>10.2f}"
+                    f"{np.percentile(timings, 99):>10.2f}{throughput:>12.1f}"
+                )
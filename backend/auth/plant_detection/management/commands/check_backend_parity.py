@@ -0,0 +1,41 @@
+# plant_detection/management/commands/check_backend_parity.py
+from django.core.management.base import BaseCommand, CommandError
+
+from plant_detection.backends import KerasBackend, TFLiteBackend, compare_backends, load_sample_images
+from plant_detection.services import PlantDiseaseDetector
+
+
+class Command(BaseCommand):
+    help = "Compare TFLite predictions against the Keras model over a sample set before switching backends"
+
+    def add_arguments(self, parser):
+        parser.add_argument('samples', help='Directory of leaf images')
+        parser.add_argument('--tflite', default=None,
+                            help='TFLite model to check (default: PLANT_DETECTION_TFLITE_MODEL)')
+        parser.add_argument('--num-samples', type=int, default=500)
+        parser.add_argument('--min-agreement', type=float, default=0.98,
+                            help='Fail if top-1 agreement with Keras is below this ratio')
+
+    def handle(self, *args, **options):
+        tflite_path = options['tflite'] or PlantDiseaseDetector.tflite_model_path()
+        model_path = PlantDiseaseDetector.keras_model_path()
+        if not model_path:
+            raise CommandError("Keras model not found in plant_detection/models/")
+
+        names, sample_inputs = load_sample_images(options['samples'], limit=options['num_samples'])
+        if not sample_inputs:
+            raise CommandError(f"No readable images in {options['samples']}")
+
+        import tensorflow as tf
+        keras_model = tf.keras.models.load_model(model_path, compile=False)
+        report = compare_backends(KerasBackend(keras_model), TFLiteBackend(tflite_path), sample_inputs)
+
+        for key, value in report.items():
+            self.stdout.write(f"{key}: {value}")
+
+        if report['top1_agreement'] < options['min_agreement']:
+            raise CommandError(
+                f"Top-1 agreement {report['top1_agreement']:.4f} is below {options['min_agreement']}; "
+                f"keep PLANT_DETECTION_BACKEND = 'keras'"
+            )
+        self.stdout.write(self.style.SUCCESS("TFLite model matches the Keras model; safe to switch backends"))
@@ -0,0 +1,41 @@
+# plant_detection/management/commands/compact_detection_images.py
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from plant_detection.image_policy import compact_detection_images, image_policy
+
+
+class Command(BaseCommand):
+    help = "Re-encode or purge the images of old plant detections"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int, required=True)
+        parser.add_argument('--purge', action='store_true',
+                            help='Remove the images (predictions are kept) instead of re-encoding them')
+        parser.add_argument('--chunk-size', type=int, default=200)
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        older_than = timezone.now() - timedelta(days=options['older_than_days'])
+        policy = image_policy()
+        action = 'Purging' if options['purge'] else (
+            f"Re-encoding (max edge {policy['max_edge']}px, quality {policy['quality']})"
+        )
+        self.stdout.write(f"{action} images of detections created before {older_than:%Y-%m-%d %H:%M}")
+
+        totals = compact_detection_images(
+            older_than,
+            purge=options['purge'],
+            chunk_size=options['chunk_size'],
+            dry_run=options['dry_run'],
+        )
+
+        prefix = 'Would process' if options['dry_run'] else 'Processed'
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix} {totals['images']} images: {totals['bytes_before']} -> {totals['bytes_after']} bytes "
+            f"({totals['bytes_saved']} saved, {totals['failed']} failed)"
+        ))
+        if not options['dry_run'] and totals['images']:
+            self.stdout.write("Run `manage.py gc_blobs` to delete the freed files")
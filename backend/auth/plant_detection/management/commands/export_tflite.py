@@ -0,0 +1,48 @@
+# plant_detection/management/commands/export_tflite.py
+from django.core.management.base import BaseCommand, CommandError
+
+from plant_detection.backends import (
+    QUANTIZATION_MODES, KerasBackend, TFLiteBackend, compare_backends, export_tflite, load_sample_images
+)
+from plant_detection.services import PlantDiseaseDetector
+
+
+class Command(BaseCommand):
+    help = "Export the trained Keras model to TFLite with post-training quantization"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--quantization', choices=QUANTIZATION_MODES, default='float16')
+        parser.add_argument('--output', default=None,
+                            help='Output .tflite path (default: PLANT_DETECTION_TFLITE_MODEL)')
+        parser.add_argument('--samples', default=None,
+                            help='Directory of leaf images used for int8 calibration and the parity check')
+        parser.add_argument('--num-samples', type=int, default=200)
+
+    def handle(self, *args, **options):
+        quantization = options['quantization']
+        output = options['output'] or PlantDiseaseDetector.tflite_model_path()
+
+        model_path = PlantDiseaseDetector.keras_model_path()
+        if not model_path:
+            raise CommandError("Keras model not found in plant_detection/models/")
+
+        import tensorflow as tf
+        self.stdout.write(f"Loading Keras model from {model_path}")
+        keras_model = tf.keras.models.load_model(model_path, compile=False)
+
+        sample_inputs = []
+        if options['samples']:
+            _, sample_inputs = load_sample_images(options['samples'], limit=options['num_samples'])
+            self.stdout.write(f"Loaded {len(sample_inputs)} sample images")
+        if quantization == 'int8' and not sample_inputs:
+            raise CommandError("int8 quantization needs --samples with calibration images")
+
+        try:
+            size = export_tflite(keras_model, output, quantization, representative_inputs=sample_inputs)
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f"Wrote {output} ({size / 1024 / 1024:.1f} MB, {quantization})"))
+
+        if sample_inputs:
+            report = compare_backends(KerasBackend(keras_model), TFLiteBackend(output), sample_inputs)
+            self.stdout.write(f"Parity vs Keras: {report}")
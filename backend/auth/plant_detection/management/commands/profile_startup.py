@@ -0,0 +1,62 @@
+# plant_detection/management/commands/profile_startup.py
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Runs in a fresh interpreter so every profile starts from a cold process
+PROBE = r"""
+import json, os, resource, sys, time
+started = time.perf_counter()
+import django
+django.setup()
+import auth.urls  # noqa: F401 - the URLconf pulls in every app's views, like a worker's first request
+report = {
+    'profile': os.environ['APP_PROFILE'],
+    'startup_seconds': time.perf_counter() - started,
+    'tensorflow_imported': 'tensorflow' in sys.modules,
+}
+if sys.argv[1] == '1':
+    from plant_detection.services import PlantDiseaseDetector
+    loaded_at = time.perf_counter()
+    detector = PlantDiseaseDetector()
+    report['model_load_seconds'] = time.perf_counter() - loaded_at
+    report['backend'] = detector.backend_name()
+    report['tensorflow_imported'] = 'tensorflow' in sys.modules
+# ru_maxrss is KiB on Linux, bytes on macOS
+scale = 1 if sys.platform == 'darwin' else 1024
+report['max_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 1024 / 1024
+print(json.dumps(report))
+"""
+
+
+class Command(BaseCommand):
+    help = "Report process startup time and peak RSS for each deployment profile (APP_PROFILE)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', nargs='+', default=['web', 'full'])
+        parser.add_argument('--load-model', action='store_true',
+                            help="Also load the model in profiles that allow inference")
+
+    def handle(self, *args, **options):
+        for profile in options['profiles']:
+            env = dict(os.environ, APP_PROFILE=profile)
+            env.setdefault('DJANGO_SETTINGS_MODULE', os.environ.get('DJANGO_SETTINGS_MODULE', 'auth.settings'))
+            load_model = '1' if options['load_model'] and profile != 'web' else '0'
+            completed = subprocess.run(
+                [sys.executable, '-c', PROBE, load_model],
+                cwd=settings.BASE_DIR, env=env, capture_output=True, text=True
+            )
+            if completed.returncode != 0:
+                self.stderr.write(f"{profile}: probe failed\n{completed.stderr}")
+                continue
+
+            report = json.loads(completed.stdout.strip().splitlines()[-1])
+            line = (f"{profile:>6}: startup {report['startup_seconds']:.2f}s, "
+                    f"max RSS {report['max_rss_mb']:.0f} MB, TensorFlow imported: {report['tensorflow_imported']}")
+            if 'model_load_seconds' in report:
+                line += f", model load {report['model_load_seconds']:.2f}s ({report['backend']})"
+            self.stdout.write(line)
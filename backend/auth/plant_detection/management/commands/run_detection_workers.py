@@ -0,0 +1,62 @@
+# plant_detection/management/commands/run_detection_workers.py
+import multiprocessing
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from plant_detection.jobs import default_worker_id, job_counts, run_worker
+
+
+def _worker_main(index):
+    # Each process opens its own database connection and loads its own model
+    run_worker(worker_id=f"{default_worker_id()}#{index}")
+
+
+class Command(BaseCommand):
+    help = "Run a pool of plant detection worker processes that execute queued DetectionJobs"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='Number of worker processes')
+        parser.add_argument('--status-interval', type=int, default=60,
+                            help='Seconds between queue status lines (0 to disable)')
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+        status_interval = options['status_interval']
+
+        # Connections must not be shared with forked children
+        connections.close_all()
+
+        processes = {}
+
+        def start(index):
+            process = multiprocessing.Process(target=_worker_main, args=(index,), daemon=True)
+            process.start()
+            processes[index] = process
+            self.stdout.write(f"Started detection worker #{index} (pid {process.pid})")
+
+        for index in range(workers):
+            start(index)
+
+        last_status = time.monotonic()
+        try:
+            while True:
+                time.sleep(1)
+                # Restart crashed workers; their claimed jobs are requeued once their heartbeat goes stale
+                for index, process in list(processes.items()):
+                    if not process.is_alive():
+                        self.stderr.write(f"Detection worker #{index} exited with code {process.exitcode}, restarting")
+                        start(index)
+
+                if status_interval and time.monotonic() - last_status >= status_interval:
+                    self.stdout.write(f"Detection jobs: {job_counts()}")
+                    connections.close_all()
+                    last_status = time.monotonic()
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping detection workers...")
+        finally:
+            for process in processes.values():
+                process.terminate()
+            for process in processes.values():
+                process.join(timeout=10)
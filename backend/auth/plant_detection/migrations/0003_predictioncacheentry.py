@@ -0,0 +1,25 @@
+# Generated by Django 5.1.2 on 2026-10-17 18:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plant_detection', '0002_alter_plantdetectionresult_user_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PredictionCacheEntry',
+            fields=[
+                ('key', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('model_version', models.CharField(db_index=True, max_length=64)),
+                ('prediction', models.CharField(max_length=255)),
+                ('confidence', models.FloatField()),
+                ('class_index', models.IntegerField()),
+                ('top_predictions', models.JSONField(default=list)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
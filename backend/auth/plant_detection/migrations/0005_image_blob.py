@@ -0,0 +1,117 @@
+# Generated by Django 5.1.2 on 2026-10-17 19:05
+
+import hashlib
+import logging
+import os
+import tempfile
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+logger = logging.getLogger(__name__)
+
+
+# The blob store layout (<root>/ab/cd/<sha256>) and the moves are copied from
+# blobstore/storage.py as it was when this migration was written, so later
+# changes there do not change what this migration does.
+def _blob_path(sha256):
+    root = getattr(settings, 'BLOBSTORE_ROOT', os.path.join(settings.BASE_DIR, 'blobs'))
+    return os.path.join(root, sha256[:2], sha256[2:4], sha256)
+
+
+def _write_blob(sha256, data):
+    path = _blob_path(sha256)
+    if os.path.exists(path):
+        return
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _to_blobs(model, Blob, binary_field, content_type_field):
+    rows = model._base_manager.exclude(**{f'{binary_field}__isnull': True}).values_list(
+        'pk', binary_field, content_type_field
+    )
+    moved = 0
+    for pk, data, content_type in rows.iterator(chunk_size=100):
+        if not data:
+            continue
+        data = bytes(data)
+        sha256 = hashlib.sha256(data).hexdigest()
+        _write_blob(sha256, data)
+        Blob.objects.get_or_create(
+            sha256=sha256, defaults={'size': len(data), 'content_type': content_type or 'application/octet-stream'}
+        )
+        model._base_manager.filter(pk=pk).update(image_blob_id=sha256)
+        moved += 1
+    return moved
+
+
+def _from_blobs(model, binary_field):
+    rows = model._base_manager.exclude(image_blob__isnull=True).values_list('pk', 'image_blob_id')
+    for pk, sha256 in rows.iterator():
+        path = _blob_path(sha256)
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                model._base_manager.filter(pk=pk).update(**{binary_field: f.read()})
+
+
+
+def move_images_to_blobstore(apps, schema_editor):
+    Blob = apps.get_model('blobstore', 'Blob')
+    for model_name in ('PlantDetectionResult', 'DetectionJob'):
+        model = apps.get_model('plant_detection', model_name)
+        moved = _to_blobs(model, Blob, 'image_data', 'image_content_type')
+        if moved:
+            logger.info("Moved %d %s images to the blob store", moved, model_name)
+
+
+def move_images_from_blobstore(apps, schema_editor):
+    for model_name in ('PlantDetectionResult', 'DetectionJob'):
+        _from_blobs(apps.get_model('plant_detection', model_name), 'image_data')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blobstore', '0001_initial'),
+        ('plant_detection', '0004_detectionjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='plantdetectionresult',
+            name='image_blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='detection_results', to='blobstore.blob'),
+        ),
+        migrations.AddField(
+            model_name='detectionjob',
+            name='image_blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='detection_jobs', to='blobstore.blob'),
+        ),
+        # DetectionJob.image_data was NOT NULL; relax it so the reverse
+        # migration can restore the column before refilling it
+        migrations.AlterField(
+            model_name='detectionjob',
+            name='image_data',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.RunPython(move_images_to_blobstore, move_images_from_blobstore),
+        migrations.RemoveField(
+            model_name='plantdetectionresult',
+            name='image_data',
+        ),
+        migrations.RemoveField(
+            model_name='detectionjob',
+            name='image_data',
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.2 on 2026-10-17 18:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blobstore', '0002_rendition'),
+        ('plant_detection', '0005_image_blob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='detectionjob',
+            name='keep_original',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='plantdetectionresult',
+            name='original_blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='detection_originals', to='blobstore.blob'),
+        ),
+        migrations.AddField(
+            model_name='plantdetectionresult',
+            name='original_bytes',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='plantdetectionresult',
+            name='stored_bytes',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
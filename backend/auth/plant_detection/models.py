@@ -1,6 +1,5 @@
 # plant_detection/models.py
 from django.db import models
-import base64
 
 
 class PlantDetectionResult(models.Model):
@@ -8,9 +7,19 @@ class PlantDetectionResult(models.Model):
     user_email = models.EmailField()
     user_type = models.CharField(max_length=20)
     
-    image_data = models.BinaryField(null=True, blank=True)
+    # Image bytes live in the blob store, the row only holds their SHA-256
+    image_blob = models.ForeignKey(
+        'blobstore.Blob', null=True, blank=True, on_delete=models.PROTECT, related_name='detection_results'
+    )
     image_name = models.CharField(max_length=255, null=True, blank=True)
     image_content_type = models.CharField(max_length=100, null=True, blank=True)
+    # Uploads are re-encoded for storage (see image_policy); the untouched
+    # upload is only kept when the client asked for it
+    original_blob = models.ForeignKey(
+        'blobstore.Blob', null=True, blank=True, on_delete=models.PROTECT, related_name='detection_originals'
+    )
+    original_bytes = models.BigIntegerField(null=True, blank=True)
+    stored_bytes = models.BigIntegerField(null=True, blank=True)
     
     prediction = models.CharField(max_length=255)
     confidence = models.FloatField()
@@ -19,18 +28,80 @@ class PlantDetectionResult(models.Model):
     def __str__(self):
         return f"Detection {self.id} - {self.prediction}"
 
+    def has_image_data(self):
+        """Check if this record has an image"""
+        return bool(self.image_blob_id)
+
     @property
-    def image_url(self):
-        # Generate a data URL for the frontend if image_data exists
-        if self.image_data:
-            try:
-                encoded_image = base64.b64encode(self.image_data).decode('utf-8')
-                return f"data:{self.image_content_type};base64,{encoded_image}"
-            except Exception as e:
-                print(f"Error encoding image for detection {self.id}: {e}")
-                return None
-        return None
+    def bytes_saved(self):
+        """Bytes the storage policy saved on this upload (None for images stored before it)"""
+        if self.original_bytes is None or self.stored_bytes is None:
+            return None
+        return self.original_bytes - self.stored_bytes
 
-    def has_image_data(self):
-        """Check if this record has binary image data"""
-        return bool(self.image_data)
\ No newline at end of file
+class PredictionCacheEntry(models.Model):
+    """Persistent tier of the prediction cache, keyed by a hash of the model input tensor"""
+    key = models.CharField(max_length=64, primary_key=True)
+    model_version = models.CharField(max_length=64, db_index=True)
+
+    prediction = models.CharField(max_length=255)
+    confidence = models.FloatField()
+    class_index = models.IntegerField()
+    top_predictions = models.JSONField(default=list)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Cached {self.prediction} ({self.key[:12]})"
+
+    def to_result(self):
+        return {
+            "prediction": self.prediction,
+            "confidence": self.confidence,
+            "class_index": self.class_index,
+            "top_predictions": [tuple(item) for item in self.top_predictions],
+        }
+
+
+class DetectionJob(models.Model):
+    """A detection request queued for the inference worker pool"""
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    JOB_STATUS = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    user_id = models.CharField(max_length=10)
+    user_email = models.EmailField()
+    user_type = models.CharField(max_length=20)
+
+    image_blob = models.ForeignKey(
+        'blobstore.Blob', null=True, blank=True, on_delete=models.PROTECT, related_name='detection_jobs'
+    )
+    image_name = models.CharField(max_length=255, null=True, blank=True)
+    image_content_type = models.CharField(max_length=100, null=True, blank=True)
+    keep_original = models.BooleanField(default=False)
+
+    status = models.CharField(max_length=20, choices=JOB_STATUS, default=STATUS_QUEUED)
+    attempts = models.IntegerField(default=0)
+    worker_id = models.CharField(max_length=100, null=True, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(null=True, blank=True)
+    detection = models.ForeignKey(PlantDetectionResult, null=True, blank=True, on_delete=models.SET_NULL)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"DetectionJob {self.id} - {self.status}"
@@ -1,6 +1,15 @@
 # plant_detection/serializers.py - UPDATED VERSION
 from rest_framework import serializers
-from .models import PlantDetectionResult
+from blobstore.renditions import media_url
+from .models import PlantDetectionResult, DetectionJob
+from .imaging import decode_upload, ImageDecodeError
+
+
+def detection_image_url(detection, request=None):
+    """Cacheable /api/media/detections/<id>/<sha256> URL, or None without an image"""
+    if not detection.has_image_data():
+        return None
+    return media_url('detection-image', detection.id, detection.image_blob_id, request)
 
 class PlantDetectionResultSerializer(serializers.ModelSerializer):
     image_url = serializers.SerializerMethodField()
@@ -18,19 +27,51 @@ class PlantDetectionResultSerializer(serializers.ModelSerializer):
         ]
     
     def get_image_url(self, obj):
-        return obj.image_url
+        return detection_image_url(obj, self.context.get('request'))
     
     def get_has_image(self, obj):
         return obj.has_image_data()
 
+class PlantDetectionHistorySerializer(serializers.ModelSerializer):
+    """Lightweight history row: the image is referenced by URL and fetched separately"""
+    image_url = serializers.SerializerMethodField()
+    has_image = serializers.SerializerMethodField()
+
+    class Meta:
+        model = PlantDetectionResult
+        fields = ['id', 'image_url', 'has_image', 'prediction', 'confidence', 'created_at']
+        read_only_fields = fields
+
+    def get_image_url(self, obj):
+        return detection_image_url(obj, self.context.get('request'))
+
+    def get_has_image(self, obj):
+        return obj.has_image_data()
+
+class DetectionJobSerializer(serializers.ModelSerializer):
+    detection = PlantDetectionResultSerializer(read_only=True)
+
+    class Meta:
+        model = DetectionJob
+        fields = [
+            'id', 'status', 'attempts', 'result', 'error', 'detection',
+            'created_at', 'started_at', 'finished_at'
+        ]
+        read_only_fields = fields
+
 class PlantDetectionRequestSerializer(serializers.Serializer):
-    image = serializers.ImageField(
+    # FileField rather than ImageField: the image is decoded once in validate_image
+    # and the decoded result is shared with inference instead of a separate Pillow verify
+    image = serializers.FileField(
         max_length=100,
         allow_empty_file=False,
         use_url=True
     )
+    # Store the untouched upload next to the re-encoded copy
+    keep_original = serializers.BooleanField(required=False, default=False)
     
     def validate_image(self, value):
+        """Validate the upload and return it decoded as a DecodedImage"""
         max_size = 10 * 1024 * 1024  # 10MB
         if value.size > max_size:
             raise serializers.ValidationError("Image size too large. Maximum 10MB allowed.")
@@ -40,4 +81,7 @@ class PlantDetectionRequestSerializer(serializers.Serializer):
         if extension not in valid_extensions:
             raise serializers.ValidationError(f"Unsupported file format. Supported formats: {', '.join(valid_extensions)}")
         
-        return value
\ No newline at end of file
+        try:
+            return decode_upload(value)
+        except ImageDecodeError:
+            raise serializers.ValidationError("Upload a valid image. The file you uploaded was either not an image or a corrupted image.")
\ No newline at end of file
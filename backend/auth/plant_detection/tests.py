@@ -1,3 +1,753 @@
-from django.test import TestCase
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+
+from users.models import Farmer
+from users.tokens import issue_tokens
+from blobstore.storage import put_blob, read_blob
+from . import backends, batching, jobs, services
+from .backends import KerasBackend, TFLiteBackend
+from .batching import InferenceBatcher, _PendingRequest
+from .image_policy import compact_detection_images, store_detection_image
+from .imaging import decode_image
+from .models import DetectionJob, PlantDetectionResult
+from .services import PlantDiseaseDetector
+
+CLASSES = len(PlantDiseaseDetector._class_names)
+
+
+class FakeBackend:
+    """Stands in for KerasBackend/TFLiteBackend: every row scores ``label``"""
+
+    def __init__(self, label=0, name='fake'):
+        self.label = label
+        self.name = name
+        self.calls = []
+
+    def predict(self, batch):
+        self.calls.append(len(batch))
+        scores = np.zeros((len(batch), CLASSES), dtype=np.float32)
+        scores[:, self.label] = 1.0
+        return scores
+
+
+def image(value=0.0):
+    return np.full((128, 128, 3), value, dtype=np.float32)
+
+
+def row_sums(batch):
+    """A predict_fn whose row i identifies input i"""
+    return batch.reshape(len(batch), -1).sum(axis=1)
+
+
+class InferenceBatcherTests(SimpleTestCase):
+
+    def queue_requests(self, batcher, count, age=0.0):
+        requests = [_PendingRequest(image(n)) for n in range(count)]
+        for request in requests:
+            request.enqueued_at -= age
+            batcher._queue.put(request)
+        return requests
+
+    def test_batches_are_capped_at_max_batch_size(self):
+        batcher = InferenceBatcher(row_sums, max_batch_size=4, max_wait_ms=20)
+        self.queue_requests(batcher, 10)
+        self.assertEqual([len(batcher._collect_batch()) for _ in range(3)], [4, 4, 2])
+
+    def test_a_lone_request_waits_at_most_max_wait(self):
+        batcher = InferenceBatcher(row_sums, max_batch_size=8, max_wait_ms=50)
+        self.queue_requests(batcher, 1)
+        started = time.perf_counter()
+        self.assertEqual(len(batcher._collect_batch()), 1)
+        elapsed = time.perf_counter() - started
+        self.assertGreaterEqual(elapsed, 0.04)
+        self.assertLess(elapsed, 1.0)
+
+    def test_requests_arriving_within_max_wait_join_the_batch(self):
+        batcher = InferenceBatcher(row_sums, max_batch_size=8, max_wait_ms=500)
+        self.queue_requests(batcher, 1)
+        late = threading.Timer(0.02, lambda: batcher._queue.put(_PendingRequest(image(1))))
+        late.start()
+        self.assertEqual(len(batcher._collect_batch()), 2)
+        late.join()
+
+    def test_past_deadline_takes_only_what_is_queued(self):
+        batcher = InferenceBatcher(row_sums, max_batch_size=8, max_wait_ms=10)
+        self.queue_requests(batcher, 3, age=1.0)
+        started = time.perf_counter()
+        self.assertEqual(len(batcher._collect_batch()), 3)
+        self.assertLess(time.perf_counter() - started, 0.1)
+
+    def submit_concurrently(self, batcher, count):
+        results = [None] * count
+
+        def submit(n):
+            try:
+                results[n] = batcher.submit(image(n), timeout=5)
+            except Exception as e:
+                results[n] = e
+        threads = [threading.Thread(target=submit, args=(n,)) for n in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        return results
+
+    def test_each_caller_gets_its_own_row(self):
+        calls = []
+        batcher = InferenceBatcher(lambda batch: calls.append(len(batch)) or row_sums(batch),
+                                   max_batch_size=4, max_wait_ms=500)
+        results = self.submit_concurrently(batcher, 4)
+        self.assertEqual(calls, [4])
+        self.assertEqual(results, [n * 128 * 128 * 3 for n in range(4)])
+        self.assertEqual(batcher.stats()['batch_size_histogram'], {4: 1})
+
+    def test_an_exception_reaches_every_caller_of_the_batch(self):
+        calls = []
+
+        def failing(batch):
+            calls.append(len(batch))
+            raise ValueError('model exploded')
+        batcher = InferenceBatcher(failing, max_batch_size=3, max_wait_ms=500)
+        results = self.submit_concurrently(batcher, 3)
+        self.assertEqual(calls, [3])
+        for result in results:
+            self.assertIsInstance(result, ValueError)
+        # The worker survives the failure
+        batcher._predict_fn = row_sums
+        self.assertEqual(batcher.submit(image(2), timeout=5), 2 * 128 * 128 * 3)
+
+    def test_fork_handler_resets_the_worker(self):
+        batcher = InferenceBatcher(row_sums, max_batch_size=2, max_wait_ms=1)
+        with mock.patch.object(batching.os, 'register_at_fork') as register:
+            batching.register_fork_handler(batcher)
+        register.assert_called_once_with(after_in_child=batcher._after_fork)
+
+        batcher.submit(image(1), timeout=5)
+        parent_worker, parent_queue = batcher._worker, batcher._queue
+        # What the child runs right after fork(): the parent's thread is gone there
+        batcher._after_fork()
+        self.assertIsNone(batcher._worker)
+        self.assertIsNot(batcher._queue, parent_queue)
+        self.assertEqual(batcher.stats()['total_requests'], 0)
+
+        self.assertEqual(batcher.submit(image(3), timeout=5), 3 * 128 * 128 * 3)
+        self.assertIsNot(batcher._worker, parent_worker)
+
+
+class DetectorStateMixin:
+    """Restores PlantDiseaseDetector's class-level state after each test"""
+
+    STATE = ('_instance', '_model', '_backend', '_model_path', '_model_version', '_failed_version', '_state',
+             '_batcher', '_cache', '_load_seconds', '_warmup_seconds', '_loaded_at')
+
+    def setUp(self):
+        super().setUp()
+        saved = {name: getattr(PlantDiseaseDetector, name) for name in self.STATE}
+
+        def restore():
+            for name, value in saved.items():
+                setattr(PlantDiseaseDetector, name, value)
+        self.addCleanup(restore)
+
+    def use_backend(self, backend, model_version='v1'):
+        PlantDiseaseDetector._backend = backend
+        PlantDiseaseDetector._model_path = '/models/plant.tflite'
+        PlantDiseaseDetector._model_version = model_version
+        PlantDiseaseDetector._failed_version = None
+        PlantDiseaseDetector._state = 'ready'
+        PlantDiseaseDetector._cache = None
+        PlantDiseaseDetector._batcher = None
+
+
+class ModelReloadTests(DetectorStateMixin, SimpleTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.old = FakeBackend(label=1, name='old')
+        self.use_backend(self.old)
+        patcher = mock.patch.object(services, 'model_file_version', return_value='v2')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_successful_reload_swaps_backend(self):
+        new = FakeBackend(label=2, name='new')
+        PlantDiseaseDetector._cache = mock.Mock()
+        with mock.patch.object(PlantDiseaseDetector, '_build_backend', return_value=(new, None, '/m', 'v2')):
+            PlantDiseaseDetector._reload_if_model_changed()
+        self.assertIs(PlantDiseaseDetector._backend, new)
+        self.assertEqual(PlantDiseaseDetector._model_version, 'v2')
+        self.assertEqual(PlantDiseaseDetector._state, 'ready')
+        PlantDiseaseDetector._cache.clear.assert_called_once()
+
+    def test_failed_reload_keeps_the_old_backend(self):
+        with mock.patch.object(PlantDiseaseDetector, '_build_backend',
+                               return_value=(None, None, '/m', 'v2')) as build:
+            PlantDiseaseDetector._reload_if_model_changed()
+            # The broken file is not loaded again on every request
+            PlantDiseaseDetector._reload_if_model_changed()
+        self.assertEqual(build.call_count, 1)
+        self.assertIs(PlantDiseaseDetector._backend, self.old)
+        self.assertEqual(PlantDiseaseDetector._model_version, 'v1')
+        self.assertEqual(PlantDiseaseDetector._state, 'ready')
+
+    def test_batches_run_during_a_reload(self):
+        loading, release = threading.Event(), threading.Event()
+        new = FakeBackend(label=2, name='new')
+
+        def slow_build():
+            loading.set()
+            release.wait(5)
+            return new, None, '/m', 'v2'
+
+        with mock.patch.object(PlantDiseaseDetector, '_build_backend', side_effect=slow_build):
+            reload = threading.Thread(target=PlantDiseaseDetector._reload_if_model_changed)
+            reload.start()
+            self.assertTrue(loading.wait(5))
+            scores = PlantDiseaseDetector._predict_batch(np.zeros((2, 128, 128, 3), dtype=np.float32))
+            release.set()
+            reload.join(5)
+        self.assertEqual(scores.argmax(axis=1).tolist(), [1, 1])
+        self.assertIs(PlantDiseaseDetector._backend, new)
+
+
+def photo(name='leaf.jpg', color=(40, 140, 60), size=(300, 200)):
+    output = BytesIO()
+    Image.new('RGB', size, color).save(output, format='JPEG')
+    return SimpleUploadedFile(name, output.getvalue(), content_type='image/jpeg')
+
+
+def prediction(class_index, confidence=0.9):
+    return {
+        'prediction': PlantDiseaseDetector._class_names[class_index], 'confidence': confidence,
+        'class_index': class_index, 'top_predictions': [], 'cache_hit': False,
+    }
+
+
+class FarmerClientMixin:
+    """A farmer, a bearer token for it, and blobs in a temporary BLOBSTORE_ROOT"""
+
+    def setUp(self):
+        super().setUp()
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        storage = override_settings(BLOBSTORE_ROOT=root)
+        storage.enable()
+        self.addCleanup(storage.disable)
+
+        self.farmer = Farmer(email='grower@example.com', name='Grower', district='D', state='S')
+        self.farmer.set_password('secret123')
+        self.farmer.save()
+        token = issue_tokens(self.farmer.id, self.farmer.email, 'farmer', True, False)['token']
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {token}'}
+
+
+class BatchDetectionViewTests(FarmerClientMixin, DetectorStateMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        # A constructed detector, so the view never tries to load a model
+        PlantDiseaseDetector._instance = object.__new__(PlantDiseaseDetector)
+        self.use_backend(FakeBackend())
+
+    def post(self, files):
+        return self.client.post('/api/plant/detect/batch/', {'images': files}, **self.auth)
+
+    def test_partial_failure(self):
+        files = [photo('a.jpg'), SimpleUploadedFile('b.jpg', b'not an image', content_type='image/jpeg'),
+                 photo('c.png', color=(200, 40, 40)), photo('d.jpg', color=(10, 10, 200))]
+        results = [prediction(3), {'error': 'Prediction failed: out of memory'}, prediction(7, 0.6)]
+        with mock.patch.object(PlantDiseaseDetector, 'predict_batch', return_value=results) as predict_batch:
+            response = self.post(files)
+
+        # The undecodable upload never reaches the model
+        self.assertEqual(len(predict_batch.call_args.args[0]), 3)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data['total'], data['succeeded'], data['failed']), (4, 2, 2))
+        self.assertEqual([item['index'] for item in data['results']], [0, 1, 2, 3])
+        self.assertEqual([item['status'] for item in data['results']], ['ok', 'error', 'error', 'ok'])
+        self.assertEqual(data['results'][1]['detail'], 'Invalid image')
+        self.assertEqual(data['results'][2]['detail'], 'Prediction failed: out of memory')
+        self.assertEqual(data['results'][3]['prediction'], PlantDiseaseDetector._class_names[7])
+
+        saved = PlantDetectionResult.objects.order_by('id')
+        self.assertEqual([(row.image_name, row.prediction) for row in saved], [
+            ('a.jpg', PlantDiseaseDetector._class_names[3]), ('d.jpg', PlantDiseaseDetector._class_names[7]),
+        ])
+        for row, item in zip(saved, (data['results'][0], data['results'][3])):
+            self.assertEqual(item['id'], row.id)
+            self.assertEqual((row.user_id, row.user_type), (self.farmer.id, 'farmer'))
+            self.assertIsNotNone(row.image_blob_id)
+
+    def test_successes_are_saved_with_one_insert(self):
+        results = [prediction(n) for n in range(5)]
+        with mock.patch.object(PlantDiseaseDetector, 'predict_batch', return_value=results):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.post([photo(f'{n}.jpg', color=(n * 40, 100, 50)) for n in range(5)])
+        self.assertEqual(response.status_code, 200)
+        inserts = [q['sql'] for q in queries if q['sql'].startswith('INSERT INTO "plant_detection_plantdetectionresult"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(PlantDetectionResult.objects.count(), 5)
+
+    def test_all_failed_is_400_and_saves_nothing(self):
+        with mock.patch.object(PlantDiseaseDetector, 'predict_batch',
+                               return_value=[{'error': 'Model not loaded'}] * 2):
+            response = self.post([photo('a.jpg'), photo('b.jpg')])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['failed'], 2)
+        self.assertFalse(PlantDetectionResult.objects.exists())
+
+    def test_too_many_images(self):
+        with override_settings(PLANT_DETECTION_MAX_BATCH_IMAGES=2):
+            response = self.post([photo('a.jpg'), photo('b.jpg'), photo('c.jpg')])
+        self.assertEqual(response.status_code, 400)
+
+
+class DetectionJobTests(FarmerClientMixin, TestCase):
+
+    def enqueue(self, count=1):
+        image = decode_image(photo().read(), 'leaf.jpg', 'image/jpeg')
+        return [jobs.enqueue_job(self.farmer, image) for _ in range(count)]
+
+    def detector(self, results=None, error=None):
+        detector = mock.Mock()
+        if error:
+            detector.predict_batch.side_effect = error
+        else:
+            detector.predict_batch.side_effect = lambda inputs: results or [prediction(3) for _ in inputs]
+        return detector
+
+    def test_claims_are_exclusive_and_ordered(self):
+        queued = self.enqueue(5)
+        first = jobs.claim_jobs('worker-a', 2)
+        second = jobs.claim_jobs('worker-b', 10)
+        self.assertEqual([job.id for job in first], [job.id for job in queued[:2]])
+        self.assertEqual([job.id for job in second], [job.id for job in queued[2:]])
+        self.assertEqual(jobs.claim_jobs('worker-c', 10), [])
+        for job in first:
+            self.assertEqual((job.status, job.worker_id, job.attempts), (DetectionJob.STATUS_RUNNING, 'worker-a', 1))
+
+    def test_claim_lost_to_another_worker_is_skipped(self):
+        queued = self.enqueue(3)
+        real_now = timezone.now
+        stolen = []
+
+        def now():
+            # Worker B's conditional UPDATE lands between A's SELECT of candidates and A's UPDATE
+            if not stolen:
+                stolen.append(DetectionJob.objects.filter(id=queued[0].id, status=DetectionJob.STATUS_QUEUED).update(
+                    status=DetectionJob.STATUS_RUNNING, worker_id='worker-b', attempts=1,
+                ))
+            return real_now()
+
+        with mock.patch.object(jobs.timezone, 'now', side_effect=now):
+            claimed = jobs.claim_jobs('worker-a', 3)
+        self.assertEqual(stolen, [1])
+        self.assertEqual([job.id for job in claimed], [queued[1].id, queued[2].id])
+        self.assertEqual(DetectionJob.objects.get(id=queued[0].id).worker_id, 'worker-b')
+
+    def test_process_jobs_stores_results(self):
+        self.enqueue(2)
+        claimed = jobs.claim_jobs('worker-a', 2)
+        jobs.process_jobs(claimed, self.detector())
+        for job in DetectionJob.objects.all():
+            self.assertEqual(job.status, DetectionJob.STATUS_DONE)
+            self.assertIsNone(job.image_blob_id)
+            self.assertEqual(job.result['prediction'], PlantDiseaseDetector._class_names[3])
+            self.assertEqual(job.detection.user_id, self.farmer.id)
+        self.assertEqual(PlantDetectionResult.objects.count(), 2)
+
+    def test_prediction_failure_is_retried_then_failed(self):
+        self.enqueue()
+        with override_settings(PLANT_DETECTION_JOB_MAX_ATTEMPTS=2):
+            jobs.process_jobs(jobs.claim_jobs('worker-a', 1), self.detector(error=RuntimeError('device lost')))
+            job = DetectionJob.objects.get()
+            self.assertEqual((job.status, job.worker_id, job.error), (DetectionJob.STATUS_QUEUED, None, 'device lost'))
+
+            jobs.process_jobs(jobs.claim_jobs('worker-a', 1), self.detector(error=RuntimeError('device lost')))
+            job = DetectionJob.objects.get()
+            self.assertEqual((job.status, job.attempts), (DetectionJob.STATUS_FAILED, 2))
+        self.assertFalse(PlantDetectionResult.objects.exists())
+
+    def make_stale(self, job, seconds=3600):
+        DetectionJob.objects.filter(id=job.id).update(heartbeat_at=timezone.now() - timedelta(seconds=seconds))
+
+    def test_stale_jobs_are_requeued_or_failed(self):
+        retried, exhausted, alive = self.enqueue(3)
+        jobs.claim_jobs('worker-a', 3)
+        DetectionJob.objects.filter(id=exhausted.id).update(attempts=3)
+        self.make_stale(retried)
+        self.make_stale(exhausted)
+        with override_settings(PLANT_DETECTION_JOB_TIMEOUT=60, PLANT_DETECTION_JOB_MAX_ATTEMPTS=3):
+            self.assertEqual(jobs.requeue_stale_jobs(), (1, 1))
+        statuses = dict(DetectionJob.objects.values_list('id', 'status'))
+        self.assertEqual(statuses, {
+            retried.id: DetectionJob.STATUS_QUEUED,
+            exhausted.id: DetectionJob.STATUS_FAILED,
+            alive.id: DetectionJob.STATUS_RUNNING,
+        })
+        self.assertIsNone(DetectionJob.objects.get(id=exhausted.id).image_blob_id)
+
+    def test_heartbeat_keeps_a_slow_job_alive(self):
+        self.enqueue()
+        job, = jobs.claim_jobs('worker-a', 1)
+        self.make_stale(job)
+        jobs._heartbeat([job])
+        with override_settings(PLANT_DETECTION_JOB_TIMEOUT=60):
+            self.assertEqual(jobs.requeue_stale_jobs(), (0, 0))
+
+    def test_stale_worker_loses_ownership(self):
+        self.enqueue()
+        job_a, = jobs.claim_jobs('worker-a', 1)
+        # Worker A stalls past the timeout; the job goes to worker B
+        self.make_stale(job_a)
+        with override_settings(PLANT_DETECTION_JOB_TIMEOUT=60):
+            jobs.requeue_stale_jobs()
+        job_b, = jobs.claim_jobs('worker-b', 1)
+        image = decode_image(photo().read(), 'leaf.jpg', 'image/jpeg')
+
+        # A wakes up: its heartbeat, result and failure handling no longer touch the job
+        jobs._heartbeat([job_a])
+        self.assertFalse(jobs._store_result(job_a, image, prediction(3)))
+        jobs._retry_or_fail(job_a, 'late error')
+        job = DetectionJob.objects.get()
+        self.assertEqual((job.status, job.worker_id, job.attempts, job.error),
+                         (DetectionJob.STATUS_RUNNING, 'worker-b', 2, None))
+        self.assertFalse(PlantDetectionResult.objects.exists())
+
+        self.assertTrue(jobs._store_result(job_b, image, prediction(5)))
+        job = DetectionJob.objects.get()
+        self.assertEqual(job.status, DetectionJob.STATUS_DONE)
+        self.assertEqual(job.detection.prediction, PlantDiseaseDetector._class_names[5])
+
+
+class DetectionJobClaimConcurrencyTests(FarmerClientMixin, TransactionTestCase):
+    """Workers claiming from the same queue on separate threads and connections"""
+    workers = 4
+
+    def test_every_job_is_claimed_exactly_once(self):
+        image = decode_image(photo().read(), 'leaf.jpg', 'image/jpeg')
+        queued = {jobs.enqueue_job(self.farmer, image).id for _ in range(30)}
+        claimed = []
+        errors = []
+        lock = threading.Lock()
+        barrier = threading.Barrier(self.workers)
+
+        def worker(name):
+            barrier.wait()
+            try:
+                idle = 0
+                while idle < 3:
+                    try:
+                        batch = jobs.claim_jobs(name, 3)
+                    except OperationalError:
+                        # SQLite "database is locked" under concurrent writers: poll again, as run_worker does
+                        time.sleep(0.01)
+                        continue
+                    idle = 0 if batch else idle + 1
+                    with lock:
+                        claimed.extend((job.id, name) for job in batch)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(f'worker-{n}',)) for n in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        ids = [job_id for job_id, _ in claimed]
+        self.assertEqual(len(ids), len(set(ids)))
+        # One successful conditional UPDATE per job, whether or not its claimer saw the result
+        rows = DetectionJob.objects.values_list('id', 'status', 'attempts', 'worker_id')
+        self.assertEqual({(job_id, status, attempts) for job_id, status, attempts, _ in rows},
+                         {(job_id, DetectionJob.STATUS_RUNNING, 1) for job_id in queued})
+        owners = {job_id: worker_id for job_id, _, _, worker_id in rows}
+        for job_id, name in claimed:
+            self.assertEqual(owners[job_id], name)
+
+
+class FakeInterpreter:
+    """tflite_runtime.interpreter.Interpreter over a model whose output is its input's row means"""
+
+    def __init__(self, model_content, num_threads=None, dtype=np.float32, quantization=(0.0, 0)):
+        self.model_content = model_content
+        self.dtype = dtype
+        self.quantization = quantization
+        self.tensors = {}
+
+    def get_input_details(self):
+        return [{'index': 0, 'shape': np.array([1, 128, 128, 3]), 'dtype': self.dtype,
+                 'quantization': self.quantization}]
+
+    def get_output_details(self):
+        return [{'index': 1, 'dtype': self.dtype, 'quantization': self.quantization}]
+
+    def resize_tensor_input(self, index, shape):
+        self.shape = shape
+
+    def allocate_tensors(self):
+        pass
+
+    def set_tensor(self, index, value):
+        self.tensors[index] = value
+
+    def invoke(self):
+        batch = self.tensors[0]
+        self.tensors[1] = batch.reshape(len(batch), -1)[:, :CLASSES].astype(self.dtype)
+
+    def get_tensor(self, index):
+        return self.tensors[index]
+
+
+def fake_module(name, **attributes):
+    module = type(sys)(name)
+    module.__dict__.update(attributes)
+    return module
+
+
+@override_settings(PLANT_DETECTION_COMPILED_INFERENCE=False)
+class BackendSelectionTests(DetectorStateMixin, SimpleTestCase):
+    """Which backend _build_backend picks, with TensorFlow and the TFLite runtime mocked"""
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.keras_path = os.path.join(directory, 'trained_plant_disease_model.h5')
+        self.tflite_path = os.path.join(directory, 'trained_plant_disease_model.tflite')
+        with open(self.keras_path, 'wb') as f:
+            f.write(b'keras')
+
+        self.keras_model = mock.Mock()
+        tensorflow = mock.Mock()
+        tensorflow.keras.models.load_model.return_value = self.keras_model
+        for patcher in (
+            mock.patch.object(services, '_tensorflow', tensorflow),
+            mock.patch.object(PlantDiseaseDetector, 'keras_model_path', return_value=self.keras_path),
+            mock.patch.object(KerasBackend, 'available', return_value=True),
+            mock.patch.dict(sys.modules, {
+                'tflite_runtime': fake_module('tflite_runtime'),
+                'tflite_runtime.interpreter': fake_module('tflite_runtime.interpreter', Interpreter=FakeInterpreter),
+            }),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def write_tflite(self):
+        with open(self.tflite_path, 'wb') as f:
+            f.write(b'flatbuffer')
+
+    def build(self, tflite_available=True):
+        with override_settings(PLANT_DETECTION_BACKEND='tflite', PLANT_DETECTION_TFLITE_MODEL=self.tflite_path), \
+                mock.patch.object(TFLiteBackend, 'available', return_value=tflite_available):
+            return PlantDiseaseDetector._build_backend()
+
+    def test_tflite_model_is_used_when_available(self):
+        self.write_tflite()
+        backend, model, path, version = self.build()
+        self.assertIsInstance(backend, TFLiteBackend)
+        self.assertEqual((model, path), (None, self.tflite_path))
+        self.assertIsNotNone(version)
+        batch = np.stack([image(1), image(2)])
+        self.assertEqual(backend.predict(batch).shape, (2, CLASSES))
+
+    def test_falls_back_to_keras_without_a_tflite_runtime(self):
+        self.write_tflite()
+        backend, model, path, _ = self.build(tflite_available=False)
+        self.assertIsInstance(backend, KerasBackend)
+        self.assertEqual((backend.mode, model, path), ('predict', self.keras_model, self.keras_path))
+
+    def test_falls_back_to_keras_without_a_tflite_file(self):
+        backend, _, path, _ = self.build()
+        self.assertIsInstance(backend, KerasBackend)
+        self.assertEqual(path, self.keras_path)
+
+    def test_no_backend_without_any_runtime(self):
+        with mock.patch.object(KerasBackend, 'available', return_value=False):
+            self.assertEqual(self.build(tflite_available=False), (None, None, None, None))
+            with override_settings(PLANT_DETECTION_BACKEND='tflite'), \
+                    mock.patch.object(TFLiteBackend, 'available', return_value=False):
+                self.assertFalse(services.runtime_available())
+
+    def test_int8_model_input_is_quantized(self):
+        self.write_tflite()
+        with mock.patch.object(sys.modules['tflite_runtime.interpreter'], 'Interpreter',
+                               lambda **kwargs: FakeInterpreter(dtype=np.int8, quantization=(0.5, -10), **kwargs)):
+            backend = TFLiteBackend(self.tflite_path)
+        scores = backend.predict(np.stack([image(20.0)]))
+        # 20 / 0.5 - 10 = 30 on the way in, (30 + 10) * 0.5 = 20 on the way out
+        self.assertEqual(backend._interpreter.tensors[0].dtype, np.int8)
+        self.assertEqual(scores.dtype, np.float32)
+        np.testing.assert_allclose(scores, np.full((1, CLASSES), 20.0))
+
+
+class ExportTFLiteTests(SimpleTestCase):
+    """export_tflite and its management command, with TensorFlow mocked"""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.output = os.path.join(directory, 'model.tflite')
+        self.tf = mock.MagicMock()
+        self.converter = self.tf.lite.TFLiteConverter.from_keras_model.return_value
+        self.converter.convert.return_value = b'flatbuffer'
+        patcher = mock.patch.dict(sys.modules, {'tensorflow': self.tf})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_float16(self):
+        self.assertEqual(backends.export_tflite(mock.Mock(), self.output, 'float16'), len(b'flatbuffer'))
+        self.assertEqual(self.converter.optimizations, [self.tf.lite.Optimize.DEFAULT])
+        self.assertEqual(self.converter.target_spec.supported_types, [self.tf.float16])
+        with open(self.output, 'rb') as f:
+            self.assertEqual(f.read(), b'flatbuffer')
+
+    def test_int8_calibrates_on_the_samples(self):
+        backends.export_tflite(mock.Mock(), self.output, 'int8', representative_inputs=[image(1), image(2)])
+        self.assertEqual(self.converter.target_spec.supported_ops, [self.tf.lite.OpsSet.TFLITE_BUILTINS_INT8])
+        samples = list(self.converter.representative_dataset())
+        self.assertEqual([sample[0].shape for sample in samples], [(1, 128, 128, 3)] * 2)
+
+    def test_invalid_requests(self):
+        with self.assertRaises(ValueError):
+            backends.export_tflite(mock.Mock(), self.output, 'int8')
+        with self.assertRaises(ValueError):
+            backends.export_tflite(mock.Mock(), self.output, 'int4')
+        self.assertFalse(os.path.exists(self.output))
+
+    def test_command(self):
+        with mock.patch.object(PlantDiseaseDetector, 'keras_model_path', return_value='/models/plant.h5'):
+            call_command('export_tflite', '--output', self.output, stdout=StringIO())
+            self.tf.keras.models.load_model.assert_called_once_with('/models/plant.h5', compile=False)
+            self.assertTrue(os.path.exists(self.output))
+            with self.assertRaisesMessage(CommandError, 'int8 quantization needs --samples'):
+                call_command('export_tflite', '--output', self.output, '--quantization', 'int8', stdout=StringIO())
+        with mock.patch.object(PlantDiseaseDetector, 'keras_model_path', return_value=None):
+            with self.assertRaisesMessage(CommandError, 'Keras model not found'):
+                call_command('export_tflite', '--output', self.output, stdout=StringIO())
+
+
+def exif_photo(size=(2000, 1500), orientation=6):
+    """A JPEG with an EXIF orientation and a camera model"""
+    output = BytesIO()
+    exif = Image.Exif()
+    exif[0x0112] = orientation
+    exif[0x0110] = 'Test Camera'
+    Image.new('RGB', size, (90, 140, 60)).save(output, format='JPEG', quality=95, exif=exif)
+    return output.getvalue()
+
+
+def tiny_png():
+    """A small PNG without EXIF: a JPEG of it would only be larger"""
+    output = BytesIO()
+    Image.new('RGB', (8, 8), (90, 140, 60)).save(output, format='PNG')
+    return output.getvalue()
+
+
+@override_settings(PLANT_DETECTION_IMAGE_MAX_EDGE=1024, PLANT_DETECTION_IMAGE_QUALITY=80,
+                   PLANT_DETECTION_KEEP_ORIGINALS=False)
+class ImagePolicyTests(FarmerClientMixin, TestCase):
+
+    def test_upload_is_downscaled_rotated_and_stripped(self):
+        data = exif_photo()
+        fields = store_detection_image(decode_image(data, 'leaf.jpg', 'image/jpeg'))
+        stored = read_blob(fields['image_blob'].sha256)
+        with Image.open(BytesIO(stored)) as image:
+            self.assertEqual(image.format, 'JPEG')
+            # Orientation 6 is applied, then dropped along with the rest of the EXIF
+            self.assertEqual(image.size, (768, 1024))
+            self.assertNotIn('exif', image.info)
+        self.assertEqual(fields['image_content_type'], 'image/jpeg')
+        self.assertEqual((fields['original_bytes'], fields['stored_bytes']), (len(data), len(stored)))
+        self.assertIsNone(fields['original_blob'])
+
+    def test_original_is_kept_on_request(self):
+        data = exif_photo()
+        fields = store_detection_image(decode_image(data, 'leaf.jpg', 'image/jpeg'), keep_original=True)
+        self.assertEqual(read_blob(fields['original_blob'].sha256), data)
+        with override_settings(PLANT_DETECTION_KEEP_ORIGINALS=True):
+            fields = store_detection_image(decode_image(data, 'leaf.jpg', 'image/jpeg'))
+        self.assertIsNotNone(fields['original_blob'])
+
+    def test_small_clean_upload_is_stored_as_is(self):
+        data = tiny_png()
+        fields = store_detection_image(decode_image(data, 'leaf.png', 'image/png'), keep_original=True)
+        self.assertEqual(read_blob(fields['image_blob'].sha256), data)
+        self.assertEqual(fields['image_content_type'], 'image/png')
+        self.assertEqual(fields['original_bytes'], fields['stored_bytes'])
+        # Nothing to keep: the stored copy is the original
+        self.assertIsNone(fields['original_blob'])
+
+    def detection(self, data, days_old=60, **fields):
+        blob = put_blob(data, 'image/jpeg')
+        detection = PlantDetectionResult.objects.create(
+            user_id=self.farmer.id, user_email=self.farmer.email, user_type='farmer', image_name='leaf.jpg',
+            prediction='Tomato___healthy', confidence=0.9, image_blob=blob, image_content_type='image/jpeg', **fields
+        )
+        PlantDetectionResult.objects.filter(id=detection.id).update(
+            created_at=timezone.now() - timedelta(days=days_old)
+        )
+        return detection
+
+    def test_compaction_reencodes_old_images_in_chunks(self):
+        data = exif_photo()
+        old = [self.detection(data), self.detection(exif_photo(orientation=1))]
+        recent = self.detection(data, days_old=1)
+        already = self.detection(data, original_bytes=len(data), stored_bytes=len(data))
+        cutoff = timezone.now() - timedelta(days=30)
+
+        dry = compact_detection_images(cutoff, chunk_size=1, dry_run=True)
+        self.assertEqual(dry['images'], 2)
+        self.assertFalse(PlantDetectionResult.objects.filter(original_bytes__isnull=False).exclude(id=already.id))
+
+        totals = compact_detection_images(cutoff, chunk_size=1)
+        self.assertEqual((totals['images'], totals['failed']), (2, 0))
+        self.assertEqual(totals['bytes_saved'], totals['bytes_before'] - totals['bytes_after'])
+        self.assertGreater(totals['bytes_saved'], 0)
+        for detection in old:
+            original_size = detection.image_blob.size
+            detection.refresh_from_db()
+            self.assertEqual(detection.original_bytes, original_size)
+            self.assertEqual(detection.stored_bytes, detection.image_blob.size)
+            self.assertLess(detection.stored_bytes, detection.original_bytes)
+            with Image.open(BytesIO(read_blob(detection.image_blob_id))) as image:
+                self.assertLessEqual(max(image.size), 1024)
+                self.assertNotIn('exif', image.info)
+        for untouched in (recent, already):
+            self.assertEqual(PlantDetectionResult.objects.get(id=untouched.id).image_blob_id,
+                             untouched.image_blob_id)
+        # Compacted rows are not processed again
+        self.assertEqual(compact_detection_images(cutoff)['images'], 0)
+
+    def test_purge_drops_images_and_keeps_predictions(self):
+        data = exif_photo()
+        original = put_blob(b'original upload', 'image/jpeg')
+        purged = self.detection(data, original_blob=original, original_bytes=len(data), stored_bytes=1234)
+        totals = compact_detection_images(timezone.now() - timedelta(days=30), purge=True, chunk_size=1)
+        self.assertEqual(totals['images'], 1)
+        self.assertEqual(totals['bytes_after'], 0)
+        purged.refresh_from_db()
+        self.assertIsNone(purged.image_blob_id)
+        self.assertIsNone(purged.original_blob_id)
+        self.assertEqual((purged.stored_bytes, purged.original_bytes), (0, len(data)))
+        self.assertEqual(purged.prediction, 'Tomato___healthy')
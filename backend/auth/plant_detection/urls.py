@@ -2,15 +2,27 @@
 from django.urls import path
 from .views import (
     PlantDetectionView, 
+    BatchPlantDetectionView,
+    DetectionJobListView,
+    DetectionJobDetailView,
+    DetectionJobStatsView,
     DetectionHistoryView, 
     DeleteDetectionView,
-    TestAuthView
+    TestAuthView,
+    InferenceStatsView,
+    DetectionHealthView
 )
 
 urlpatterns = [
     path('detect/', PlantDetectionView.as_view(), name='plant-detect'),
+    path('detect/batch/', BatchPlantDetectionView.as_view(), name='plant-detect-batch'),
+    path('jobs/', DetectionJobListView.as_view(), name='detection-jobs'),
+    path('jobs/stats/', DetectionJobStatsView.as_view(), name='detection-job-stats'),
+    path('jobs/<int:job_id>/', DetectionJobDetailView.as_view(), name='detection-job-detail'),
     path('history/', DetectionHistoryView.as_view(), name='detection-history'),
     path('history/<int:detection_id>/', DetectionHistoryView.as_view(), name='delete-single-detection'),
     path('history/clear/', DetectionHistoryView.as_view(), name='clear-all-detections'),
     path('test-auth/', TestAuthView.as_view(), name='test-auth'),
+    path('stats/', InferenceStatsView.as_view(), name='inference-stats'),
+    path('health/', DetectionHealthView.as_view(), name='detection-health'),
 ]
\ No newline at end of file
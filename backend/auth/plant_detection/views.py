@@ -1,96 +1,279 @@
 # plant_detection/views.py - COMPLETE UPDATED VERSION
-import os
-import tempfile
+import logging
+
 from rest_framework.views import APIView
 from rest_framework.response import Response
+from rest_framework.permissions import AllowAny
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from django.shortcuts import get_object_or_404
+from django.conf import settings
 
-from .services import PlantDiseaseDetector
-from .models import PlantDetectionResult
-from .serializers import PlantDetectionResultSerializer, PlantDetectionRequestSerializer
+from .services import PlantDiseaseDetector, inference_enabled, STAGE_SECONDS
+from .jobs import enqueue_job, job_counts
+from .image_policy import store_detection_image, storage_stats
+from .models import PlantDetectionResult, DetectionJob
+from .serializers import (
+    PlantDetectionResultSerializer, PlantDetectionRequestSerializer, DetectionJobSerializer,
+    PlantDetectionHistorySerializer
+)
+from auth.metrics import StageTimer
+from auth.pagination import keyset_page, parse_limit, InvalidCursor
 from users.permissions import IsFarmerOrMultiAccount, IsAuthenticatedWithJWT
 
+logger = logging.getLogger(__name__)
+
+
+def inference_disabled_response():
+    return Response({
+        'detail': 'Plant detection is not available on this server. Use /api/plant/jobs/ to queue the detection.'
+    }, status=503)
+
 
 @method_decorator(csrf_exempt, name='dispatch')
 class PlantDetectionView(APIView):
     permission_classes = [IsAuthenticatedWithJWT, IsFarmerOrMultiAccount]
 
+    def perform_authentication(self, request):
+        with STAGE_SECONDS.time('auth'):
+            super().perform_authentication(request)
+
     def post(self, request):
+        if not inference_enabled():
+            return inference_disabled_response()
+
         try:
+            timer = StageTimer(STAGE_SECONDS)
             # Get user info with prefix IDs
             user_id = request.user.id  # This is now F1, C1, M1, etc.
             user_email = request.user.email
             user_role = getattr(request.user, 'role', 'unknown')
             
-            print(f"🔍 Plant Detection - User ID: {user_id}, Email: {user_email}, Role: {user_role}")
+            logger.debug("Plant Detection - User ID: %s, Role: %s", user_id, user_role)
 
-            serializer = PlantDetectionRequestSerializer(data=request.data)
+            # Multipart parsing happens lazily, on first access to request.data
+            data = request.data
+            timer.mark('parse')
+
+            serializer = PlantDetectionRequestSerializer(data=data)
             if not serializer.is_valid():
                 return Response({'detail': 'Invalid data', 'errors': serializer.errors}, status=400)
 
-            image_file = request.FILES['image']
+            # Decoded exactly once by the serializer, straight from the in-memory upload
+            image = serializer.validated_data['image']
+            timer.mark('decode')
             
             # Validate file type and size
-            if not image_file.content_type.startswith('image/'):
+            if not image.content_type.startswith('image/'):
                 return Response({'detail': 'File must be an image'}, status=400)
             
-            if image_file.size > 10 * 1024 * 1024:
+            if len(image.data) > 10 * 1024 * 1024:
                 return Response({'detail': 'File size too large. Maximum 10MB allowed.'}, status=400)
 
-            temp_path = None
-            try:
-                # Create temporary file for processing
-                with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as temp_file:
-                    for chunk in image_file.chunks():
-                        temp_file.write(chunk)
-                    temp_path = temp_file.name
-
-                # Read image data for database storage
-                image_file.seek(0)  # Reset file pointer
-                image_data = image_file.read()
-                
-                # Initialize detector and make prediction
-                detector = PlantDiseaseDetector()
-                result = detector.predict(temp_path)
+            # Initialize detector and make prediction
+            detector = PlantDiseaseDetector()
+            result = detector.predict(image.model_input)
+            timer.mark('predict')
+
+            if 'error' in result:
+                return Response({'detail': result['error']}, status=400)
 
+            image_fields = store_detection_image(image, serializer.validated_data['keep_original'])
+            timer.mark('store_image')
+
+            # Save the result to database with prefix user_id
+            detection_result = PlantDetectionResult.objects.create(
+                user_id=user_id,  # Now stores F1, C1, M1, etc.
+                user_email=user_email,
+                user_type=user_role,
+                image_name=image.name,
+                prediction=result['prediction'],
+                confidence=result['confidence'],
+                **image_fields
+            )
+            timer.mark('db_insert')
+
+            logger.debug("Plant detection saved for user %s", user_id)
+
+            # Serialize the response
+            response_data = PlantDetectionResultSerializer(detection_result, context={'request': request}).data
+            response_data.update({
+                'prediction': result['prediction'],
+                'confidence': result['confidence'],
+                'class_index': result.get('class_index', 0),
+                'top_predictions': result.get('top_predictions', [])[:3],
+                'cache_hit': result.get('cache_hit', False)
+            })
+            timer.mark('serialize')
+            timer.total('request')
+
+            return Response(response_data)
+
+        except Exception as e:
+            logger.exception("Detection error")
+            return Response({'detail': f'Detection failed: {str(e)}'}, status=400)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class BatchPlantDetectionView(APIView):
+    permission_classes = [IsAuthenticatedWithJWT, IsFarmerOrMultiAccount]
+
+    def post(self, request):
+        """Detect diseases on many images uploaded as repeated 'images' fields"""
+        if not inference_enabled():
+            return inference_disabled_response()
+
+        try:
+            user_id = request.user.id
+            user_email = request.user.email
+            user_role = getattr(request.user, 'role', 'unknown')
+
+            image_files = request.FILES.getlist('images')
+            if not image_files:
+                return Response({'detail': 'No images uploaded. Send files in the "images" field.'}, status=400)
+
+            max_images = getattr(settings, 'PLANT_DETECTION_MAX_BATCH_IMAGES', 50)
+            if len(image_files) > max_images:
+                return Response({'detail': f'Too many images. Maximum {max_images} per batch.'}, status=400)
+
+            logger.debug("Batch Plant Detection - User ID: %s, Images: %s", user_id, len(image_files))
+
+            # Validate and decode every image; invalid ones are reported, not fatal
+            results = [None] * len(image_files)
+            decoded = []
+            for index, image_file in enumerate(image_files):
+                serializer = PlantDetectionRequestSerializer(data={
+                    'image': image_file,
+                    'keep_original': request.data.get('keep_original', False)
+                })
+                if not serializer.is_valid():
+                    results[index] = {
+                        'index': index,
+                        'image_name': image_file.name,
+                        'status': 'error',
+                        'detail': 'Invalid image',
+                        'errors': serializer.errors
+                    }
+                    continue
+                image = serializer.validated_data['image']
+                if not image.content_type.startswith('image/'):
+                    results[index] = {
+                        'index': index,
+                        'image_name': image_file.name,
+                        'status': 'error',
+                        'detail': 'File must be an image'
+                    }
+                    continue
+                decoded.append((index, image, serializer.validated_data['keep_original']))
+
+            detector = PlantDiseaseDetector()
+            predictions = detector.predict_batch([image.model_input for _, image, _ in decoded])
+
+            succeeded = []
+            for (index, image, keep_original), result in zip(decoded, predictions):
                 if 'error' in result:
-                    return Response({'detail': result['error']}, status=400)
+                    results[index] = {
+                        'index': index,
+                        'image_name': image.name,
+                        'status': 'error',
+                        'detail': result['error']
+                    }
+                    continue
+                succeeded.append((index, image, result, keep_original))
 
-                # Save the result to database with prefix user_id
-                detection_result = PlantDetectionResult.objects.create(
-                    user_id=user_id,  # Now stores F1, C1, M1, etc.
+            # Persist every successful detection with a single INSERT
+            detections = PlantDetectionResult.objects.bulk_create([
+                PlantDetectionResult(
+                    user_id=user_id,
                     user_email=user_email,
                     user_type=user_role,
-                    image_data=image_data,
-                    image_name=image_file.name,
-                    image_content_type=image_file.content_type,
+                    image_name=image.name,
                     prediction=result['prediction'],
-                    confidence=result['confidence']
+                    confidence=result['confidence'],
+                    **store_detection_image(image, keep_original)
                 )
+                for _, image, result, keep_original in succeeded
+            ])
 
-                print(f"✅ Plant detection saved for user {user_id}")
-
-                # Serialize the response
-                response_data = PlantDetectionResultSerializer(detection_result).data
+            for (index, image, result, _), detection in zip(succeeded, detections):
+                response_data = PlantDetectionResultSerializer(detection, context={'request': request}).data
                 response_data.update({
+                    'index': index,
+                    'image_name': image.name,
+                    'status': 'ok',
                     'prediction': result['prediction'],
                     'confidence': result['confidence'],
                     'class_index': result.get('class_index', 0),
-                    'top_predictions': result.get('top_predictions', [])[:3]
+                    'top_predictions': result.get('top_predictions', [])[:3],
+                    'cache_hit': result.get('cache_hit', False)
                 })
+                results[index] = response_data
 
-                return Response(response_data)
+            logger.debug("Batch detection for user %s: %s saved, %s failed",
+                         user_id, len(succeeded), len(image_files) - len(succeeded))
 
-            finally:
-                # Clean up temporary file
-                if temp_path and os.path.exists(temp_path):
-                    os.unlink(temp_path)
+            return Response({
+                'results': results,
+                'total': len(image_files),
+                'succeeded': len(succeeded),
+                'failed': len(image_files) - len(succeeded)
+            }, status=200 if succeeded else 400)
 
         except Exception as e:
-            print(f"❌ Detection error: {str(e)}")
-            return Response({'detail': f'Detection failed: {str(e)}'}, status=400)
+            logger.exception("Batch detection error")
+            return Response({'detail': f'Batch detection failed: {str(e)}'}, status=400)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class DetectionJobListView(APIView):
+    permission_classes = [IsAuthenticatedWithJWT, IsFarmerOrMultiAccount]
+
+    def post(self, request):
+        """Queue a detection for the worker pool and return the job id immediately"""
+        try:
+            serializer = PlantDetectionRequestSerializer(data=request.data)
+            if not serializer.is_valid():
+                return Response({'detail': 'Invalid data', 'errors': serializer.errors}, status=400)
+
+            image = serializer.validated_data['image']
+            if not image.content_type.startswith('image/'):
+                return Response({'detail': 'File must be an image'}, status=400)
+
+            job = enqueue_job(request.user, image, keep_original=serializer.validated_data['keep_original'])
+            logger.debug("Detection job %s queued for user %s", job.id, request.user.id)
+
+            return Response({
+                'job_id': job.id,
+                'status': job.status,
+                'status_url': f'/api/plant/jobs/{job.id}/'
+            }, status=202)
+
+        except Exception as e:
+            logger.exception("Job enqueue error")
+            return Response({'detail': f'Failed to queue detection: {str(e)}'}, status=400)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class DetectionJobDetailView(APIView):
+    permission_classes = [IsAuthenticatedWithJWT, IsFarmerOrMultiAccount]
+
+    def get(self, request, job_id):
+        """Poll the status and result of a queued detection"""
+        job = get_object_or_404(
+            DetectionJob.objects.select_related('detection'),
+            id=job_id,
+            user_id=request.user.id
+        )
+        return Response(DetectionJobSerializer(job, context={'request': request}).data)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class DetectionJobStatsView(APIView):
+    permission_classes = [IsAuthenticatedWithJWT, IsFarmerOrMultiAccount]
+
+    def get(self, request):
+        """Queued/running/done/failed job counts"""
+        return Response({'jobs': job_counts()})
 
 
 @method_decorator(csrf_exempt, name='dispatch')
@@ -98,25 +281,32 @@ class DetectionHistoryView(APIView):
     permission_classes = [IsAuthenticatedWithJWT, IsFarmerOrMultiAccount]
 
     def get(self, request):
+        """Newest-first detection history, one page at a time (?cursor=&limit=)"""
         try:
             user_id = request.user.id  # F1, C1, M1, etc.
-            user_email = request.user.email
-            
-            print(f"🔍 Fetching detection history for user_id: {user_id}, email: {user_email}")
             
             # Filter by prefix user_id
-            history = PlantDetectionResult.objects.filter(user_id=user_id).order_by('-created_at')
+            history = PlantDetectionResult.objects.filter(user_id=user_id)
             
-            print(f"📊 Found {history.count()} detection records for user {user_id}")
+            try:
+                rows, next_cursor = keyset_page(
+                    history,
+                    cursor=request.GET.get('cursor'),
+                    limit=parse_limit(request.GET.get('limit'))
+                )
+            except InvalidCursor:
+                return Response({'detail': 'Invalid cursor'}, status=400)
             
-            for item in history:
-                print(f"📄 Detection {item.id}: user_id={item.user_id}, prediction={item.prediction}")
+            logger.debug("History page for user %s: %s records", user_id, len(rows))
             
-            serializer = PlantDetectionResultSerializer(history, many=True)
-            return Response(serializer.data)
+            serializer = PlantDetectionHistorySerializer(rows, many=True, context={'request': request})
+            return Response({
+                'results': serializer.data,
+                'next_cursor': next_cursor
+            })
             
         except Exception as e:
-            print(f"❌ History fetch error: {str(e)}")
+            logger.exception("History fetch error")
             return Response({'detail': f'Failed to fetch history: {str(e)}'}, status=400)
 
     def delete(self, request, detection_id=None):
@@ -127,16 +317,16 @@ class DetectionHistoryView(APIView):
                 # Delete specific detection - filter by prefix user_id
                 detection = get_object_or_404(PlantDetectionResult, id=detection_id, user_id=user_id)
                 detection.delete()
-                print(f"✅ Deleted detection {detection_id} for user {user_id}")
+                logger.debug("Deleted detection %s for user %s", detection_id, user_id)
                 return Response({'detail': 'Detection deleted successfully'})
             else:
                 # Delete all user's history - filter by prefix user_id
                 count, _ = PlantDetectionResult.objects.filter(user_id=user_id).delete()
-                print(f"✅ Deleted all {count} detections for user {user_id}")
+                logger.debug("Deleted all %s detections for user %s", count, user_id)
                 return Response({'detail': f'All {count} detections deleted successfully'})
                 
         except Exception as e:
-            print(f"❌ Delete error: {str(e)}")
+            logger.exception("Delete error")
             return Response({'detail': f'Failed to delete: {str(e)}'}, status=400)
 
 
@@ -152,16 +342,16 @@ class DeleteDetectionView(APIView):
                 # Delete specific detection
                 detection = get_object_or_404(PlantDetectionResult, id=detection_id, user_id=user_id)
                 detection.delete()
-                print(f"✅ Deleted detection {detection_id} for user {user_id}")
+                logger.debug("Deleted detection %s for user %s", detection_id, user_id)
                 return Response({'detail': 'Detection deleted successfully'})
             else:
                 # Delete all detections for user
                 count, _ = PlantDetectionResult.objects.filter(user_id=user_id).delete()
-                print(f"✅ Deleted all {count} detections for user {user_id}")
+                logger.debug("Deleted all %s detections for user %s", count, user_id)
                 return Response({'detail': f'All {count} detections deleted successfully'})
                 
         except Exception as e:
-            print(f"❌ Error deleting detection: {str(e)}")
+            logger.exception("Error deleting detection")
             return Response({'detail': f'Failed to delete detection: {str(e)}'}, status=400)
 
 
@@ -174,7 +364,7 @@ class TestAuthView(APIView):
         user_email = request.user.email
         user_role = getattr(request.user, 'role', 'No role')
         
-        print(f"🔐 Test Auth - User ID: {user_id}, Email: {user_email}, Role: {user_role}")
+        logger.debug("Test Auth - User ID: %s, Role: %s", user_id, user_role)
         
         return Response({
             'message': 'Authentication successful',
@@ -185,3 +375,33 @@ class TestAuthView(APIView):
             'has_farmer': getattr(request.user, 'has_farmer', False),
             'has_customer': getattr(request.user, 'has_customer', False)
         })
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class InferenceStatsView(APIView):
+    permission_classes = [IsAuthenticatedWithJWT, IsFarmerOrMultiAccount]
+
+    def get(self, request):
+        """Inference batcher, prediction cache, image storage and stage timing statistics for tuning"""
+        # Read without constructing the detector: a monitoring request must not load the model
+        return Response({
+            'status': PlantDiseaseDetector.health()['status'],
+            'backend': PlantDiseaseDetector.backend_name(),
+            'batching': PlantDiseaseDetector.batching_stats(),
+            'cache': PlantDiseaseDetector.cache_stats(),
+            'storage': storage_stats(),
+            'stages': {stage: timing for (stage,), timing in STAGE_SECONDS.summary().items()}
+        })
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class DetectionHealthView(APIView):
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        """Readiness probe: 503 while the model is loading or if it failed to load"""
+        health = PlantDiseaseDetector.health()
+        # 'not_loaded' is healthy: without warmup the model loads on first use
+        ready = health['status'] in ('ready', 'not_loaded', 'disabled')
+        return Response(health, status=200 if ready else 503)
@@ -4,3 +4,17 @@ from django.apps import AppConfig
 class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'users'
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_save
+        from .auth_cache import account_changed
+        from .identity import account_created, account_deleted
+        from .models import Farmer, Customer, MultiAccount
+
+        for model in (Farmer, Customer, MultiAccount):
+            # Keep the email -> accounts index in step with the account tables
+            post_save.connect(account_created, sender=model, dispatch_uid=f'identity_{model.__name__}_save')
+            post_delete.connect(account_deleted, sender=model, dispatch_uid=f'identity_{model.__name__}_delete')
+            # Cached JWT identities must not outlive a change to the account rows
+            post_save.connect(account_changed, sender=model, dispatch_uid=f'auth_cache_{model.__name__}_save')
+            post_delete.connect(account_changed, sender=model, dispatch_uid=f'auth_cache_{model.__name__}_delete')
@@ -0,0 +1,100 @@
+# users/async_views.py
+"""
+Async login and registration, served instead of the DRF views when
+AUTH_ASYNC_VIEWS is on (run under ASGI, e.g. uvicorn auth.asgi:application).
+
+While a password hash runs on the hash pool the event loop keeps serving
+other requests, so a login burst costs pool threads rather than one worker
+thread per request. Request and response bodies match LoginView and
+RegisterView.
+"""
+import json
+import logging
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+
+from .hashing import HashingOverloaded, ahash_password, averify_password
+from .identity import aresolve_identity
+from .views import (
+    HASHING_OVERLOADED_DETAIL, create_registration, login_candidates, login_response_data,
+    registration_conflict, validate_registration,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def request_data(request):
+    """JSON or form body as a dict (what DRF's request.data gives the sync views)"""
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            return None
+        return data if isinstance(data, dict) else None
+    return request.POST
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncLoginView(View):
+
+    async def post(self, request):
+        data = request_data(request)
+        if data is None:
+            return JsonResponse({'detail': 'Malformed request body.'}, status=400)
+        try:
+            email = data.get('email', '').strip().lower()
+            password = data.get('password', '')
+
+            if not email or not password:
+                return JsonResponse({'detail': 'Email and password required.'}, status=400)
+
+            identity = await aresolve_identity(email)
+            if identity is None:
+                logger.warning("Invalid credentials: no account for this email")
+                return JsonResponse({'detail': 'Invalid credentials.'}, status=400)
+
+            for account, role in login_candidates(identity):
+                if await averify_password(account, password):
+                    # Issuing the refresh token writes to the database
+                    body = await sync_to_async(login_response_data)(identity, account, role, email)
+                    return JsonResponse(body)
+
+            logger.warning("Invalid credentials for both farmer and customer")
+            return JsonResponse({'detail': 'Invalid credentials.'}, status=400)
+
+        except HashingOverloaded:
+            return JsonResponse({'detail': HASHING_OVERLOADED_DETAIL}, status=503)
+        except Exception as e:
+            logger.exception("Login failed")
+            return JsonResponse({'detail': f'Login failed: {str(e)}'}, status=400)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncRegisterView(View):
+
+    async def post(self, request):
+        data = request_data(request)
+        if data is None:
+            return JsonResponse({'detail': 'Malformed request body.'}, status=400)
+        try:
+            fields, error = validate_registration(data)
+            if error:
+                return JsonResponse({'detail': error}, status=400)
+
+            identity, error = await sync_to_async(registration_conflict)(fields)
+            if error:
+                return JsonResponse({'detail': error}, status=400)
+
+            password_hash = await ahash_password(fields['password'])
+            # Serializer validation and the account transaction stay synchronous
+            body, status = await sync_to_async(create_registration)(fields, identity, password_hash)
+            return JsonResponse(body, status=status)
+
+        except HashingOverloaded:
+            return JsonResponse({'detail': HASHING_OVERLOADED_DETAIL}, status=503)
+        except Exception as e:
+            return JsonResponse({'detail': f'Registration failed: {str(e)}'}, status=400)
@@ -0,0 +1,187 @@
+# users/auth_cache.py
+"""
+Verified-token cache for JWTAuthentication.
+
+A token that has already been verified maps to the identity it resolved to:
+the account row (plus the linked farmer and customer rows for a
+MultiAccount) as plain field values. A hit skips the JWT decode and every
+identity query, and builds fresh model instances for the request, so views
+never share or mutate cached objects.
+
+The cache is per process. Entries expire after AUTH_IDENTITY_CACHE_TTL
+seconds (or at the token's own expiry, if sooner); saves and deletes of
+Farmer, Customer and MultiAccount rows, logout and account switches drop
+them immediately in the process that handles them.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from auth.metrics import counter
+from .models import Farmer, Customer, MultiAccount
+
+LOOKUPS = counter(
+    'auth_identity_cache_lookups_total',
+    'JWT identity cache lookups by result',
+    ['result'],
+)
+INVALIDATIONS = counter(
+    'auth_identity_cache_invalidations_total',
+    'JWT identity cache entries dropped by reason',
+    ['reason'],
+)
+
+ACCOUNT_MODELS = {model.__name__: model for model in (Farmer, Customer, MultiAccount)}
+
+
+def _row(instance):
+    return {field.attname: getattr(instance, field.attname) for field in instance._meta.concrete_fields}
+
+
+def _instance(model, row):
+    instance = model(**row)
+    instance._state.adding = False
+    instance._state.db = 'default'
+    return instance
+
+
+def identity_from_user(user):
+    """Plain-data snapshot of an account, including a MultiAccount's linked rows"""
+    identity = {'model': type(user).__name__, 'row': _row(user)}
+    if isinstance(user, MultiAccount):
+        identity['farmer'] = _row(user.farmer)
+        identity['customer'] = _row(user.customer)
+    return identity
+
+
+def user_from_identity(identity):
+    """Fresh model instance(s) rebuilt from a snapshot, marked as loaded from the database"""
+    model = ACCOUNT_MODELS[identity['model']]
+    user = _instance(model, identity['row'])
+    if model is MultiAccount:
+        # Assigning through the descriptors fills the relation cache: no query for .farmer/.customer
+        user.farmer = _instance(Farmer, identity['farmer'])
+        user.customer = _instance(Customer, identity['customer'])
+    return user
+
+
+def account_ids(identity):
+    ids = {identity['row']['id']}
+    for linked in ('farmer', 'customer'):
+        if linked in identity:
+            ids.add(identity[linked]['id'])
+    return ids
+
+
+class IdentityCache:
+    """Bounded LRU of token -> (expires_at, payload, identity) with per-account invalidation"""
+
+    def __init__(self, max_entries=10000, ttl=60):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = float(ttl)
+        self._entries = OrderedDict()
+        self._tokens_by_account = {}
+        self._lock = threading.Lock()
+
+    def get(self, token):
+        """(payload, identity) for a cached token, or None"""
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                LOOKUPS.inc('miss')
+                return None
+            expires_at, payload, identity = entry
+            if expires_at <= time.time():
+                self._drop(token)
+                LOOKUPS.inc('expired')
+                return None
+            self._entries.move_to_end(token)
+        LOOKUPS.inc('hit')
+        return payload, identity
+
+    def set(self, token, payload, identity):
+        expires_at = time.time() + self.ttl
+        if 'exp' in payload:
+            expires_at = min(expires_at, float(payload['exp']))
+        with self._lock:
+            self._drop(token)
+            self._entries[token] = (expires_at, payload, identity)
+            for account_id in account_ids(identity):
+                self._tokens_by_account.setdefault(account_id, set()).add(token)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def _drop(self, token):
+        entry = self._entries.pop(token, None)
+        if entry is None:
+            return False
+        for account_id in account_ids(entry[2]):
+            tokens = self._tokens_by_account.get(account_id)
+            if tokens is not None:
+                tokens.discard(token)
+                if not tokens:
+                    del self._tokens_by_account[account_id]
+        return True
+
+    def invalidate_token(self, token, reason='logout'):
+        with self._lock:
+            dropped = self._drop(token)
+        if dropped:
+            INVALIDATIONS.inc(reason)
+
+    def invalidate_accounts(self, *ids, reason='account_changed'):
+        """Drop every token that resolved to (or is linked to) one of these account ids"""
+        with self._lock:
+            tokens = set()
+            for account_id in ids:
+                tokens |= self._tokens_by_account.get(account_id, set())
+            for token in tokens:
+                self._drop(token)
+        if tokens:
+            INVALIDATIONS.inc(reason, amount=len(tokens))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tokens_by_account.clear()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def identity_cache():
+    """The process-wide cache, or None when AUTH_IDENTITY_CACHE is off"""
+    global _cache
+    if not getattr(settings, 'AUTH_IDENTITY_CACHE', True):
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = IdentityCache(
+                    max_entries=getattr(settings, 'AUTH_IDENTITY_CACHE_SIZE', 10000),
+                    ttl=getattr(settings, 'AUTH_IDENTITY_CACHE_TTL', 60),
+                )
+    return _cache
+
+
+def invalidate_token(token, reason='logout'):
+    cache = identity_cache()
+    if cache is not None and token:
+        cache.invalidate_token(token, reason)
+
+
+def invalidate_accounts(*ids, reason='account_changed'):
+    cache = identity_cache()
+    if cache is not None:
+        cache.invalidate_accounts(*ids, reason=reason)
+
+
+def account_changed(sender, instance, **kwargs):
+    """post_save/post_delete receiver for Farmer, Customer and MultiAccount (see UsersConfig.ready)"""
+    ids = [instance.pk]
+    if isinstance(instance, MultiAccount):
+        ids += [instance.farmer_id, instance.customer_id]
+    invalidate_accounts(*ids)
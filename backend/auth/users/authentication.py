@@ -1,12 +1,14 @@
 # users/authentication.py
+import logging
+
 import jwt
-from django.conf import settings
 from rest_framework import authentication
 from rest_framework.exceptions import AuthenticationFailed
+from .auth_cache import identity_cache, identity_from_user, user_from_identity
 from .models import Farmer, Customer, MultiAccount
+from .tokens import JWT_ALGORITHM, JWT_SECRET, is_revoked
 
-JWT_SECRET = settings.SECRET_KEY
-JWT_ALGORITHM = 'HS256'
+logger = logging.getLogger(__name__)
 
 
 class JWTAuthentication(authentication.BaseAuthentication):
@@ -18,34 +20,63 @@ class JWTAuthentication(authentication.BaseAuthentication):
             
         token = auth_header.split(' ')[1]
         
+        cache = identity_cache()
+        cached = cache.get(token) if cache is not None else None
+        if cached is not None:
+            payload, identity = cached
+            # Checked on every request: a logout elsewhere must win over the cache
+            self._check_revoked(payload)
+            user = user_from_identity(identity)
+        else:
+            payload, user = self._verify(token)
+            if cache is not None:
+                cache.set(token, payload, identity_from_user(user))
+
+        user_role = payload.get('role', '')
+
+        # Add role information
+        user.role = user_role
+        user.has_farmer = payload.get('has_farmer', False)
+        user.has_customer = payload.get('has_customer', False)
+        
+        logger.debug("Authenticated %s %s as role %s", type(user).__name__, user.id, user_role)
+        
+        return (user, token)
+
+    def authenticate_header(self, request):
+        # Makes DRF answer failed authentication with 401 (not 403), which is what tells the client to refresh
+        return 'Bearer'
+
+    def _check_revoked(self, payload):
+        # Tokens minted before access tokens carried a jti cannot be revoked: make them sign in again
+        if 'jti' not in payload:
+            raise AuthenticationFailed('Invalid token')
+        if is_revoked(payload['jti']):
+            raise AuthenticationFailed('Token revoked')
+
+    def _verify(self, token):
+        """Decode the token and load the account it names; raises AuthenticationFailed"""
         try:
             payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
         except jwt.ExpiredSignatureError:
             raise AuthenticationFailed('Token expired')
         except jwt.InvalidTokenError:
             raise AuthenticationFailed('Invalid token')
+        self._check_revoked(payload)
         
         user_id = payload['id']  # This will be F1, C1, M1, etc.
         user_email = payload['email']
         user_role = payload.get('role', '')
-        
-        print(f"🔐 Authentication - User ID: {user_id}, Email: {user_email}, Role: {user_role}")
 
         # Find user based on prefix
         user = None
         
         if user_id.startswith('F'):
             user = Farmer.objects.filter(id=user_id).first()
-            if user:
-                print(f"✅ Authenticated as Farmer: {user.email}")
         elif user_id.startswith('C'):
             user = Customer.objects.filter(id=user_id).first()
-            if user:
-                print(f"✅ Authenticated as Customer: {user.email}")
         elif user_id.startswith('M'):
             user = MultiAccount.objects.filter(id=user_id).first()
-            if user:
-                print(f"✅ Authenticated as MultiAccount: {user.email}")
         else:
             # Fallback for any unexpected IDs
             user = Farmer.objects.filter(id=user_id).first()
@@ -55,19 +86,12 @@ class JWTAuthentication(authentication.BaseAuthentication):
                 user = MultiAccount.objects.filter(id=user_id).first()
 
         if not user:
-            print(f"❌ User not found - ID: {user_id}, Email: {user_email}, Role: {user_role}")
+            logger.warning("Authentication failed, user not found: id=%s role=%s", user_id, user_role)
             raise AuthenticationFailed('User not found')
         
         # Verify email matches
         if hasattr(user, 'email') and user.email != user_email:
-            print(f"❌ Email mismatch - JWT: {user_email}, User: {user.email}")
+            logger.warning("Authentication failed, email mismatch for user %s", user_id)
             raise AuthenticationFailed('User data mismatch')
-        
-        # Add role information
-        user.role = user_role
-        user.has_farmer = payload.get('has_farmer', False)
-        user.has_customer = payload.get('has_customer', False)
-        
-        print(f"🎯 Final user object - Type: {type(user).__name__}, Role: {user.role}")
-        
-        return (user, token)
\ No newline at end of file
+
+        return payload, user
\ No newline at end of file
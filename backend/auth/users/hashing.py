@@ -0,0 +1,140 @@
+# users/hashing.py
+"""
+Password hashing on a bounded, process-wide thread pool.
+
+PBKDF2 costs tens of milliseconds of CPU per call by design, and a login
+burst used to run one hash per request thread at once. Hashes now run on
+PASSWORD_HASH_WORKERS threads (hashlib releases the GIL, so they use that
+many cores) with at most PASSWORD_HASH_MAX_PENDING calls running or queued;
+beyond that the caller gets HashingOverloaded, and the views answer 503
+instead of letting the queue grow without bound.
+
+Sync views block on the result, so the pool caps CPU use but does not free
+the worker; the async views in users/async_views.py await it and keep the
+event loop serving other requests meanwhile.
+"""
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+from auth.metrics import counter, gauge, histogram
+
+HASH_SECONDS = histogram(
+    'auth_password_hash_seconds',
+    'Time spent computing password hashes',
+    ['op'],
+)
+HASH_WAIT_SECONDS = histogram(
+    'auth_password_hash_wait_seconds',
+    'Time password hashes spent queued for a pool thread',
+    ['op'],
+)
+HASH_PENDING = gauge(
+    'auth_password_hash_pending',
+    'Password hashes running or queued',
+)
+HASH_REJECTED = counter(
+    'auth_password_hash_rejected_total',
+    'Password hashes refused because the pool queue was full',
+    ['op'],
+)
+
+
+class HashingOverloaded(Exception):
+    """Raised when PASSWORD_HASH_MAX_PENDING hashes are already running or queued"""
+
+
+class HashPool:
+
+    def __init__(self, workers, max_pending):
+        self.workers = max(0, int(workers))
+        self.max_pending = max(1, int(max_pending))
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                # A pool created before fork has no threads in the child
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hash')
+                self._pid = os.getpid()
+            return self._executor
+
+    def submit(self, op, func, *args):
+        """Queue ``func(*args)``; returns a concurrent.futures.Future"""
+        if not self._slots.acquire(blocking=False):
+            HASH_REJECTED.inc(op)
+            raise HashingOverloaded()
+        HASH_PENDING.inc()
+        queued_at = time.perf_counter()
+
+        def run():
+            HASH_WAIT_SECONDS.observe(time.perf_counter() - queued_at, op)
+            with HASH_SECONDS.time(op):
+                return func(*args)
+
+        def release(future):
+            self._slots.release()
+            HASH_PENDING.dec()
+
+        try:
+            future = self._get_executor().submit(run)
+        except BaseException:
+            release(None)
+            raise
+        future.add_done_callback(release)
+        return future
+
+    def run(self, op, func, *args):
+        if self.workers == 0:
+            # Pool disabled: hash inline on the calling thread
+            with HASH_SECONDS.time(op):
+                return func(*args)
+        return self.submit(op, func, *args).result()
+
+    async def arun(self, op, func, *args):
+        if self.workers == 0:
+            with HASH_SECONDS.time(op):
+                return func(*args)
+        return await asyncio.wrap_future(self.submit(op, func, *args))
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def hash_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = HashPool(
+                    workers=getattr(settings, 'PASSWORD_HASH_WORKERS', os.cpu_count() or 1),
+                    max_pending=getattr(settings, 'PASSWORD_HASH_MAX_PENDING', 64),
+                )
+    return _pool
+
+
+def verify_password(account, raw_password):
+    """account.check_password() on the hash pool"""
+    return hash_pool().run('check', hashers.check_password, raw_password, account.password)
+
+
+def hash_password(raw_password):
+    """make_password() on the hash pool"""
+    return hash_pool().run('make', hashers.make_password, raw_password)
+
+
+async def averify_password(account, raw_password):
+    return await hash_pool().arun('check', hashers.check_password, raw_password, account.password)
+
+
+async def ahash_password(raw_password):
+    return await hash_pool().arun('make', hashers.make_password, raw_password)
@@ -0,0 +1,55 @@
+# users/identity.py
+"""
+Maintenance of the Identity index (users.models.Identity).
+
+Farmer, Customer and MultiAccount rows register themselves in the index
+from post_save when they are created, inside the same transaction as the
+insert, and drop out of it from post_delete. The views then answer "which
+accounts does this email have" with one lookup instead of probing all
+three tables.
+"""
+from django.db import transaction
+
+from .models import Farmer, Customer, MultiAccount, Identity, normalize_email
+
+ACCOUNT_FIELDS = {Farmer: 'farmer_id', Customer: 'customer_id', MultiAccount: 'multi_account_id'}
+
+
+def resolve_identity(email):
+    """The Identity for ``email`` with its accounts joined in (one query), or None"""
+    return Identity.objects.select_related('farmer', 'customer', 'multi_account').filter(
+        email=normalize_email(email)
+    ).first()
+
+
+async def aresolve_identity(email):
+    """resolve_identity() for async views"""
+    return await Identity.objects.select_related('farmer', 'customer', 'multi_account').filter(
+        email=normalize_email(email)
+    ).afirst()
+
+
+def link_account(account):
+    """Record ``account`` (a Farmer, Customer or MultiAccount) in its email's Identity row"""
+    with transaction.atomic():
+        identity, _ = Identity.objects.select_for_update().get_or_create(email=normalize_email(account.email))
+        setattr(identity, ACCOUNT_FIELDS[type(account)], account.pk)
+        identity.save()
+    return identity
+
+
+def account_created(sender, instance, created, **kwargs):
+    """post_save receiver (see UsersConfig.ready); account emails never change after creation"""
+    if created:
+        link_account(instance)
+
+
+def account_deleted(sender, instance, **kwargs):
+    """post_delete receiver: the OneToOne is already SET_NULL, so refresh the flags or drop the row"""
+    identity = Identity.objects.filter(email=normalize_email(instance.email)).first()
+    if identity is None:
+        return
+    if identity.farmer_id is None and identity.customer_id is None and identity.multi_account_id is None:
+        identity.delete()
+    else:
+        identity.save()
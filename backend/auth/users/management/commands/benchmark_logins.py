@@ -0,0 +1,133 @@
+# users/management/commands/benchmark_logins.py
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import RequestFactory
+
+from users import hashing
+from users.async_views import AsyncLoginView
+from users.models import Customer
+from users.views import LoginView
+
+MODES = ('inline', 'pool', 'async')
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure logins/s through the login views: 'inline' hashes on each request thread "
+        "(the old behaviour), 'pool' uses the bounded hash pool from sync views, 'async' the async view"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+        parser.add_argument('--logins', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=16, help='Request threads (sync) or tasks (async)')
+        parser.add_argument('--hash-workers', type=int, default=None,
+                            help='Hash pool threads (default PASSWORD_HASH_WORKERS)')
+        parser.add_argument('--accounts', type=int, default=20)
+
+    def handle(self, *args, **options):
+        run = uuid.uuid4().hex[:8]
+        password = uuid.uuid4().hex
+        # One hash shared by every test account: setup should not take longer than the benchmark
+        password_hash = make_password(password)
+        emails = []
+        for n in range(options['accounts']):
+            email = f'bench-{run}-{n}@example.invalid'
+            Customer(email=email, name='Benchmark', password=password_hash).save()
+            emails.append(email)
+
+        cores = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else (os.cpu_count() or 1)
+        workers = options['hash_workers'] or hashing.hash_pool().workers or 1
+        self.stdout.write(f"{options['logins']} logins, concurrency {options['concurrency']}, "
+                          f"{cores} cores available, hash pool {workers} threads")
+        self.stdout.write(f"{'mode':<8}{'logins/s':>10}{'per CPU-s':>11}{'p50 ms':>9}{'p99 ms':>9}{'failed':>8}")
+
+        factory = RequestFactory()
+
+        def login_request(index):
+            body = json.dumps({'email': emails[index % len(emails)], 'password': password})
+            return factory.post('/api/login', data=body, content_type='application/json')
+
+        try:
+            for mode in options['modes']:
+                hashing._pool = hashing.HashPool(
+                    workers=0 if mode == 'inline' else workers,
+                    max_pending=options['concurrency'] * 2,
+                )
+                if mode == 'async':
+                    result = self._run_async(login_request, options)
+                else:
+                    result = self._run_threads(login_request, options)
+                self._report(mode, result, options['logins'])
+        finally:
+            hashing._pool = None
+            Customer.objects.filter(email__startswith=f'bench-{run}-').delete()
+
+    def _run_threads(self, login_request, options):
+        view = LoginView.as_view()
+        latencies = []
+        failures = [0]
+        lock = threading.Lock()
+        counter = iter(range(options['logins']))
+
+        def worker():
+            try:
+                while True:
+                    with lock:
+                        index = next(counter, None)
+                    if index is None:
+                        return
+                    started = time.perf_counter()
+                    response = view(login_request(index))
+                    elapsed = time.perf_counter() - started
+                    with lock:
+                        latencies.append(elapsed)
+                        failures[0] += response.status_code != 200
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(options['concurrency'])]
+        wall, cpu = time.perf_counter(), time.process_time()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - wall, time.process_time() - cpu, latencies, failures[0]
+
+    def _run_async(self, login_request, options):
+        view = AsyncLoginView.as_view()
+
+        async def run():
+            semaphore = asyncio.Semaphore(options['concurrency'])
+            latencies = []
+
+            async def one(index):
+                async with semaphore:
+                    started = time.perf_counter()
+                    response = await view(login_request(index))
+                    latencies.append(time.perf_counter() - started)
+                    return response.status_code != 200
+
+            failures = sum(await asyncio.gather(*(one(i) for i in range(options['logins']))))
+            return latencies, failures
+
+        wall, cpu = time.perf_counter(), time.process_time()
+        latencies, failures = asyncio.run(run())
+        return time.perf_counter() - wall, time.process_time() - cpu, latencies, failures
+
+    def _report(self, mode, result, logins):
+        wall, cpu, latencies, failures = result
+        latencies.sort()
+        p50 = latencies[len(latencies) // 2] * 1000 if latencies else 0.0
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000 if latencies else 0.0
+        self.stdout.write(
+            f"{mode:<8}{logins / wall:>10.1f}{logins / cpu if cpu else 0.0:>11.1f}{p50:>9.1f}{p99:>9.1f}{failures:>8}"
+        )
@@ -0,0 +1,12 @@
+# users/management/commands/purge_tokens.py
+from django.core.management.base import BaseCommand
+
+from users.tokens import purge_expired_tokens
+
+
+class Command(BaseCommand):
+    help = "Delete expired access token revocations and refresh tokens (run periodically, e.g. daily from cron)"
+
+    def handle(self, *args, **options):
+        revoked, refresh = purge_expired_tokens()
+        self.stdout.write(f"Deleted {revoked} expired revocations and {refresh} expired refresh tokens")
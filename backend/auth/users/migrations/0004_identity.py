@@ -0,0 +1,47 @@
+# Generated by Django 5.1.2 on 2026-10-17 18:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_identity_index(apps, schema_editor):
+    Identity = apps.get_model('users', 'Identity')
+    identities = {}
+    for model_name, field in (('Farmer', 'farmer_id'), ('Customer', 'customer_id'), ('MultiAccount', 'multi_account_id')):
+        for account_id, email in apps.get_model('users', model_name).objects.values_list('id', 'email'):
+            identities.setdefault(email.strip().lower(), {})[field] = account_id
+
+    Identity.objects.bulk_create(
+        [
+            Identity(
+                email=email,
+                has_farmer=bool(ids.get('farmer_id') or ids.get('multi_account_id')),
+                has_customer=bool(ids.get('customer_id') or ids.get('multi_account_id')),
+                **ids
+            )
+            for email, ids in identities.items()
+        ],
+        batch_size=500,
+    )
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_alter_customer_id_alter_farmer_id_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Identity',
+            fields=[
+                ('email', models.EmailField(max_length=254, primary_key=True, serialize=False)),
+                ('has_farmer', models.BooleanField(default=False)),
+                ('has_customer', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('customer', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='identity', to='users.customer')),
+                ('farmer', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='identity', to='users.farmer')),
+                ('multi_account', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='identity', to='users.multiaccount')),
+            ],
+        ),
+        migrations.RunPython(build_identity_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.2 on 2026-10-17 18:45
+
+from django.db import migrations, models
+
+
+def seed_id_sequences(apps, schema_editor):
+    # Move each counter past the highest existing number of its prefix
+    # (numerically, so F10 counts as higher than F9)
+    IdSequence = apps.get_model('users', 'IdSequence')
+    for prefix, model_name in (('F', 'Farmer'), ('C', 'Customer'), ('M', 'MultiAccount')):
+        highest = 0
+        for account_id in apps.get_model('users', model_name).objects.values_list('id', flat=True).iterator():
+            suffix = account_id[len(prefix):]
+            if account_id.startswith(prefix) and suffix.isdigit():
+                highest = max(highest, int(suffix))
+        IdSequence.objects.get_or_create(prefix=prefix, defaults={'last_value': highest})
+        IdSequence.objects.filter(prefix=prefix, last_value__lt=highest).update(last_value=highest)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_identity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdSequence',
+            fields=[
+                ('prefix', models.CharField(max_length=4, primary_key=True, serialize=False)),
+                ('last_value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(seed_id_sequences, migrations.RunPython.noop),
+    ]
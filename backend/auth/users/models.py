@@ -3,6 +3,15 @@ from django.db import models
 from django.core.validators import validate_email
 from django.contrib.auth.hashers import make_password, check_password
 
+class IdSequence(models.Model):
+    """Last number handed out for an account id prefix ('F', 'C', 'M'); see users/sequences.py"""
+    prefix = models.CharField(max_length=4, primary_key=True)
+    last_value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"IdSequence: {self.prefix}{self.last_value}"
+
+
 class Farmer(models.Model):
     id = models.CharField(max_length=10, primary_key=True)  # Changed to CharField for F1, F2, etc.
     email = models.EmailField(unique=True, validators=[validate_email])
@@ -34,12 +43,8 @@ class Farmer(models.Model):
     def save(self, *args, **kwargs):
         if not self.id:
             # Auto-generate farmer ID: F1, F2, F3, etc.
-            last_farmer = Farmer.objects.all().order_by('id').last()
-            if last_farmer:
-                last_id = int(last_farmer.id[1:])  # Remove 'F' prefix
-                self.id = f'F{last_id + 1}'
-            else:
-                self.id = 'F1'
+            from .sequences import next_id
+            self.id = next_id('F')
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -76,12 +81,8 @@ class Customer(models.Model):
     def save(self, *args, **kwargs):
         if not self.id:
             # Auto-generate customer ID: C1, C2, C3, etc.
-            last_customer = Customer.objects.all().order_by('id').last()
-            if last_customer:
-                last_id = int(last_customer.id[1:])  # Remove 'C' prefix
-                self.id = f'C{last_id + 1}'
-            else:
-                self.id = 'C1'
+            from .sequences import next_id
+            self.id = next_id('C')
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -109,13 +110,69 @@ class MultiAccount(models.Model):
     def save(self, *args, **kwargs):
         if not self.id:
             # Auto-generate multiaccount ID: M1, M2, M3, etc.
-            last_multi = MultiAccount.objects.all().order_by('id').last()
-            if last_multi:
-                last_id = int(last_multi.id[1:])  # Remove 'M' prefix
-                self.id = f'M{last_id + 1}'
-            else:
-                self.id = 'M1'
+            from .sequences import next_id
+            self.id = next_id('M')
         super().save(*args, **kwargs)
 
     def __str__(self):
         return f"MultiAccount: {self.email} ({self.id})"
+
+
+def normalize_email(email):
+    return (email or '').strip().lower()
+
+
+class Identity(models.Model):
+    """
+    One row per person (normalized email) pointing at their Farmer, Customer
+    and MultiAccount rows, so login and account switching resolve everything
+    with a single primary-key lookup. Kept in sync by the post_save and
+    post_delete receivers in users/identity.py.
+    """
+    email = models.EmailField(primary_key=True)
+    farmer = models.OneToOneField(Farmer, on_delete=models.SET_NULL, null=True, blank=True, related_name='identity')
+    customer = models.OneToOneField(Customer, on_delete=models.SET_NULL, null=True, blank=True, related_name='identity')
+    multi_account = models.OneToOneField(
+        MultiAccount, on_delete=models.SET_NULL, null=True, blank=True, related_name='identity'
+    )
+    has_farmer = models.BooleanField(default=False)
+    has_customer = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def save(self, *args, **kwargs):
+        self.has_farmer = self.farmer_id is not None or self.multi_account_id is not None
+        self.has_customer = self.customer_id is not None or self.multi_account_id is not None
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"Identity: {self.email}"
+
+
+class RefreshToken(models.Model):
+    """
+    Server-side record of a refresh token (only its SHA-256 is stored). Each
+    use rotates it: the row is revoked and a new one issued. See users/tokens.py.
+    """
+    token_hash = models.CharField(max_length=64, unique=True)
+    account_id = models.CharField(max_length=10, db_index=True)
+    email = models.EmailField()
+    role = models.CharField(max_length=10)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+    revoked_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"RefreshToken: {self.account_id} ({self.role})"
+
+
+class RevokedToken(models.Model):
+    """
+    Access token id (the ``jti`` claim) revoked before its expiry. Every
+    process mirrors the unexpired rows in memory (users/tokens.py), reading
+    new ones by ascending primary key.
+    """
+    jti = models.CharField(max_length=32, unique=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"RevokedToken: {self.jti}"
@@ -0,0 +1,110 @@
+# users/sequences.py
+"""
+Allocation of the prefixed account ids (F1, C1, M1, ...).
+
+Each prefix has a counter row in IdSequence that is advanced with a single
+conditional UPDATE, so concurrent sign-ups never compute the same id and no
+table scan is needed. With ID_SEQUENCE_BLOCK_SIZE > 1 a process reserves a
+block of numbers per round trip and hands them out from memory; ids are
+then unique but not dense (an exiting worker leaves the rest of its blocks
+unused).
+"""
+import os
+import threading
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+
+from .models import IdSequence
+
+
+def reserve(prefix, count=1):
+    """Advance the ``prefix`` counter by ``count``; returns the first number of the reserved range"""
+    with transaction.atomic():
+        updated = IdSequence.objects.filter(prefix=prefix).update(last_value=F('last_value') + count)
+        if not updated:
+            # First id for this prefix on a database the seeding migration did not see
+            IdSequence.objects.get_or_create(prefix=prefix, defaults={'last_value': 0})
+            IdSequence.objects.filter(prefix=prefix).update(last_value=F('last_value') + count)
+        # The UPDATE holds the row (SQLite: the database) write lock until commit,
+        # so no other allocator can move the counter between it and this read
+        last_value = IdSequence.objects.filter(prefix=prefix).values_list('last_value', flat=True).get()
+    return last_value - count + 1
+
+
+class BlockAllocator:
+    """Per-process cache of reserved number blocks: a queue of [start, end) ranges per prefix"""
+
+    def __init__(self, block_size):
+        self.block_size = max(1, int(block_size))
+        self._blocks = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def next_value(self, prefix):
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked worker: the parent may hand out the same cached numbers
+                self._blocks.clear()
+                self._pid = os.getpid()
+
+            blocks = self._blocks.setdefault(prefix, [])
+            while blocks:
+                next_value, end = blocks[0]
+                if next_value < end:
+                    blocks[0] = (next_value + 1, end)
+                    return next_value
+                blocks.pop(0)
+
+        # Counter updates run outside the lock: a thread waiting on the counter
+        # row while holding it could block a transaction that already owns the
+        # row and needs a second id (a MultiAccount after its Customer)
+        if self.block_size == 1:
+            return reserve(prefix)
+
+        if connection.in_atomic_block:
+            # A block reserved inside the caller's transaction would be rolled
+            # back with it while still cached here, and handed out again by
+            # another process: take a single number now and reserve the next
+            # block once the transaction has committed
+            transaction.on_commit(lambda: self.refill(prefix), robust=True)
+            return reserve(prefix)
+
+        start = reserve(prefix, self.block_size)
+        self._store(prefix, start + 1, start + self.block_size)
+        return start
+
+    def refill(self, prefix):
+        """Reserve a new block for ``prefix`` if the cached one is used up (outside any transaction)"""
+        with self._lock:
+            cached = any(start < end for start, end in self._blocks.get(prefix, ()))
+        if cached or connection.in_atomic_block:
+            return
+        start = reserve(prefix, self.block_size)
+        self._store(prefix, start, start + self.block_size)
+
+    def _store(self, prefix, start, end):
+        if start < end:
+            with self._lock:
+                # Queued behind any block another thread stored meanwhile, so no number is dropped
+                self._blocks.setdefault(prefix, []).append((start, end))
+
+
+_allocator = None
+_allocator_lock = threading.Lock()
+
+
+def allocator():
+    global _allocator
+    if _allocator is None:
+        with _allocator_lock:
+            if _allocator is None:
+                _allocator = BlockAllocator(getattr(settings, 'ID_SEQUENCE_BLOCK_SIZE', 1))
+    return _allocator
+
+
+def next_id(prefix):
+    """Next unused account id for ``prefix``, e.g. next_id('F') -> 'F12'"""
+    return f"{prefix}{allocator().next_value(prefix)}"
+
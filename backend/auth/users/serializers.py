@@ -17,8 +17,12 @@ class FarmerSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         password = validated_data.pop('password', None)
+        # Views that hashed the password on the hash pool pass save(password_hash=...)
+        password_hash = validated_data.pop('password_hash', None)
         instance = self.Meta.model(**validated_data)
-        if password is not None:
+        if password_hash is not None:
+            instance.password = password_hash
+        elif password is not None:
             instance.set_password(password)
         instance.save()
         return instance
@@ -38,8 +42,12 @@ class CustomerSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         password = validated_data.pop('password', None)
+        # Views that hashed the password on the hash pool pass save(password_hash=...)
+        password_hash = validated_data.pop('password_hash', None)
         instance = self.Meta.model(**validated_data)
-        if password is not None:
+        if password_hash is not None:
+            instance.password = password_hash
+        elif password is not None:
             instance.set_password(password)
         instance.save()
         return instance
\ No newline at end of file
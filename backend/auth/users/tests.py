@@ -1,3 +1,551 @@
-from django.test import TestCase
+import asyncio
+import importlib
+import threading
+import time
+from datetime import timedelta
 
-# Create your tests here.
+import jwt
+from django.apps import apps
+from django.db import OperationalError, connection, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import clear_url_caches, resolve
+from django.utils import timezone
+
+from auth import urls as root_urls
+from . import auth_cache, hashing, sequences, tokens, urls
+from .async_views import AsyncLoginView, AsyncRegisterView
+from .hashing import HashingOverloaded, HashPool
+from .identity import link_account, resolve_identity
+from .models import Customer, Farmer, Identity, IdSequence, MultiAccount, RefreshToken, RevokedToken
+from .views import HASHING_OVERLOADED_DETAIL
+
+
+class IdSequenceConcurrencyTests(TransactionTestCase):
+    """Account ids allocated from many threads at once (users/sequences.py)"""
+    threads = 8
+    per_thread = 25
+
+    def run_threads(self, allocate):
+        """Call ``allocate`` per_thread times on each of ``threads`` threads; returns every value"""
+        values = []
+        errors = []
+        lock = threading.Lock()
+        barrier = threading.Barrier(self.threads)
+
+        def worker():
+            barrier.wait()
+            try:
+                for _ in range(self.per_thread):
+                    value = allocate()
+                    with lock:
+                        values.append(value)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker) for _ in range(self.threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(len(values), self.threads * self.per_thread)
+        return values
+
+    def test_reserved_ranges_tile_the_counter(self):
+        for block_size in (1, 5):
+            with self.subTest(block_size=block_size):
+                prefix = f'R{block_size}'
+                starts = self.run_threads(lambda: sequences.reserve(prefix, block_size))
+                numbers = sorted(start + i for start in starts for i in range(block_size))
+                self.assertEqual(numbers, list(range(1, len(starts) * block_size + 1)))
+                self.assertEqual(IdSequence.objects.get(prefix=prefix).last_value, len(numbers))
+
+    def test_allocated_ids_are_unique_and_contiguous(self):
+        for block_size in (1, 7):
+            with self.subTest(block_size=block_size):
+                prefix = f'B{block_size}'
+                allocator = sequences.BlockAllocator(block_size)
+                ids = self.run_threads(lambda: allocator.next_value(prefix))
+                self.assertEqual(len(set(ids)), len(ids))
+                # Numbers still cached in this process are the only ones not handed out
+                cached = [n for start, end in allocator._blocks.get(prefix, []) for n in range(start, end)]
+                self.assertLess(len(cached), self.threads * block_size)
+                last_value = IdSequence.objects.get(prefix=prefix).last_value
+                self.assertEqual(sorted(ids + cached), list(range(1, last_value + 1)))
+
+    def test_concurrent_registrations_get_distinct_ids(self):
+        for block_size in (1, 7):
+            with self.subTest(block_size=block_size):
+                Customer.objects.all().delete()
+                IdSequence.objects.filter(prefix='C').delete()
+                sequences._allocator = sequences.BlockAllocator(block_size)
+                self.addCleanup(setattr, sequences, '_allocator', None)
+                counter = iter(range(self.threads * self.per_thread))
+                lock = threading.Lock()
+
+                def register():
+                    with lock:
+                        n = next(counter)
+                    for attempt in range(50):
+                        # Unusable password: hashing is not what is under test
+                        customer = Customer(email=f'concurrent-{block_size}-{n}@example.invalid', name='C',
+                                            password='!')
+                        try:
+                            # One transaction, as registration uses: a failed attempt gives its number back
+                            with transaction.atomic():
+                                customer.save()
+                            return customer.id
+                        except OperationalError:
+                            # SQLite refuses a read-to-write lock upgrade instead of waiting; retry like a client
+                            time.sleep(0.005 * (attempt + 1))
+                    raise AssertionError(f"registration {n} kept failing with a database lock")
+
+                ids = self.run_threads(register)
+                self.assertEqual(len(set(ids)), len(ids))
+                self.assertEqual(Customer.objects.count(), len(ids))
+                if block_size == 1:
+                    self.assertEqual(sorted(ids, key=lambda value: int(value[1:])),
+                                     [f'C{n}' for n in range(1, len(ids) + 1)])
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class TokenLifecycleTests(TestCase):
+    """Login, refresh rotation, reuse detection and logout (users/tokens.py)"""
+
+    def setUp(self):
+        # A fresh revocation list per test, so entries never leak between tests
+        tokens._revocations = None
+        self.addCleanup(setattr, tokens, '_revocations', None)
+        self.customer = Customer(email='buyer@example.com', name='Buyer', district='D', state='S')
+        self.customer.set_password('secret123')
+        self.customer.save()
+
+    def login(self):
+        response = self.client.post('/api/login', {'email': 'buyer@example.com', 'password': 'secret123'},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def refresh(self, refresh_token):
+        return self.client.post('/api/token/refresh', {'refresh_token': refresh_token},
+                                content_type='application/json')
+
+    def get_user(self, access_token):
+        return self.client.get('/api/user', HTTP_AUTHORIZATION=f'Bearer {access_token}')
+
+    def test_refresh_rotates_the_pair(self):
+        session = self.login()
+        response = self.refresh(session['refresh_token'])
+        self.assertEqual(response.status_code, 200)
+        rotated = response.json()
+        self.assertNotEqual(rotated['token'], session['token'])
+        self.assertNotEqual(rotated['refresh_token'], session['refresh_token'])
+        self.assertEqual(self.get_user(rotated['token']).status_code, 200)
+        self.assertEqual(self.refresh(rotated['refresh_token']).status_code, 200)
+
+    def test_replayed_refresh_token_is_rejected(self):
+        session = self.login()
+        rotated = self.refresh(session['refresh_token']).json()
+        # Within the grace period only the replay fails (two tabs racing, not theft)
+        self.assertEqual(self.refresh(session['refresh_token']).status_code, 401)
+        self.assertEqual(self.refresh(rotated['refresh_token']).status_code, 200)
+
+    def test_reuse_after_grace_revokes_the_whole_family(self):
+        session = self.login()
+        other_session = self.login()
+        rotated = self.refresh(session['refresh_token']).json()
+        RefreshToken.objects.filter(revoked_at__isnull=False).update(
+            revoked_at=timezone.now() - timedelta(seconds=tokens.REFRESH_REUSE_GRACE + 1)
+        )
+        self.assertEqual(self.refresh(session['refresh_token']).status_code, 401)
+        # Every refresh token of this email is gone, including other devices' sessions
+        self.assertEqual(self.refresh(rotated['refresh_token']).status_code, 401)
+        self.assertEqual(self.refresh(other_session['refresh_token']).status_code, 401)
+        self.assertFalse(RefreshToken.objects.filter(email='buyer@example.com', revoked_at__isnull=True).exists())
+
+    def test_unknown_and_expired_refresh_tokens_are_rejected(self):
+        session = self.login()
+        self.assertEqual(self.refresh('not-a-token').status_code, 401)
+        RefreshToken.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.refresh(session['refresh_token']).status_code, 401)
+
+    def test_access_token_is_rejected_after_logout(self):
+        session = self.login()
+        self.assertEqual(self.get_user(session['token']).status_code, 200)
+        response = self.client.post('/api/logout', {'refresh_token': session['refresh_token']},
+                                    content_type='application/json', HTTP_AUTHORIZATION=f"Bearer {session['token']}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get_user(session['token']).status_code, 401)
+        self.assertEqual(self.refresh(session['refresh_token']).status_code, 401)
+
+    def test_logout_reaches_other_processes(self):
+        session = self.login()
+        self.client.post('/api/logout', {}, content_type='application/json',
+                         HTTP_AUTHORIZATION=f"Bearer {session['token']}")
+        # Another process: its own list, loaded from RevokedToken
+        tokens._revocations = None
+        self.assertEqual(self.get_user(session['token']).status_code, 401)
+
+    def test_access_token_without_jti_is_rejected(self):
+        session = self.login()
+        payload = jwt.decode(session['token'], tokens.JWT_SECRET, algorithms=[tokens.JWT_ALGORITHM])
+        del payload['jti']
+        forged = jwt.encode(payload, tokens.JWT_SECRET, algorithm=tokens.JWT_ALGORITHM)
+        self.assertEqual(self.get_user(forged).status_code, 401)
+
+
+class RevocationListTests(TestCase):
+    """The bloom filter + exact set behind access token revocation"""
+
+    def expiry(self, seconds):
+        return timezone.now() + timedelta(seconds=seconds)
+
+    def test_rebuild_loads_unexpired_rows_only(self):
+        RevokedToken.objects.create(jti='live', expires_at=self.expiry(300))
+        RevokedToken.objects.create(jti='expired', expires_at=self.expiry(-1))
+        revocations = tokens.RevocationList(capacity=100)
+        self.assertTrue(revocations.is_revoked('live'))
+        self.assertFalse(revocations.is_revoked('expired'))
+        self.assertFalse(revocations.is_revoked('never-revoked'))
+        self.assertEqual(len(revocations._exact), 1)
+
+    def test_sync_picks_up_rows_written_by_other_processes(self):
+        revocations = tokens.RevocationList(capacity=100, sync_interval=0)
+        self.assertFalse(revocations.is_revoked('later'))
+        RevokedToken.objects.create(jti='later', expires_at=self.expiry(300))
+        self.assertTrue(revocations.is_revoked('later'))
+
+    def test_rebuild_drops_expired_entries_but_keeps_local_ones(self):
+        revocations = tokens.RevocationList(capacity=100)
+        revocations.maybe_sync()
+        revocations.add('old', self.expiry(-1))
+        revocations.add('local', self.expiry(300))
+        revocations.rebuild()
+        self.assertFalse(revocations.is_revoked('old'))
+        self.assertTrue(revocations.is_revoked('local'))
+
+    def test_bloom_false_positive_falls_through_to_the_exact_set(self):
+        revocations = tokens.RevocationList(capacity=100)
+        revocations.maybe_sync()
+        revocations.add('revoked', self.expiry(300))
+        # Every bit set: the filter now claims every key, so only the exact set can answer
+        revocations._bloom._array = bytearray(b'\xff' * len(revocations._bloom._array))
+        before = tokens.REVOCATION_CHECKS.value('bloom_false_positive')
+        self.assertFalse(revocations.is_revoked('innocent'))
+        self.assertTrue(revocations.is_revoked('revoked'))
+        self.assertEqual(tokens.REVOCATION_CHECKS.value('bloom_false_positive'), before + 1)
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        bloom = tokens.BloomFilter(1000)
+        keys = [tokens._key(n) for n in range(1000)]
+        for key in keys:
+            bloom.add(key)
+        self.assertTrue(all(key in bloom for key in keys))
+        false_positives = sum(tokens._key(f'other-{n}') in bloom for n in range(1000))
+        self.assertLess(false_positives, 50)
+
+
+def account(model, email, **fields):
+    instance = model(email=email, name='Someone', district='D', state='Kerala', **fields)
+    instance.set_password('secret123')
+    instance.save()
+    return instance
+
+
+class IdentityCacheTests(TestCase):
+    """Invalidation of the per-process verified-token cache (users/auth_cache.py)"""
+
+    def setUp(self):
+        tokens._revocations = None
+        auth_cache._cache = None
+        self.addCleanup(setattr, tokens, '_revocations', None)
+        self.addCleanup(setattr, auth_cache, '_cache', None)
+        self.cache = auth_cache.identity_cache()
+
+    def session(self, user, role):
+        session = tokens.issue_tokens(user.id, user.email, role, role != 'customer', role != 'farmer')
+        # The first request verifies the token and caches the identity
+        self.assertEqual(self.get_user(session['token']).status_code, 200)
+        self.assertIsNotNone(self.cache.get(session['token']))
+        return session
+
+    def get_user(self, access_token):
+        return self.client.get('/api/user', HTTP_AUTHORIZATION=f'Bearer {access_token}')
+
+    def update_address(self, access_token, district):
+        return self.client.patch('/api/update-address/', {
+            'street_address': '1 Main Road', 'city': 'Town', 'district': district,
+            'state': 'Kerala', 'pincode': '682001',
+        }, content_type='application/json', HTTP_AUTHORIZATION=f'Bearer {access_token}')
+
+    def cached_district(self, access_token):
+        _, identity = self.cache.get(access_token)
+        return auth_cache.user_from_identity(identity).district
+
+    def test_address_update_evicts_the_cached_account(self):
+        for model, role in ((Customer, 'customer'), (Farmer, 'farmer')):
+            with self.subTest(role=role):
+                session = self.session(account(model, f'{role}@example.com'), role)
+                self.assertEqual(self.update_address(session['token'], 'Ernakulam').status_code, 200)
+                self.assertIsNone(self.cache.get(session['token']))
+                # The next request caches the account as it is now
+                self.assertEqual(self.get_user(session['token']).status_code, 200)
+                self.assertEqual(self.cached_district(session['token']), 'Ernakulam')
+
+    def test_linked_account_change_evicts_the_multiaccount(self):
+        farmer = account(Farmer, 'both@example.com')
+        customer = account(Customer, 'both@example.com')
+        multi = MultiAccount(email='both@example.com', password=farmer.password, farmer=farmer, customer=customer)
+        multi.save()
+        session = self.session(multi, 'multi')
+        Customer.objects.get(pk=customer.pk).save()
+        self.assertIsNone(self.cache.get(session['token']))
+
+    def test_logout_evicts_the_token(self):
+        session = self.session(account(Customer, 'buyer@example.com'), 'customer')
+        other = self.session(Customer.objects.get(email='buyer@example.com'), 'customer')
+        response = self.client.post('/api/logout', {}, content_type='application/json',
+                                    HTTP_AUTHORIZATION=f"Bearer {session['token']}")
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(self.cache.get(session['token']))
+        # Other sessions of the same account keep their entry
+        self.assertIsNotNone(self.cache.get(other['token']))
+        self.assertEqual(self.get_user(session['token']).status_code, 401)
+
+    def test_account_switch_evicts_the_old_token(self):
+        farmer = account(Farmer, 'both@example.com')
+        customer = account(Customer, 'both@example.com')
+        multi = MultiAccount(email='both@example.com', password=farmer.password, farmer=farmer, customer=customer)
+        multi.save()
+        session = self.session(multi, 'multi')
+        response = self.client.post('/api/switch-account/', {'role': 'farmer'}, content_type='application/json',
+                                    HTTP_AUTHORIZATION=f"Bearer {session['token']}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['user_id'], farmer.id)
+        self.assertIsNone(self.cache.get(session['token']))
+        self.assertEqual(self.get_user(session['token']).status_code, 401)
+        self.assertEqual(self.get_user(response.json()['token']).status_code, 200)
+
+    def test_revoked_token_is_rejected_on_a_cache_hit(self):
+        session = self.session(account(Customer, 'buyer@example.com'), 'customer')
+        payload = jwt.decode(session['token'], tokens.JWT_SECRET, algorithms=[tokens.JWT_ALGORITHM])
+        # Logged out through another process: this process's cache still holds the token
+        RevokedToken.objects.create(jti=payload['jti'], expires_at=timezone.now() + timedelta(minutes=5))
+        tokens._revocations = None
+        self.assertIsNotNone(self.cache.get(session['token']))
+        self.assertEqual(self.get_user(session['token']).status_code, 401)
+
+
+
+class IdentityIndexTests(TestCase):
+    """The email -> accounts index kept by users/identity.py"""
+
+    def multi_account(self, farmer, customer):
+        multi = MultiAccount(email=farmer.email, password=farmer.password, farmer=farmer, customer=customer)
+        multi.save()
+        return multi
+
+    def assertIndexed(self, email, farmer=None, customer=None, multi_account=None):
+        identity = resolve_identity(email)
+        self.assertIsNotNone(identity)
+        self.assertEqual(
+            (identity.farmer_id, identity.customer_id, identity.multi_account_id),
+            (getattr(farmer, 'pk', None), getattr(customer, 'pk', None), getattr(multi_account, 'pk', None)),
+        )
+        self.assertEqual(identity.has_farmer, farmer is not None or multi_account is not None)
+        self.assertEqual(identity.has_customer, customer is not None or multi_account is not None)
+
+    def test_each_new_account_is_linked(self):
+        farmer = account(Farmer, 'both@example.com')
+        self.assertIndexed('both@example.com', farmer=farmer)
+        customer = account(Customer, 'both@example.com')
+        self.assertIndexed('both@example.com', farmer=farmer, customer=customer)
+        multi = self.multi_account(farmer, customer)
+        self.assertIndexed('both@example.com', farmer=farmer, customer=customer, multi_account=multi)
+        self.assertEqual(Identity.objects.count(), 1)
+
+    def test_emails_are_normalized(self):
+        farmer = account(Farmer, 'Grower@Example.com')
+        self.assertEqual(Identity.objects.get().email, 'grower@example.com')
+        self.assertIndexed(' GROWER@example.com ', farmer=farmer)
+
+    def test_saving_an_existing_account_does_not_relink(self):
+        farmer = account(Farmer, 'grower@example.com')
+        Identity.objects.all().delete()
+        farmer.save()
+        self.assertIsNone(resolve_identity('grower@example.com'))
+        self.assertEqual(link_account(farmer).farmer_id, farmer.pk)
+        self.assertIndexed('grower@example.com', farmer=farmer)
+
+    def test_deleted_accounts_are_unlinked(self):
+        farmer = account(Farmer, 'both@example.com')
+        customer = account(Customer, 'both@example.com')
+        multi = self.multi_account(farmer, customer)
+        multi.delete()
+        self.assertIndexed('both@example.com', farmer=farmer, customer=customer)
+        customer.delete()
+        self.assertIndexed('both@example.com', farmer=farmer)
+        farmer.delete()
+        self.assertFalse(Identity.objects.exists())
+
+    def test_rolled_back_account_leaves_no_entry(self):
+        with transaction.atomic():
+            account(Farmer, 'grower@example.com')
+            transaction.set_rollback(True)
+        self.assertFalse(Identity.objects.exists())
+
+    @override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+    def test_registering_both_roles_indexes_the_multiaccount(self):
+        for role in ('farmer', 'customer'):
+            response = self.client.post('/api/register', {
+                'email': 'both@example.com', 'password': 'secret123', 'name': 'Both', 'role': role,
+                'district': 'D', 'state': 'Kerala',
+            }, content_type='application/json')
+            self.assertIn(response.status_code, (200, 201), response.content)
+        multi = MultiAccount.objects.get()
+        self.assertIndexed('both@example.com', farmer=multi.farmer, customer=multi.customer, multi_account=multi)
+
+    def test_migration_builds_the_same_index(self):
+        farmer = account(Farmer, 'both@example.com')
+        customer = account(Customer, 'both@example.com')
+        multi = self.multi_account(farmer, customer)
+        only_customer = account(Customer, 'buyer@example.com')
+        expected = list(Identity.objects.order_by('email').values())
+        Identity.objects.all().delete()
+        migration = importlib.import_module('users.migrations.0004_identity')
+        migration.build_identity_index(apps, None)
+        self.assertIndexed('both@example.com', farmer=farmer, customer=customer, multi_account=multi)
+        self.assertIndexed('buyer@example.com', customer=only_customer)
+        fields = ('email', 'farmer_id', 'customer_id', 'multi_account_id', 'has_farmer', 'has_customer')
+        self.assertEqual(
+            list(Identity.objects.order_by('email').values(*fields)),
+            [{field: row[field] for field in fields} for row in expected],
+        )
+
+
+class HashPoolTests(SimpleTestCase):
+    """Bounded password hashing (users/hashing.py)"""
+
+    def blocked_pool(self, max_pending):
+        """A one-thread pool with ``max_pending`` hashes held until the test ends"""
+        pool = HashPool(workers=1, max_pending=max_pending)
+        release = threading.Event()
+        self.addCleanup(release.set)
+        futures = [pool.submit('make', release.wait) for _ in range(max_pending)]
+        return pool, release, futures
+
+    def test_full_queue_is_refused(self):
+        pool, release, futures = self.blocked_pool(2)
+        before = hashing.HASH_REJECTED.value('check')
+        with self.assertRaises(HashingOverloaded):
+            pool.run('check', len, 'password')
+        self.assertEqual(hashing.HASH_REJECTED.value('check'), before + 1)
+        release.set()
+        for future in futures:
+            future.result(timeout=5)
+        # Finished hashes give their slots back
+        self.assertEqual(pool.run('check', len, 'password'), 8)
+
+    def test_failed_hash_releases_its_slot(self):
+        pool = HashPool(workers=1, max_pending=1)
+        for _ in range(3):
+            with self.assertRaises(ZeroDivisionError):
+                pool.run('make', divmod, 1, 0)
+
+    def test_hashes_run_on_the_pool_threads(self):
+        pool = HashPool(workers=2, max_pending=4)
+        self.assertNotEqual(pool.run('make', threading.get_ident), threading.get_ident())
+        self.assertNotEqual(asyncio.run(pool.arun('make', threading.get_ident)), threading.get_ident())
+
+    def test_no_workers_hashes_inline(self):
+        pool = HashPool(workers=0, max_pending=1)
+        self.assertEqual(pool.run('make', threading.get_ident), threading.get_ident())
+        self.assertEqual(asyncio.run(pool.arun('make', threading.get_ident)), threading.get_ident())
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class LoginRegisterViewTests(TestCase):
+    """Login and registration, sync views by default and async ones with AUTH_ASYNC_VIEWS"""
+
+    async_views = False
+
+    def setUp(self):
+        tokens._revocations = None
+        self.addCleanup(setattr, tokens, '_revocations', None)
+        if self.async_views:
+            self.route_async_views()
+        account(Customer, 'buyer@example.com')
+
+    def route_async_views(self):
+        def reload_urls():
+            # The project urlconf holds resolvers built from the old users.urls: reload both
+            importlib.reload(urls)
+            importlib.reload(root_urls)
+            clear_url_caches()
+
+        with self.settings(AUTH_ASYNC_VIEWS=True):
+            reload_urls()
+        self.addCleanup(reload_urls)
+
+    def post(self, path, data):
+        return self.client.post(path, data, content_type='application/json')
+
+    def login(self, password='secret123'):
+        return self.post('/api/login', {'email': 'Buyer@example.com', 'password': password})
+
+    def register(self, role, email='grower@example.com'):
+        return self.post('/api/register', {
+            'email': email, 'password': 'secret123', 'name': 'Grower', 'role': role,
+            'district': 'D', 'state': 'Kerala',
+        })
+
+    def overload_hash_pool(self):
+        pool = HashPool(workers=1, max_pending=1)
+        release = threading.Event()
+        self.addCleanup(release.set)
+        pool.submit('make', release.wait)
+        hashing._pool = pool
+        self.addCleanup(setattr, hashing, '_pool', None)
+
+    def test_login(self):
+        response = self.login()
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual((body['user']['email'], body['user']['role']), ('buyer@example.com', 'customer'))
+        user = self.client.get('/api/user', HTTP_AUTHORIZATION=f"Bearer {body['token']}")
+        self.assertEqual(user.status_code, 200)
+        self.assertEqual(self.login('wrong-password').status_code, 400)
+        self.assertEqual(self.post('/api/login', {'email': 'nobody@example.com', 'password': 'x'}).status_code, 400)
+
+    def test_register(self):
+        response = self.register('farmer')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertTrue(Farmer.objects.filter(email='grower@example.com').exists())
+        self.assertEqual(self.register('farmer').status_code, 400)
+        # The second role merges both accounts into a MultiAccount
+        response = self.register('farmer', email='buyer@example.com')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertTrue(MultiAccount.objects.filter(email='buyer@example.com').exists())
+
+    def test_overloaded_hash_pool_is_503(self):
+        self.overload_hash_pool()
+        for response in (self.login(), self.register('farmer')):
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response.json(), {'detail': HASHING_OVERLOADED_DETAIL})
+        self.assertFalse(Farmer.objects.exists())
+
+
+class AsyncLoginRegisterViewTests(LoginRegisterViewTests):
+    async_views = True
+
+    def test_async_views_are_routed(self):
+        self.assertIs(resolve('/api/login').func.view_class, AsyncLoginView)
+        self.assertIs(resolve('/api/register').func.view_class, AsyncRegisterView)
+
+    def test_malformed_body_is_400(self):
+        for path in ('/api/login', '/api/register'):
+            response = self.client.post(path, '[1, 2', content_type='application/json')
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json(), {'detail': 'Malformed request body.'})
@@ -0,0 +1,329 @@
+# users/tokens.py
+"""
+Access/refresh token pairs and the in-memory revocation list.
+
+Access tokens are JWTs that live ACCESS_TOKEN_TTL seconds and carry a
+``jti``. Checking one needs no database: the signature and expiry are
+verified locally and the jti is looked up in the process's revocation list.
+Refresh tokens are opaque random strings. Only their SHA-256 is stored
+(RefreshToken), and each one can be used once at /api/token/refresh to get
+a new pair.
+
+Logout and account switches write the access token's jti to RevokedToken.
+The process handling the request adds it to its list at once. Every other
+process picks it up on its next sync, at most TOKEN_REVOCATION_SYNC_INTERVAL
+seconds later. A revoked jti is only kept until the token would have expired
+anyway, so the list stays small.
+"""
+import datetime
+import hashlib
+import logging
+import math
+import os
+import secrets
+import threading
+import time
+import uuid
+
+import jwt
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from auth.metrics import counter, gauge
+from .auth_cache import invalidate_token
+from .identity import resolve_identity
+from .models import RefreshToken, RevokedToken
+
+JWT_SECRET = settings.SECRET_KEY
+JWT_ALGORITHM = 'HS256'
+
+# A rotated refresh token presented again this soon is taken for a race
+# between two tabs, not theft, and does not revoke the person's other tokens
+REFRESH_REUSE_GRACE = 30
+
+logger = logging.getLogger(__name__)
+
+REVOCATION_CHECKS = counter(
+    'auth_token_revocation_checks_total',
+    'Access token revocation checks by result',
+    ['result'],
+)
+REVOCATION_SYNCS = counter(
+    'auth_token_revocation_syncs_total',
+    'Revocation list reloads from the database by kind',
+    ['kind'],
+)
+REVOKED_ENTRIES = gauge(
+    'auth_token_revoked_entries',
+    'Unexpired revoked access tokens held in memory',
+)
+REFRESHES = counter(
+    'auth_token_refreshes_total',
+    'Refresh token uses by result',
+    ['result'],
+)
+
+
+class RefreshTokenInvalid(Exception):
+    """The refresh token is unknown, expired, already used or revoked"""
+
+
+def _digest(raw):
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _key(jti):
+    # 16 bytes per entry in the exact set; the same digest seeds the bloom positions
+    return hashlib.blake2b(str(jti).encode(), digest_size=16).digest()
+
+
+def _timestamp(value):
+    if isinstance(value, datetime.datetime):
+        return value.timestamp()
+    return float(value)
+
+
+class BloomFilter:
+    """Fixed-size bit array with ``hashes`` probes per key (double hashing of a 16-byte digest)"""
+
+    def __init__(self, capacity, error_rate=0.01):
+        capacity = max(1, int(capacity))
+        self.bits = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.bits / capacity * math.log(2)))
+        self._array = bytearray((self.bits + 7) // 8)
+
+    def _positions(self, key):
+        h1 = int.from_bytes(key[:8], 'little')
+        h2 = int.from_bytes(key[8:], 'little') | 1
+        return ((h1 + i * h2) % self.bits for i in range(self.hashes))
+
+    def add(self, key):
+        for position in self._positions(key):
+            self._array[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(self._array[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class RevocationList:
+    """
+    Revoked jtis of this process: a bloom filter that answers "not revoked"
+    for almost every token, and an exact set (key -> expiry) that settles
+    the rare positive.
+    """
+
+    def __init__(self, capacity=100000, sync_interval=5, rebuild_interval=300):
+        self.capacity = max(1, int(capacity))
+        self.sync_interval = float(sync_interval)
+        self.rebuild_interval = float(rebuild_interval)
+        self._bloom = BloomFilter(self.capacity)
+        self._exact = {}
+        self._cursor = 0
+        self._synced_at = None
+        self._rebuilt_at = None
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+
+    def is_revoked(self, jti):
+        self.maybe_sync()
+        key = _key(jti)
+        if key not in self._bloom:
+            REVOCATION_CHECKS.inc('clear')
+            return False
+        expires_at = self._exact.get(key)
+        if expires_at is None:
+            REVOCATION_CHECKS.inc('bloom_false_positive')
+            return False
+        REVOCATION_CHECKS.inc('revoked')
+        return True
+
+    def add(self, jti, expires_at):
+        key = _key(jti)
+        with self._lock:
+            self._bloom.add(key)
+            self._exact[key] = _timestamp(expires_at)
+        REVOKED_ENTRIES.set(len(self._exact))
+
+    def maybe_sync(self):
+        now = time.monotonic()
+        if self._synced_at is not None and now - self._synced_at < self.sync_interval and self._pid == os.getpid():
+            return
+        # One thread reloads; the others keep answering from the current list
+        if not self._sync_lock.acquire(blocking=False):
+            return
+        try:
+            if self._rebuilt_at is None or now - self._rebuilt_at >= self.rebuild_interval or self._pid != os.getpid():
+                self.rebuild()
+            else:
+                self.sync()
+        except DatabaseError:
+            logger.warning("Token revocation sync failed; keeping the current list", exc_info=True)
+        finally:
+            self._synced_at = now
+            self._sync_lock.release()
+
+    def sync(self):
+        """Add rows written since the last sync (by any process)"""
+        now = time.time()
+        rows = RevokedToken.objects.filter(pk__gt=self._cursor).order_by('pk').values_list('pk', 'jti', 'expires_at')
+        for pk, jti, expires_at in rows:
+            if _timestamp(expires_at) > now:
+                self.add(jti, expires_at)
+            self._cursor = max(self._cursor, pk)
+        REVOCATION_SYNCS.inc('incremental')
+
+    def rebuild(self):
+        """
+        Reload every unexpired row into a fresh filter, dropping expired
+        entries. Also picks up rows whose transaction committed after a
+        later-numbered one had already been synced past.
+        """
+        cursor = RevokedToken.objects.aggregate(top=Max('pk'))['top'] or 0
+        rows = list(
+            RevokedToken.objects.filter(pk__lte=cursor, expires_at__gt=timezone.now()).values_list('jti', 'expires_at')
+        )
+        bloom = BloomFilter(max(self.capacity, 2 * len(rows)))
+        exact = {}
+        for jti, expires_at in rows:
+            key = _key(jti)
+            bloom.add(key)
+            exact[key] = _timestamp(expires_at)
+        with self._lock:
+            # Keep unexpired entries the query missed, e.g. revoked here while it ran
+            now = time.time()
+            for key, expires_at in self._exact.items():
+                if key not in exact and expires_at > now:
+                    bloom.add(key)
+                    exact[key] = expires_at
+            self._bloom, self._exact = bloom, exact
+            self._cursor = max(self._cursor, cursor)
+        self._rebuilt_at = time.monotonic()
+        self._pid = os.getpid()
+        REVOKED_ENTRIES.set(len(exact))
+        REVOCATION_SYNCS.inc('rebuild')
+
+
+_revocations = None
+_revocations_lock = threading.Lock()
+
+
+def revocation_list():
+    global _revocations
+    if _revocations is None:
+        with _revocations_lock:
+            if _revocations is None:
+                _revocations = RevocationList(
+                    capacity=getattr(settings, 'TOKEN_REVOCATION_CAPACITY', 100000),
+                    sync_interval=getattr(settings, 'TOKEN_REVOCATION_SYNC_INTERVAL', 5),
+                    rebuild_interval=getattr(settings, 'TOKEN_REVOCATION_REBUILD_INTERVAL', 300),
+                )
+    return _revocations
+
+
+def is_revoked(jti):
+    return revocation_list().is_revoked(jti)
+
+
+def access_token(claims):
+    """Signed short-lived JWT for ``claims`` (id, email, role, has_farmer, has_customer)"""
+    now = datetime.datetime.now(datetime.timezone.utc)
+    payload = dict(
+        claims,
+        jti=uuid.uuid4().hex,
+        iat=now,
+        exp=now + datetime.timedelta(seconds=getattr(settings, 'ACCESS_TOKEN_TTL', 300)),
+    )
+    return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
+
+
+def refresh_token(claims):
+    """New opaque refresh token for ``claims``; only its hash is stored"""
+    raw = secrets.token_urlsafe(32)
+    RefreshToken.objects.create(
+        token_hash=_digest(raw),
+        account_id=claims['id'],
+        email=claims['email'],
+        role=claims['role'],
+        expires_at=timezone.now() + datetime.timedelta(seconds=getattr(settings, 'REFRESH_TOKEN_TTL', 14 * 24 * 3600)),
+    )
+    return raw
+
+
+def issue_tokens(account_id, email, role, has_farmer, has_customer):
+    """Response fields for a new session: 'token' (access), 'refresh_token' and 'expires_in'"""
+    claims = {
+        'id': account_id,
+        'email': email,
+        'role': role,
+        'has_farmer': has_farmer,
+        'has_customer': has_customer,
+    }
+    return {
+        'token': access_token(claims),
+        'refresh_token': refresh_token(claims),
+        'expires_in': getattr(settings, 'ACCESS_TOKEN_TTL', 300),
+    }
+
+
+def rotate_refresh_token(raw):
+    """Spend ``raw`` and return issue_tokens() for the same account; raises RefreshTokenInvalid"""
+    now = timezone.now()
+    failure = None
+    with transaction.atomic():
+        record = RefreshToken.objects.select_for_update().filter(token_hash=_digest(raw or '')).first()
+        if record is None:
+            failure = 'invalid'
+        elif record.revoked_at is not None:
+            failure = 'reused'
+            if (now - record.revoked_at).total_seconds() > REFRESH_REUSE_GRACE:
+                # A spent token came back: someone holds a copy. End every session of this person
+                RefreshToken.objects.filter(email=record.email, revoked_at__isnull=True).update(revoked_at=now)
+                logger.warning("Refresh token reused for account %s; revoked every refresh token of its email",
+                               record.account_id)
+        elif record.expires_at <= now:
+            failure = 'expired'
+        else:
+            record.revoked_at = now
+            record.save(update_fields=['revoked_at'])
+            # Flags come from the index, so a refresh also picks up a newly added role
+            identity = resolve_identity(record.email)
+            linked = (identity.farmer_id, identity.customer_id, identity.multi_account_id) if identity else ()
+            if record.account_id not in linked:
+                failure = 'account_gone'
+            else:
+                tokens = issue_tokens(record.account_id, record.email, record.role,
+                                      identity.has_farmer, identity.has_customer)
+    REFRESHES.inc(failure or 'ok')
+    if failure:
+        raise RefreshTokenInvalid(failure)
+    return tokens
+
+
+def revoke_refresh_token(raw):
+    if raw:
+        RefreshToken.objects.filter(token_hash=_digest(raw), revoked_at__isnull=True).update(revoked_at=timezone.now())
+
+
+def revoke_access_token(token, reason='logout'):
+    """Revoke an (already authenticated) access token everywhere and drop its cached identity"""
+    invalidate_token(token, reason)
+    try:
+        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM], options={'verify_exp': False})
+    except jwt.InvalidTokenError:
+        return
+    if 'jti' not in payload or 'exp' not in payload:
+        return
+    expires_at = datetime.datetime.fromtimestamp(payload['exp'], tz=datetime.timezone.utc)
+    RevokedToken.objects.get_or_create(jti=payload['jti'], defaults={'expires_at': expires_at})
+    revocation_list().add(payload['jti'], expires_at)
+
+
+def purge_expired_tokens():
+    """Delete revocations and refresh tokens past their expiry; returns (revoked, refresh) counts"""
+    now = timezone.now()
+    revoked, _ = RevokedToken.objects.filter(expires_at__lte=now).delete()
+    refresh, _ = RefreshToken.objects.filter(expires_at__lte=now).delete()
+    return revoked, refresh
@@ -1,16 +1,21 @@
 # In users/urls.py
+from django.conf import settings
 from django.urls import path
 from .views import (
     RegisterView, LoginView, UserView, LogoutView, 
     SwitchAccountView, AvailableDistrictsView, UpdateAddressView,
-    AutoRegisterView
+    AutoRegisterView, TokenRefreshView
 )
 
+if getattr(settings, 'AUTH_ASYNC_VIEWS', False):
+    from .async_views import AsyncLoginView as LoginView, AsyncRegisterView as RegisterView
+
 urlpatterns = [
     path('register', RegisterView.as_view(), name='register'),
     path('login', LoginView.as_view(), name='login'),
     path('user', UserView.as_view(), name='user-detail'),
     path('logout', LogoutView.as_view(), name='logout'),
+    path('token/refresh', TokenRefreshView.as_view(), name='token-refresh'),
     path('switch-account/', SwitchAccountView.as_view(), name='switch-account'),
     path('available-districts/', AvailableDistrictsView.as_view(), name='available-districts'),
     path('update-address/', UpdateAddressView.as_view(), name='update-address'),
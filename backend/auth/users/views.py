@@ -5,8 +5,13 @@ from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from .serializers import FarmerSerializer, CustomerSerializer
 from .models import Farmer, Customer, MultiAccount
-import jwt, datetime
+from .identity import resolve_identity
+from .hashing import HashingOverloaded, hash_password, verify_password
+from .tokens import RefreshTokenInvalid, issue_tokens, revoke_access_token, revoke_refresh_token, rotate_refresh_token
+import jwt
+import logging
 from django.conf import settings
+from django.db import transaction
 import re
 # In users/views.py - ADD this import at the top
 from .permissions import IsAuthenticatedWithJWT, IsFarmerOrMultiAccount
@@ -16,160 +21,228 @@ from .permissions import IsAuthenticatedWithJWT, IsFarmerOrMultiAccount
 JWT_SECRET = settings.SECRET_KEY
 JWT_ALGORITHM = 'HS256'
 
+logger = logging.getLogger(__name__)
+
 
 # In users/views.py - UPDATE create_multiaccount function
-def create_multiaccount_and_cleanup(email, password, farmer, customer):
-    """Create MultiAccount and clean up individual entries"""
+def create_multiaccount_and_cleanup(email, password_hash, farmer, customer):
+    """Create MultiAccount (with the already computed ``password_hash``) and clean up individual entries"""
     try:
-        print(f"🔄 Creating MultiAccount and cleaning up for: {email}")
+        logger.debug("Creating MultiAccount and cleaning up for: %s", email)
         
-        # Create MultiAccount
-        multi_account = MultiAccount.objects.create(
-            email=email,
-            password=password,
-            farmer=farmer,
-            customer=customer
-        )
-        multi_account.set_password(password)
-        multi_account.save()
+        # Create MultiAccount (in its own savepoint, so a failure leaves the caller's transaction usable)
+        with transaction.atomic():
+            multi_account = MultiAccount(
+                email=email,
+                password=password_hash,
+                farmer=farmer,
+                customer=customer
+            )
+            multi_account.save()
         
-        print(f"✅ MultiAccount created - ID: {multi_account.id}")
+        logger.info("MultiAccount created - ID: %s", multi_account.id)
         
         # Delete individual entries since they're now in MultiAccount
         # But wait - we can't delete them because of OneToOne relationships
         # Instead, we'll keep them but they'll only be accessible via MultiAccount
         
-        print(f"✅ Individual accounts linked to MultiAccount - Farmer ID: {farmer.id}, Customer ID: {customer.id}")
+        logger.debug("Individual accounts linked to MultiAccount - Farmer ID: %s, Customer ID: %s", farmer.id, customer.id)
         
         return multi_account
         
-    except Exception as e:
-        print(f"❌ Error creating MultiAccount: {e}")
+    except Exception:
+        logger.exception("Error creating MultiAccount")
         return None
 
-@method_decorator(csrf_exempt, name='dispatch')
-class RegisterView(APIView):
-    permission_classes = [AllowAny]
-    
-    def post(self, request):
-        try:
-            email = request.data.get('email', '').strip().lower()
-            password = request.data.get('password', '')
-            name = request.data.get('name', '').strip()
-            role = request.data.get('role', '').strip().lower()
-            phone = request.data.get('phone', '').strip()
-            address = request.data.get('address', '').strip()
-            pincode = request.data.get('pincode', '').strip()
+def validate_registration(data):
+    """Cleaned registration fields and an error message (None when valid); no database access"""
+    fields = {
+        'email': data.get('email', '').strip().lower(),
+        'password': data.get('password', ''),
+        'name': data.get('name', '').strip(),
+        'role': data.get('role', '').strip().lower(),
+        'phone': data.get('phone', '').strip(),
+        'street_address': data.get('street_address', '').strip(),
+        'city': data.get('city', '').strip(),
+        'district': data.get('district', '').strip(),
+        'state': data.get('state', '').strip(),
+        'country': data.get('country', 'India').strip(),
+        'pincode': data.get('pincode', '').strip(),
+    }
+
+    # Basic validations
+    if not all([fields['email'], fields['password'], fields['name'], fields['role']]):
+        return fields, 'Email, password, name and role are required.'
+
+    if fields['role'] not in ['farmer', 'customer']:
+        return fields, 'Invalid role.'
+
+    # Email validation
+    if not re.match(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$', fields['email']):
+        return fields, 'Invalid email format.'
+
+    # Password validation
+    if len(fields['password']) < 6:
+        return fields, 'Password must be at least 6 characters.'
+
+    return fields, None
+
+
+def registration_conflict(fields):
+    """The email's Identity (or None) and an error message if it already has the requested role"""
+    # Check if user already has this role - one lookup in the identity index
+    identity = resolve_identity(fields['email'])
+
+    # If user already has MultiAccount, they can't register again
+    if identity and identity.multi_account_id:
+        return identity, 'This email already has both farmer and customer accounts.'
+
+    if fields['role'] == 'farmer' and identity and identity.farmer_id:
+        return identity, 'Email already registered as farmer.'
+    if fields['role'] == 'customer' and identity and identity.customer_id:
+        return identity, 'Email already registered as customer.'
+
+    return identity, None
+
+
+def create_registration(fields, identity, password_hash):
+    """
+    Create the account from validated ``fields`` with an already computed
+    password hash, merging it into a MultiAccount when the email has the
+    other role. Returns (response body, status).
+    """
+    role = fields['role']
+    user_data = {key: value for key, value in fields.items() if key != 'role'}
+    existing_farmer = identity.farmer if identity else None
+    existing_customer = identity.customer if identity else None
+    user_instance = None
+    has_farmer = False
+    has_customer = False
+
+    # The account, its identity index entry and any MultiAccount are created together
+    with transaction.atomic():
+        if role == 'farmer':
+            serializer = FarmerSerializer(data=user_data)
+            if not serializer.is_valid():
+                return serializer.errors, 400
+            farmer = serializer.save(password_hash=password_hash)
+            user_instance = farmer
+            has_farmer = True
+            has_customer = existing_customer is not None
 
-            # Basic validations
-            if not all([email, password, name, role]):
-                return Response({'detail': 'Email, password, name and role are required.'}, status=400)
+            # If user now has both accounts, create MultiAccount
+            if existing_customer:
+                multi_account = create_multiaccount_and_cleanup(fields['email'], password_hash, farmer, existing_customer)
+                if multi_account:
+                    user_instance = multi_account
+        else:  # customer
+            serializer = CustomerSerializer(data=user_data)
+            if not serializer.is_valid():
+                return serializer.errors, 400
+            customer = serializer.save(password_hash=password_hash)
+            user_instance = customer
+            has_farmer = existing_farmer is not None
+            has_customer = True
 
-            if role not in ['farmer', 'customer']:
-                return Response({'detail': 'Invalid role.'}, status=400)
+            # If user now has both accounts, create MultiAccount
+            if existing_farmer:
+                multi_account = create_multiaccount_and_cleanup(fields['email'], password_hash, existing_farmer, customer)
+                if multi_account:
+                    user_instance = multi_account
 
-            # Email validation
-            if not re.match(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$', email):
-                return Response({'detail': 'Invalid email format.'}, status=400)
+    # Generate access and refresh tokens
+    tokens = issue_tokens(user_instance.id, user_instance.email, role, has_farmer, has_customer)
 
-            # Password validation
-            if len(password) < 6:
-                return Response({'detail': 'Password must be at least 6 characters.'}, status=400)
+    return {
+        'message': 'Registration successful',
+        **tokens,
+        'user': {
+            'id': user_instance.id,
+            'name': getattr(user_instance, 'name', fields['name']),
+            'email': user_instance.email,
+            'role': role,
+            'has_farmer': has_farmer,
+            'has_customer': has_customer,
+            'phone': getattr(user_instance, 'phone', fields['phone']),
+            'street_address': getattr(user_instance, 'street_address', ''),
+            'city': getattr(user_instance, 'city', ''),
+            'district': getattr(user_instance, 'district', ''),
+            'state': getattr(user_instance, 'state', ''),
+            'country': getattr(user_instance, 'country', 'India'),
+            'pincode': getattr(user_instance, 'pincode', '')
+        }
+    }, 200
 
-            # Check if user already has this role
-            existing_farmer = Farmer.objects.filter(email=email).first()
-            existing_customer = Customer.objects.filter(email=email).first()
-            multi_account = MultiAccount.objects.filter(email=email).first()
 
-            # If user already has MultiAccount, they can't register again
-            if multi_account:
-                return Response({'detail': 'This email already has both farmer and customer accounts.'}, status=400)
+def login_candidates(identity):
+    """(account, role) pairs a login password is checked against: MultiAccount first, then farmer, then customer"""
+    accounts = ((identity.multi_account, 'multi'), (identity.farmer, 'farmer'), (identity.customer, 'customer'))
+    return [(account, role) for account, role in accounts if account is not None]
 
-            if role == 'farmer' and existing_farmer:
-                return Response({'detail': 'Email already registered as farmer.'}, status=400)
-            if role == 'customer' and existing_customer:
-                return Response({'detail': 'Email already registered as customer.'}, status=400)
 
-            # Create user based on role
-            user_data = {
-                'email': email, 
-                'name': name, 
-                'password': password,
-                'phone': phone,
-                'street_address': request.data.get('street_address', '').strip(),
-                'city': request.data.get('city', '').strip(),
-                'district': request.data.get('district', '').strip(),
-                'state': request.data.get('state', '').strip(),
-                'country': request.data.get('country', 'India').strip(),
-                'pincode': request.data.get('pincode', '').strip()
-            }
-            user_instance = None
-            has_farmer = False
-            has_customer = False
+def login_response_data(identity, user_instance, role, email):
+    """Token and user payload for a successful login as ``user_instance``"""
+    # Check if this email also has the other account type
+    has_farmer = identity.has_farmer
+    has_customer = identity.has_customer
+    if role == 'multi':
+        user_name = identity.farmer.name if identity.farmer else ''
+    else:
+        user_name = user_instance.name
 
-            if role == 'farmer':
-                serializer = FarmerSerializer(data=user_data)
-                if serializer.is_valid():
-                    farmer = serializer.save()
-                    user_instance = farmer
-                    has_farmer = True
-                    has_customer = existing_customer is not None
-                    
-                    # If user now has both accounts, create MultiAccount
-                    if existing_customer:
-                        multi_account = create_multiaccount(email, password, farmer, existing_customer)
-                        if multi_account:
-                            user_instance = multi_account
-                else:
-                    return Response(serializer.errors, status=400)
-            else:  # customer
-                serializer = CustomerSerializer(data=user_data)
-                if serializer.is_valid():
-                    customer = serializer.save()
-                    user_instance = customer
-                    has_farmer = existing_farmer is not None
-                    has_customer = True
-                    
-                    # If user now has both accounts, create MultiAccount
-                    if existing_farmer:
-                        multi_account = create_multiaccount(email, password, existing_farmer, customer)
-                        if multi_account:
-                            user_instance = multi_account
-                else:
-                    return Response(serializer.errors, status=400)
-
-            # Generate token
-            payload = {
-                'id': user_instance.id,
-                'email': user_instance.email,
-                'role': role,
-                'has_farmer': has_farmer or MultiAccount.objects.filter(email=email).exists(),
-                'has_customer': has_customer or MultiAccount.objects.filter(email=email).exists(),
-                'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=24),
-                'iat': datetime.datetime.utcnow(),
-            }
-            token = jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
+    # Generate tokens - Use the CORRECT user ID we found
+    tokens = issue_tokens(user_instance.id, email, role, has_farmer, has_customer)
 
-            return Response({
-                'message': 'Registration successful',
-                'token': token,
-                'user': {
-                    'id': user_instance.id,
-                    'name': getattr(user_instance, 'name', name),
-                    'email': user_instance.email,
-                    'role': role,
-                    'has_farmer': has_farmer or MultiAccount.objects.filter(email=email).exists(),
-                    'has_customer': has_customer or MultiAccount.objects.filter(email=email).exists(),
-                    'phone': getattr(user_instance, 'phone', phone),
-                    'street_address': getattr(user_instance, 'street_address', ''),
-                    'city': getattr(user_instance, 'city', ''),
-                    'district': getattr(user_instance, 'district', ''),
-                    'state': getattr(user_instance, 'state', ''),
-                    'country': getattr(user_instance, 'country', 'India'),
-                    'pincode': getattr(user_instance, 'pincode', '')
-                }
-            })
-                
+    logger.debug("Login successful - User ID: %s, Role: %s", user_instance.id, role)
+
+    # Return user data based on actual user type
+    user_data = {
+        'id': user_instance.id,  # This will be F1, C1, M1, etc.
+        'name': user_name,
+        'email': email,
+        'role': role,
+        'has_farmer': has_farmer,
+        'has_customer': has_customer,
+        'phone': getattr(user_instance, 'phone', ''),
+        'street_address': getattr(user_instance, 'street_address', ''),
+        'city': getattr(user_instance, 'city', ''),
+        'district': getattr(user_instance, 'district', ''),
+        'state': getattr(user_instance, 'state', ''),
+        'country': getattr(user_instance, 'country', 'India'),
+        'pincode': getattr(user_instance, 'pincode', '')
+    }
+
+    return {
+        'message': 'Login successful',
+        **tokens,
+        'user': user_data
+    }
+
+
+HASHING_OVERLOADED_DETAIL = 'Server is busy, please try again shortly.'
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class RegisterView(APIView):
+    permission_classes = [AllowAny]
+    
+    def post(self, request):
+        try:
+            fields, error = validate_registration(request.data)
+            if error:
+                return Response({'detail': error}, status=400)
+
+            identity, error = registration_conflict(fields)
+            if error:
+                return Response({'detail': error}, status=400)
+
+            # Hash once, on the bounded hash pool; the account and any MultiAccount share the hash
+            password_hash = hash_password(fields['password'])
+            body, status = create_registration(fields, identity, password_hash)
+            return Response(body, status=status)
+
+        except HashingOverloaded:
+            return Response({'detail': HASHING_OVERLOADED_DETAIL}, status=503)
         except Exception as e:
             return Response({'detail': f'Registration failed: {str(e)}'}, status=400)
 
@@ -187,102 +260,25 @@ class LoginView(APIView):
             if not email or not password:
                 return Response({'detail': 'Email and password required.'}, status=400)
 
-            print(f"🔐 Login attempt for email: {email}")
-
-            user_instance = None
-            role = None
-            has_farmer = False
-            has_customer = False
-            user_id = None
-            user_name = None
-
-            # Check MultiAccount first
-            multi_account = MultiAccount.objects.filter(email=email).first()
-            if multi_account and multi_account.check_password(password):
-                user_instance = multi_account
-                user_id = multi_account.id
-                user_name = multi_account.farmer.name
-                has_farmer = True
-                has_customer = True
-                role = 'multi'
-                print(f"✅ MultiAccount login successful: {email}, ID: {user_id}")
-            else:
-                # Check individual tables
-                farmer = Farmer.objects.filter(email=email).first()
-                customer = Customer.objects.filter(email=email).first()
-                
-                print(f"🔍 Checking farmer: {farmer is not None}, customer: {customer is not None}")
-                
-                # Check farmer with password
-                if farmer and farmer.check_password(password):
-                    user_instance = farmer
-                    user_id = farmer.id
-                    user_name = farmer.name
-                    role = 'farmer'
-                    has_farmer = True
-                    # Check if this email also has customer account
-                    has_customer = Customer.objects.filter(email=email).exists() or MultiAccount.objects.filter(email=email).exists()
-                    print(f"✅ Farmer login successful: {email}, ID: {user_id}")
-                
-                # Check customer with password (only if farmer check failed)
-                elif customer and customer.check_password(password):
-                    user_instance = customer
-                    user_id = customer.id
-                    user_name = customer.name
-                    role = 'customer'
-                    has_customer = True
-                    # Check if this email also has farmer account
-                    has_farmer = Farmer.objects.filter(email=email).exists() or MultiAccount.objects.filter(email=email).exists()
-                    print(f"✅ Customer login successful: {email}, ID: {user_id}")
-                else:
-                    print("❌ Invalid credentials for both farmer and customer")
-                    return Response({'detail': 'Invalid credentials.'}, status=400)
+            logger.debug("Login attempt for email: %s", email)
 
-            if not user_instance:
-                print("❌ No user instance found")
+            # One indexed lookup loads every account registered with this email
+            identity = resolve_identity(email)
+            if identity is None:
+                logger.warning("Invalid credentials: no account for this email")
                 return Response({'detail': 'Invalid credentials.'}, status=400)
 
-            # Generate token - Use the CORRECT user ID we found
-            payload = {
-                'id': user_id,  # This is now the correct ID from the database
-                'email': email,
-                'role': role,
-                'has_farmer': has_farmer,
-                'has_customer': has_customer,
-                'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=24),
-                'iat': datetime.datetime.utcnow(),
-            }
-            token = jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
-
-            print(f"🎯 Login successful - User ID: {user_id}, Name: {user_name}, Role: {role}")
+            for account, role in login_candidates(identity):
+                if verify_password(account, password):
+                    return Response(login_response_data(identity, account, role, email))
 
-            # Return user data based on actual user type
-            user_data = {
-                'id': user_instance.id,  # This will be F1, C1, M1, etc.
-                'name': user_name,
-                'email': email,
-                'role': role,
-                'has_farmer': has_farmer,
-                'has_customer': has_customer,
-                'phone': getattr(user_instance, 'phone', ''),
-                'street_address': getattr(user_instance, 'street_address', ''),
-                'city': getattr(user_instance, 'city', ''),
-                'district': getattr(user_instance, 'district', ''),
-                'state': getattr(user_instance, 'state', ''),
-                'country': getattr(user_instance, 'country', 'India'),
-                'pincode': getattr(user_instance, 'pincode', '')
-            }
+            logger.warning("Invalid credentials for both farmer and customer")
+            return Response({'detail': 'Invalid credentials.'}, status=400)
 
-            return Response({
-                'message': 'Login successful',
-                'token': token,
-                'user': user_data
-            })
-            
+        except HashingOverloaded:
+            return Response({'detail': HASHING_OVERLOADED_DETAIL}, status=503)
         except Exception as e:
-            print(f"❌ Login failed: {str(e)}")
-            import traceback
-            print(f"❌ Traceback: {traceback.format_exc()}")
+            logger.exception("Login failed")
             return Response({'detail': f'Login failed: {str(e)}'}, status=400)
 
 
@@ -302,14 +298,13 @@ class UserView(APIView):
         except:
             return Response({'detail': 'Invalid token.'}, status=401)
 
-        print(f"🔍 UserView - JWT Payload: {payload}")
 
         user_id = payload['id']
         user_email = payload['email']
         user_role = payload.get('role', '')
         user_instance = None
         
-        print(f"🔍 UserView - Looking for user ID: {user_id}, Email: {user_email}, Role: {user_role}")
+        logger.debug("UserView - Looking for user ID: %s, Email: %s, Role: %s", user_id, user_email, user_role)
         
         # Handle all user types properly
         if user_id.startswith('M'):
@@ -324,27 +319,28 @@ class UserView(APIView):
                 else:
                     # Default to farmer if role is 'multi'
                     user_instance = user_instance.farmer
-                print(f"✅ UserView - MultiAccount user, using {user_role} data: {user_instance.email}")
+                logger.debug("UserView - MultiAccount user, using %s data: %s", user_role, user_instance.email)
         elif user_id.startswith('F'):
             # Farmer user
             user_instance = Farmer.objects.filter(id=user_id).first()
             if user_instance:
-                print(f"✅ UserView - Farmer user: {user_instance.email}")
+                logger.debug("UserView - Farmer user: %s", user_instance.email)
         elif user_id.startswith('C'):
             # Customer user  
             user_instance = Customer.objects.filter(id=user_id).first()
             if user_instance:
-                print(f"✅ UserView - Customer user: {user_instance.email}")
+                logger.debug("UserView - Customer user: %s", user_instance.email)
 
         if not user_instance:
-            print(f"❌ UserView - User not found with ID: {user_id}")
+            logger.warning("UserView - User not found with ID: %s", user_id)
             return Response({'detail': 'User not found.'}, status=404)
 
         # Get account status
-        has_farmer = Farmer.objects.filter(email=user_instance.email).exists() or MultiAccount.objects.filter(email=user_instance.email).exists()
-        has_customer = Customer.objects.filter(email=user_instance.email).exists() or MultiAccount.objects.filter(email=user_instance.email).exists()
+        identity = resolve_identity(user_instance.email)
+        has_farmer = identity.has_farmer if identity else False
+        has_customer = identity.has_customer if identity else False
         
-        print(f"✅ UserView - Found user: {user_instance.email}, Role: {user_role}")
+        logger.debug("UserView - Found user: %s, Role: %s", user_instance.email, user_role)
 
         # Return user data
         return Response({
@@ -388,8 +384,8 @@ class SwitchAccountView(APIView):
         user_id = payload['id']
         user_email = payload['email']
         
-        print(f"🔍 Switch account - User ID: {user_id}, Email: {user_email}, Target: {target_role}")
-        print(f"🔍 Current payload - has_farmer: {payload.get('has_farmer')}, has_customer: {payload.get('has_customer')}")
+        logger.debug("Switch account - User ID: %s, Email: %s, Target: %s", user_id, user_email, target_role)
+        logger.debug("Current payload - has_farmer: %s, has_customer: %s", payload.get('has_farmer'), payload.get('has_customer'))
         
         # Check if user exists and has permission to switch to this role
         has_farmer = False
@@ -397,61 +393,44 @@ class SwitchAccountView(APIView):
         new_user_id = user_id  # Default to same ID
         new_user_instance = None
         
-        # Check MultiAccount
-        multi_account = MultiAccount.objects.filter(id=user_id).first()
-        if multi_account:
+        # The identity index holds every account of this email; the token's id must be one of them
+        identity = resolve_identity(user_email)
+        if identity is not None and user_id == identity.multi_account_id:
             has_farmer = True
             has_customer = True
             # For MultiAccount users, we need to get the actual Farmer/Customer ID
             if target_role == 'farmer':
-                new_user_id = multi_account.farmer.id  # This will be F1, F2, etc.
-                new_user_instance = multi_account.farmer
+                new_user_id = identity.farmer_id  # This will be F1, F2, etc.
+                new_user_instance = identity.farmer
             else:  # customer
-                new_user_id = multi_account.customer.id  # This will be C1, C2, etc.
-                new_user_instance = multi_account.customer
-            print(f"✅ User is MultiAccount - switching to {target_role} with ID: {new_user_id}")
-        else:
-            # Check individual tables
-            farmer = Farmer.objects.filter(id=user_id).first()
-            customer = Customer.objects.filter(id=user_id).first()
-            
-            if farmer:
-                has_farmer = True
-                has_customer = Customer.objects.filter(email=user_email).exists()
-                new_user_instance = farmer
-                print(f"✅ User is Farmer - has_farmer: {has_farmer}, has_customer: {has_customer}")
-            elif customer:
-                has_farmer = Farmer.objects.filter(email=user_email).exists()
-                has_customer = True
-                new_user_instance = customer
-                print(f"✅ User is Customer - has_farmer: {has_farmer}, has_customer: {has_customer}")
+                new_user_id = identity.customer_id  # This will be C1, C2, etc.
+                new_user_instance = identity.customer
+            logger.debug("User is MultiAccount - switching to %s with ID: %s", target_role, new_user_id)
+        elif identity is not None and user_id in (identity.farmer_id, identity.customer_id):
+            has_farmer = identity.has_farmer
+            has_customer = identity.has_customer
+            new_user_instance = identity.farmer if user_id == identity.farmer_id else identity.customer
+            logger.debug("User is %s - has_farmer: %s, has_customer: %s",
+                         type(new_user_instance).__name__, has_farmer, has_customer)
 
         # Check permissions
         if target_role == 'farmer' and not has_farmer:
-            print("❌ User doesn't have farmer account")
+            logger.warning("User %s doesn't have farmer account", user_id)
             return Response({'detail': 'You do not have a farmer account.'}, status=403)
         if target_role == 'customer' and not has_customer:
-            print("❌ User doesn't have customer account")
+            logger.warning("User %s doesn't have customer account", user_id)
             return Response({'detail': 'You do not have a customer account.'}, status=403)
 
-        print(f"✅ Permission granted to switch to {target_role}")
+        logger.debug("Permission granted to switch to %s", target_role)
 
-        # Create new payload with updated role and CORRECT user ID
-        new_payload = {
-            'id': new_user_id,  # Use the correct ID for the target role
-            'email': payload['email'],
-            'role': target_role,
-            'has_farmer': has_farmer,
-            'has_customer': has_customer,
-            'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=24),  # NEW EXPIRATION
-            'iat': datetime.datetime.utcnow(),
-        }
-        
-        new_token = jwt.encode(new_payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
+        # New token pair with updated role and CORRECT user ID; the old pair stops working
+        tokens = issue_tokens(new_user_id, payload['email'], target_role, has_farmer, has_customer)
+        revoke_access_token(token, reason='switch')
+        revoke_refresh_token(request.data.get('refresh_token'))
 
         return Response({
             'message': f'Switched to {target_role} account',
-            'token': new_token,
+            **tokens,
             'role': target_role,
             'has_farmer': has_farmer,
             'has_customer': has_customer,
@@ -463,6 +442,8 @@ class SwitchAccountView(APIView):
 class LogoutView(APIView):
     def post(self, request):
         try:
+            revoke_access_token(request.auth)
+            revoke_refresh_token(request.data.get('refresh_token'))
             return Response({
                 'message': 'Logged out successfully'
             })
@@ -470,6 +451,24 @@ class LogoutView(APIView):
             return Response({'detail': f'Logout failed: {str(e)}'}, status=400)
 
 
+@method_decorator(csrf_exempt, name='dispatch')
+class TokenRefreshView(APIView):
+    """Trade a refresh token for a new access/refresh pair (the old refresh token is spent)"""
+    # The access token is usually expired by now; do not let authentication reject the request
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def post(self, request):
+        refresh_token = request.data.get('refresh_token', '')
+        if not refresh_token:
+            return Response({'detail': 'Refresh token required.'}, status=400)
+        try:
+            return Response(rotate_refresh_token(refresh_token))
+        except RefreshTokenInvalid as e:
+            logger.info("Refresh rejected: %s", e)
+            return Response({'detail': 'Invalid refresh token.'}, status=401)
+
+
 @method_decorator(csrf_exempt, name='dispatch')
 class AvailableDistrictsView(APIView):
     permission_classes = [AllowAny]  # Allow anyone to access this
@@ -602,23 +601,22 @@ class AutoRegisterView(APIView):
             if target_role not in ['farmer', 'customer']:
                 return Response({'detail': 'Invalid role specified.'}, status=400)
             
-            print(f"🔄 Auto-registering {current_user.email} as {target_role}")
+            logger.debug("Auto-registering %s as %s", current_user.email, target_role)
             
             email = current_user.email
             
+            identity = resolve_identity(email)
+
             # Check if user already has both accounts (MultiAccount)
-            existing_multi = MultiAccount.objects.filter(email=email).first()
-            if existing_multi:
+            if identity and identity.multi_account_id:
                 return Response({'detail': 'You already have both farmer and customer accounts.'}, status=400)
             
             # Check if user already has the target role
             if target_role == 'farmer':
-                existing_farmer = Farmer.objects.filter(email=email).first()
-                if existing_farmer:
+                if identity and identity.farmer_id:
                     return Response({'detail': 'You already have a farmer account.'}, status=400)
             else:
-                existing_customer = Customer.objects.filter(email=email).first()
-                if existing_customer:
+                if identity and identity.customer_id:
                     return Response({'detail': 'You already have a customer account.'}, status=400)
             
             # Get user data from current account
@@ -651,76 +649,77 @@ class AutoRegisterView(APIView):
             
             new_account = None
             existing_account = None
-            
-            if target_role == 'farmer':
-                # User is currently customer, creating farmer
-                serializer = FarmerSerializer(data=user_data)
-                if serializer.is_valid():
-                    new_account = serializer.save()
-                    existing_account = Customer.objects.filter(email=email).first()
-                    print(f"✅ Created farmer account: {new_account.email}")
-                else:
-                    return Response(serializer.errors, status=400)
-            else:  # customer
-                # User is currently farmer, creating customer  
-                serializer = CustomerSerializer(data=user_data)
-                if serializer.is_valid():
-                    new_account = serializer.save()
-                    existing_account = Farmer.objects.filter(email=email).first()
-                    print(f"✅ Created customer account: {new_account.email}")
-                else:
-                    return Response(serializer.errors, status=400)
-            
-            # Create MultiAccount with both accounts
-            if new_account and existing_account:
+            multi_account = None
+            # Hashed once, on the bounded hash pool, for both the new account and the MultiAccount
+            password_hash = hash_password(password)
+
+            # The new account, its identity index entry and the MultiAccount are created together
+            with transaction.atomic():
                 if target_role == 'farmer':
-                    multi_account = create_multiaccount_and_cleanup(
-                        email, password, new_account, existing_account
-                    )
-                else:
-                    multi_account = create_multiaccount_and_cleanup(
-                        email, password, existing_account, new_account  
-                    )
+                    # User is currently customer, creating farmer
+                    serializer = FarmerSerializer(data=user_data)
+                    if serializer.is_valid():
+                        new_account = serializer.save(password_hash=password_hash)
+                        existing_account = identity.customer if identity else None
+                        logger.info("Created farmer account %s", new_account.id)
+                    else:
+                        return Response(serializer.errors, status=400)
+                else:  # customer
+                    # User is currently farmer, creating customer  
+                    serializer = CustomerSerializer(data=user_data)
+                    if serializer.is_valid():
+                        new_account = serializer.save(password_hash=password_hash)
+                        existing_account = identity.farmer if identity else None
+                        logger.info("Created customer account %s", new_account.id)
+                    else:
+                        return Response(serializer.errors, status=400)
+
+                # Create MultiAccount with both accounts
+                if new_account and existing_account:
+                    if target_role == 'farmer':
+                        multi_account = create_multiaccount_and_cleanup(
+                            email, password_hash, new_account, existing_account
+                        )
+                    else:
+                        multi_account = create_multiaccount_and_cleanup(
+                            email, password_hash, existing_account, new_account
+                        )
+                if not multi_account:
+                    # Do not leave a half-merged identity behind
+                    transaction.set_rollback(True)
+
+            if multi_account:
+                # Generate new tokens for MultiAccount; the caller's old pair is revoked
+                tokens = issue_tokens(multi_account.id, multi_account.email, 'multi', True, True)
+                revoke_access_token(request.auth, reason='switch')
+                revoke_refresh_token(request.data.get('refresh_token'))
                 
-                if multi_account:
-                    # Generate new token for MultiAccount
-                    payload = {
-                        'id': multi_account.id,
-                        'email': multi_account.email,
-                        'role': 'multi',
-                        'has_farmer': True,
-                        'has_customer': True,
-                        'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=24),
-                        'iat': datetime.datetime.utcnow(),
-                    }
-                    token = jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
-                    
-                    user_data = {
-                        'id': multi_account.id,
-                        'name': name,
-                        'email': email,
-                        'role': 'multi',
-                        'has_farmer': True,
-                        'has_customer': True,
-                        'phone': phone,
-                        'street_address': getattr(current_user, 'street_address', ''),
-                        'city': getattr(current_user, 'city', ''),
-                        'district': getattr(current_user, 'district', ''),
-                        'state': getattr(current_user, 'state', ''),
-                        'country': getattr(current_user, 'country', 'India'),
-                        'pincode': getattr(current_user, 'pincode', '')
-                    }
-                    
-                    return Response({
-                        'message': f'Successfully registered as {target_role} and created MultiAccount!',
-                        'token': token,
-                        'user': user_data
-                    })
-            
+                user_data = {
+                    'id': multi_account.id,
+                    'name': name,
+                    'email': email,
+                    'role': 'multi',
+                    'has_farmer': True,
+                    'has_customer': True,
+                    'phone': phone,
+                    'street_address': getattr(current_user, 'street_address', ''),
+                    'city': getattr(current_user, 'city', ''),
+                    'district': getattr(current_user, 'district', ''),
+                    'state': getattr(current_user, 'state', ''),
+                    'country': getattr(current_user, 'country', 'India'),
+                    'pincode': getattr(current_user, 'pincode', '')
+                }
+                
+                return Response({
+                    'message': f'Successfully registered as {target_role} and created MultiAccount!',
+                    **tokens,
+                    'user': user_data
+                })
+        
             return Response({'detail': 'Failed to create MultiAccount.'}, status=400)
-            
+
+        except HashingOverloaded:
+            return Response({'detail': HASHING_OVERLOADED_DETAIL}, status=503)
         except Exception as e:
-            print(f"❌ Auto-registration failed: {str(e)}")
-            import traceback
-            print(f"❌ Traceback: {traceback.format_exc()}")
+            logger.exception("Auto-registration failed")
             return Response({'detail': f'Auto-registration failed: {str(e)}'}, status=400)
\ No newline at end of file
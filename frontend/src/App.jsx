@@ -85,12 +85,13 @@ const AppContent = () => {
 
   const logout = async () => {
     try {
-      await API.post("/logout");
+      await API.post("/logout", { refresh_token: localStorage.getItem('refresh_token') });
     } catch (err) {
       console.error("Logout API failed:", err);
     } finally {
       // Clear all client-side storage
       localStorage.removeItem('auth_token');
+      localStorage.removeItem('refresh_token');
       localStorage.removeItem('current_role');
       localStorage.removeItem('user_data');
       localStorage.removeItem('temp_password');
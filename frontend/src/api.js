@@ -9,11 +9,46 @@ const API = axios.create({
   timeout: 10000,
 });
 
+// Rendition (max edge in px) requested for images shown in card grids
+const CARD_IMAGE_SIZE = 256;
+
+// Endpoints that must not carry (or refresh) the access token
+const PUBLIC_URLS = ['/login', '/register', '/token/refresh'];
+
+const clearSession = () => {
+  localStorage.removeItem('auth_token');
+  localStorage.removeItem('refresh_token');
+  localStorage.removeItem('current_role');
+  localStorage.removeItem('user_data');
+};
+
+// Access tokens live a few minutes; one refresh at a time, shared by every request that got a 401
+let refreshing = null;
+
+const refreshAccessToken = () => {
+  if (!refreshing) {
+    const refreshToken = localStorage.getItem('refresh_token');
+    refreshing = (refreshToken
+      ? API.post('/token/refresh', { refresh_token: refreshToken })
+      : Promise.reject(new Error('No refresh token'))
+    ).catch((error) => {
+      // Another tab may have rotated the token meanwhile; its new pair is already stored
+      if (refreshToken && localStorage.getItem('refresh_token') !== refreshToken) {
+        return null;
+      }
+      throw error;
+    }).finally(() => {
+      refreshing = null;
+    });
+  }
+  return refreshing;
+};
+
 // Request interceptor
 API.interceptors.request.use(
   (config) => {
     // Skip token check for login and register endpoints
-    if (config.url === '/login' || config.url === '/register') {
+    if (PUBLIC_URLS.includes(config.url)) {
       console.log(`🔓 Making ${config.method?.toUpperCase()} request to:`, config.url);
       return config;
     }
@@ -42,15 +77,18 @@ API.interceptors.response.use(
       data: response.data
     });
     
-    // If this is a login response, store the token
-    if (response.config.url === '/login' && response.data.token) {
+    // Store tokens from login, registration, account switches and refreshes
+    if (response.data?.token) {
       localStorage.setItem('auth_token', response.data.token);
-      console.log('🔑 Token stored from login response');
+      console.log('🔑 Token stored from', response.config.url);
+    }
+    if (response.data?.refresh_token) {
+      localStorage.setItem('refresh_token', response.data.refresh_token);
     }
     
     return response;
   },
-  (error) => {
+  async (error) => {
     console.error('❌ Response error:', {
       status: error.response?.status,
       url: error.config?.url,
@@ -58,10 +96,20 @@ API.interceptors.response.use(
       message: error.message
     });
     
-    if (error.response?.status === 401) {
-      localStorage.removeItem('auth_token');
-      localStorage.removeItem('current_role');
-      localStorage.removeItem('user_data');
+    const original = error.config;
+    if (error.response?.status === 401 && original && !PUBLIC_URLS.includes(original.url) && !original._retried) {
+      // Expired access token: get a new pair and replay the request once
+      try {
+        await refreshAccessToken();
+        original._retried = true;
+        return API(original);
+      } catch (refreshError) {
+        console.log('🔑 Token refresh failed:', refreshError.message);
+      }
+    }
+
+    if (error.response?.status === 401 && !PUBLIC_URLS.includes(original?.url)) {
+      clearSession();
       console.log('🔑 Token removed due to auth error');
     }
     
@@ -84,8 +132,19 @@ export const plantDetectionAPI = {
     });
   },
 
-  getHistory: () => {
-    return API.get('/plant/history/');
+  detectBatch: (imageFiles) => {
+    const formData = new FormData();
+    imageFiles.forEach((imageFile) => formData.append('images', imageFile));
+
+    return API.post('/plant/detect/batch/', formData, {
+      headers: {
+        'Content-Type': 'multipart/form-data',
+      },
+    });
+  },
+
+  getHistory: (cursor = null) => {
+    return API.get('/plant/history/', { params: { size: CARD_IMAGE_SIZE, ...(cursor ? { cursor } : {}) } });
   },
 
   deleteHistory: (detectionId = null) => {
@@ -106,7 +165,7 @@ export const farmerAPI = {
 
   // Products
   getProducts: () => {
-    return API.get('/farmer/products/');
+    return API.get('/farmer/products/', { params: { size: CARD_IMAGE_SIZE } });
   },
 
   createProduct: (formData) => {
@@ -134,8 +193,14 @@ export const farmerAPI = {
 // Customer API
 export const customerAPI = {
   // Marketplace
-  getMarketplaceProducts: () => {
-    return API.get('/customer/marketplace/');
+  // One keyset page; pass the previous response's next_cursor as `cursor` for the next one
+  getMarketplaceProducts: (params = {}) => {
+    return API.get('/customer/marketplace/', { params: { size: CARD_IMAGE_SIZE, ...params } });
+  },
+
+  // Type-ahead for the search box: product names, categories and districts
+  getMarketplaceSuggestions: (q) => {
+    return API.get('/customer/marketplace/suggest/', { params: { q } });
   },
 
   // Orders
@@ -167,11 +232,11 @@ export const customerAPI = {
 
 export const authAPI = {
   logout: () => {
-    return API.post('/logout');
+    return API.post('/logout', { refresh_token: localStorage.getItem('refresh_token') });
   },
   
   switchAccount: (role) => {
-    return API.post('/switch-account/', { role });
+    return API.post('/switch-account/', { role, refresh_token: localStorage.getItem('refresh_token') });
   },
   
   getCurrentUser: () => {
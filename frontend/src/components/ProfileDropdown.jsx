@@ -137,7 +137,8 @@ const ProfileDropdown = () => {
 
       const response = await API.post("/auto-register/", {
         role: targetRole,
-        password: tempPassword  // Send the actual password
+        password: tempPassword,  // Send the actual password
+        refresh_token: localStorage.getItem('refresh_token')  // Revoked; the response carries a new one
       });
 
       // Update tokens and user data
@@ -23,7 +23,7 @@ const CustomerHome = () => {
     try {
       setLoading(true);
       console.log("🔄 Loading featured products...");
-      const response = await customerAPI.getMarketplaceProducts();
+      const response = await customerAPI.getMarketplaceProducts({ limit: 3 });
       const allProducts = response.data.products || [];
       
       // Get only first 3 products that match customer's district
@@ -27,7 +27,11 @@ const Marketplace = () => {
   const [selectedCategory, setSelectedCategory] = useState("All");
   const [cart, setCart] = useState([]);
   const [products, setProducts] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [totalProducts, setTotalProducts] = useState(0);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const [suggestions, setSuggestions] = useState([]);
   const [customerPincode, setCustomerPincode] = useState("");
   const [customerDistrict, setCustomerDistrict] = useState("");
 
@@ -36,15 +40,43 @@ const Marketplace = () => {
     // Load cart from localStorage on component mount
     const savedCart = JSON.parse(localStorage.getItem('cart')) || [];
     setCart(savedCart);
-    loadMarketplaceProducts();
   }, []);
 
-  const loadMarketplaceProducts = async () => {
+  // Search and category are applied by the server; reload the first page when they change
+  useEffect(() => {
+    const timer = setTimeout(() => loadMarketplaceProducts(), searchQuery ? 300 : 0);
+    return () => clearTimeout(timer);
+  }, [searchQuery, selectedCategory]);
+
+  useEffect(() => {
+    if (!searchQuery.trim()) {
+      setSuggestions([]);
+      return;
+    }
+    const timer = setTimeout(async () => {
+      try {
+        const response = await customerAPI.getMarketplaceSuggestions(searchQuery);
+        setSuggestions(response.data.suggestions || []);
+      } catch (error) {
+        setSuggestions([]);
+      }
+    }, 100);
+    return () => clearTimeout(timer);
+  }, [searchQuery]);
+
+  const loadMarketplaceProducts = async (cursor = null) => {
     try {
-      setLoading(true);
+      cursor ? setLoadingMore(true) : setLoading(true);
       console.log("🔄 Loading marketplace products...");
-      const response = await customerAPI.getMarketplaceProducts();
-      setProducts(response.data.products || []);
+      const params = {};
+      if (cursor) params.cursor = cursor;
+      if (searchQuery) params.search = searchQuery;
+      if (selectedCategory !== "All") params.category = selectedCategory;
+      const response = await customerAPI.getMarketplaceProducts(params);
+      const page = response.data.products || [];
+      setProducts(cursor ? (current) => [...current, ...page] : page);
+      setNextCursor(response.data.next_cursor || null);
+      setTotalProducts(response.data.total_products || 0);
       setCustomerDistrict(response.data.customer_district || "");
       console.log("✅ Marketplace products loaded:", {
         productCount: response.data.products?.length,
@@ -59,18 +91,12 @@ const Marketplace = () => {
       });
     } finally {
       setLoading(false);
+      setLoadingMore(false);
     }
   };
 
   const categories = ["All", "Vegetables", "Fruits", "Leafy Greens", "Root Vegetables", "Herbs"];
 
-  const filteredProducts = products.filter(product => {
-    const matchesSearch = product.name.toLowerCase().includes(searchQuery.toLowerCase()) ||
-      product.farmer_name.toLowerCase().includes(searchQuery.toLowerCase());
-    const matchesCategory = selectedCategory === "All" || product.category === selectedCategory;
-    return matchesSearch && matchesCategory;
-  });
-
   const handleAddToCart = (product) => {
     if (product.stock === 0) {
       toast({
@@ -231,8 +257,16 @@ const Marketplace = () => {
               placeholder="Search products or farmers..."
               value={searchQuery}
               onChange={(e) => setSearchQuery(e.target.value)}
+              list="marketplace-suggestions"
               className="pl-10 pr-4 py-3 border-2 border-gray-300 focus:border-green-500"
             />
+            <datalist id="marketplace-suggestions">
+              {suggestions.map((suggestion) => (
+                <option key={`${suggestion.type}-${suggestion.text}`} value={suggestion.text}>
+                  {suggestion.type}
+                </option>
+              ))}
+            </datalist>
           </div>
 
           <div className="flex flex-col sm:flex-row justify-between items-start sm:items-center space-y-4 sm:space-y-0">
@@ -299,7 +333,7 @@ const Marketplace = () => {
           className="mb-6"
         >
           <p className="text-gray-600">
-            Showing {filteredProducts.length} products
+            Showing {products.length} of {totalProducts} products
             {selectedCategory !== "All" && ` in ${selectedCategory}`}
             {searchQuery && ` matching "${searchQuery}"`}
             {customerDistrict && ` from farmers in ${customerDistrict}`}
@@ -322,14 +356,28 @@ const Marketplace = () => {
               : "grid-cols-1"
               }`}
           >
-            {filteredProducts.map((product, index) => (
+            {products.map((product, index) => (
               <ProductCard key={product.id} product={product} index={index} />
             ))}
           </div>
         )}
 
+        {/* Next page */}
+        {!loading && nextCursor && (
+          <div className="text-center mt-8">
+            <Button
+              onClick={() => loadMarketplaceProducts(nextCursor)}
+              disabled={loadingMore}
+              variant="outline"
+              className="border-green-600 text-green-600 hover:bg-green-600 hover:text-white"
+            >
+              {loadingMore ? "Loading..." : "Load more"}
+            </Button>
+          </div>
+        )}
+
         {/* No Results */}
-        {!loading && filteredProducts.length === 0 && (
+        {!loading && products.length === 0 && (
           <motion.div
             initial={{ opacity: 0, y: 50 }}
             animate={{ opacity: 1, y: 0 }}
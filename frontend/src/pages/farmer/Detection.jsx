@@ -27,6 +27,8 @@ const Detection = () => {
 
   const { toast } = useToast();
   const [history, setHistory] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [image, setImage] = useState(null);
   const [result, setResult] = useState(null);
   const [loading, setLoading] = useState(false);
@@ -106,27 +108,29 @@ const Detection = () => {
     }
   };
 
-  const loadHistory = async () => {
+  const loadHistory = async (cursor = null) => {
     try {
       console.log("🔄 Loading detection history...");
-      const response = await plantDetectionAPI.getHistory();
+      const response = await plantDetectionAPI.getHistory(cursor);
       
-      if (!response.data || !Array.isArray(response.data)) {
+      if (!response.data || !Array.isArray(response.data.results)) {
         console.error("❌ Invalid history response format");
-        setHistory([]);
+        if (!cursor) setHistory([]);
         return;
       }
 
-      const historyData = response.data.map(item => ({
+      const historyData = response.data.results.map(item => ({
         id: item.id, // Unique database ID
-        image: item.image_url, // Base64 data URL from backend
+        image: item.image_url, // Cacheable image URL, fetched by the browser on demand
         result: item.prediction,
         confidence: item.confidence,
         date: new Date(item.created_at).toLocaleString(),
         top_predictions: item.top_predictions || []
       }));
 
-      setHistory(historyData);
+      // First page replaces the list, later pages append to it
+      setHistory(prevHistory => cursor ? [...prevHistory, ...historyData] : historyData);
+      setNextCursor(response.data.next_cursor || null);
       console.log(`✅ Loaded ${historyData.length} history items`);
 
     } catch (error) {
@@ -141,6 +145,13 @@ const Detection = () => {
     }
   };
 
+  const loadMoreHistory = async () => {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    await loadHistory(nextCursor);
+    setLoadingMore(false);
+  };
+
   const handleDeleteHistory = async (detectionId = null) => {
     try {
       setDeletingId(detectionId);
@@ -158,6 +169,7 @@ const Detection = () => {
       } else {
         // Delete all
         setHistory([]);
+        setNextCursor(null);
         toast({
           title: "History Cleared",
           description: "All detection history has been cleared",
@@ -380,6 +392,7 @@ const Detection = () => {
                             <img
                               src={item.image}
                               alt="Detection result"
+                              loading="lazy"
                               className="object-contain w-full h-full rounded-t-lg"
                               onError={(e) => {
                                 console.error(`Failed to load image for detection ${item.id}`);
@@ -447,6 +460,14 @@ const Detection = () => {
                   ))
                 )}
               </div>
+
+              {nextCursor && (
+                <div className="flex justify-center mt-6">
+                  <Button variant="outline" onClick={loadMoreHistory} disabled={loadingMore}>
+                    {loadingMore ? "Loading..." : "Load more"}
+                  </Button>
+                </div>
+              )}
             </TabsContent>
           </Tabs>
         </motion.div>
@@ -455,4 +476,4 @@ const Detection = () => {
   );
 };
 
-export default Detection;
\ No newline at end of file
+export default Detection;
\ No newline at end of file